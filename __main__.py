@@ -35,9 +35,8 @@ import Tkinter as tk
 import ttk
 import tkFileDialog as fd
 import re
-import pandas
 import sys
-import matplotlib.pyplot as plt
+import importlib
 import numpy as np
 #import ConfigParser
 import random, string
@@ -47,9 +46,17 @@ import time
 import codecs
 # Custom classes
 from classes.spec_parser import *
+from classes.scan_index import *
 from classes.custom_widgets import *
-from classes.plots import *
+# Plot windows (classes.plots, which loads matplotlib, scipy and mpl_toolkits) are imported on first use,
+# or step by step while the main window is idle (see prewarm_imports), so that startup is fast
 from classes.tools import *
+from classes.formula import *
+from classes.column_selector import *
+from classes.roi_axis import *
+from classes.project import *
+from classes.processing import *
+from classes.profiler_window import *
 from classes.profiler import *
 # Third party local libraries
 import lib.tkintertable
@@ -76,8 +83,13 @@ class Application(ttk.Frame):
         self.widgets['btn_open']["command"] = self.action_select_file
         self.widgets['btn_open'].grid(row=row, column=0, sticky="nsew", pady=(0, 0))
 
-        #self.widgets['cb_auto_refresh'] = Checkbox(self.widgets['open_file_frame'], text='Auto refresh')
-        #self.widgets['cb_auto_refresh'].grid(row=row, column=1, rowspan=rowspan, sticky="nsew", pady=(0, 0))
+        self.widgets['cb_auto_refresh'] = Checkbox(self.widgets['open_file_frame'], text='Auto refresh')
+        self.widgets['cb_auto_refresh'].grid(row=row, column=1, rowspan=rowspan, sticky="nsew", pady=(0, 0))
+
+        self.widgets['btn_profiling'] = ttk.Button(self.widgets['open_file_frame'])
+        self.widgets['btn_profiling']["text"] = "Profiling"
+        self.widgets['btn_profiling']["command"] = self.action_profiling
+        self.widgets['btn_profiling'].grid(row=row, column=2, sticky="nsew", pady=(0, 0))
 
         tk.Grid.columnconfigure(self.widgets['open_file_frame'], 0, weight=1)
         tk.Grid.rowconfigure(self.widgets['open_file_frame'], 0, weight=1)
@@ -144,6 +156,13 @@ class Application(ttk.Frame):
         self.widgets['btn_rxes']["command"] = self.action_rxes
         self.widgets['btn_rxes'].grid(row=row, column=0, sticky="nsew", pady=(0, 2))
 
+        # Scans filter (e.g. "ascan mo_e dcm_energy=11.5:11.6 date=2015-11-12 time=60")
+        row += rowspan
+        rowspan = 1
+        self.widgets['entry_scans_filter'] = LabeledEntry(self, 'Filter scans: ', '')
+        self.widgets['entry_scans_filter'].grid(row=row, column=0, sticky="nsew", pady=(8, 2))
+        self.widgets['entry_scans_filter'].input.bind('<Return>', self.action_filter_scans)
+
         # Scans listbox
         row += rowspan
         rowspan = 1
@@ -350,6 +369,12 @@ class Application(ttk.Frame):
         self.figure_number = 0
         self.file_path = ''
         self.filename = ''
+        self.specfile = None
+        self.current_scan = None
+        self.scan_index = None
+        # Computed plot datasets: key (see selected_dataset_key): (data, parameters), most recently used last
+        self.datasets = OrderedDict()
+        self.max_datasets = 8
         # Create a new plot window
         self.clipboard_plot = None
 
@@ -370,46 +395,127 @@ class Application(ttk.Frame):
         w, h = self.master.winfo_screenwidth(), self.master.winfo_screenheight()
         self.master.geometry("%dx%d+0+0" % (w, h))
 
+    @Profiler.profiled('Application.load_spec_file', 'gui')
     def load_spec_file(self, refresh = False):
 
         # Quit if file path does not exist
         if not self.file_path:
             return
 
+        if refresh and self.specfile is not None and self.specfile.specfile == self.file_path:
+            # Auto refresh mode: only the lines appended since the last refresh are parsed
+            new_scans, changed_scans = self.specfile.update()
+            self.spec_scans = self.specfile.get_scans()
+            if self.get_scans_filter() and (new_scans or changed_scans or self.specfile.restarted):
+                self.update_scan_index()
+            if self.specfile.restarted:
+                # File was replaced or truncated, so the whole list is rebuilt
+                self.widgets['scans_listbox'].clear()
+                self.append_scans_to_listbox(self.spec_scans.keys())
+                if self.current_scan in self.spec_scans:
+                    self.list_scan_data(self.current_scan)
+                else:
+                    self.load_first_scan()
+                return
+            self.append_scans_to_listbox(new_scans)
+            if self.current_scan in changed_scans:
+                self.list_scan_data(self.current_scan)
+            return
+
         self.widgets['scans_listbox'].clear()
 
-        self.specfile = SpecParser(self.file_path)
+        if self.specfile is not None:
+            self.specfile.close()
+        # Datasets of the previous file are not used any more (plot windows keep their own references)
+        self.datasets.clear()
+        self.specfile = SpecParser(self.file_path, lazy=True, use_cache=True, reader='mmap')
 
         self.spec_scans = self.specfile.get_scans()
 
-        for scan_id, scan_data in self.spec_scans.iteritems():
-            self.widgets['scans_listbox'].append(scan_data['command'] + ' (' + scan_data['date'] + ')', scan_data['id'])
+        if self.get_scans_filter():
+            self.update_scan_index()
+
+        self.append_scans_to_listbox(self.spec_scans.keys())
 
-        if refresh:
-            self.list_scan_data(self.current_scan) # For auto refresh mode
-        else:
-            self.load_first_scan() # For regular file opening
+        self.load_first_scan() # For regular file opening
+
+    def append_scans_to_listbox(self, scans_ids):
+        for scan_id in self.filter_scans_ids(scans_ids):
+            scan_data = self.spec_scans[scan_id]
+            self.widgets['scans_listbox'].append(scan_data['command'] + ' (' + scan_data['date'] + ')', scan_data['id'])
     
     def load_first_scan(self):
+        if not self.widgets['scans_listbox'].get_data():
+            return # Every scan was filtered out
         self.widgets['scans_listbox'].select_first()
         self.action_scans_listbox_select()
 
+    def get_scans_filter(self):
+        return self.widgets['entry_scans_filter'].stringvar.get().strip()
+
+    def update_scan_index(self, folder=False):
+        ' Index the open file (from its parser) and, if asked, the other SPEC files of its folder '
+        directory, file_name = os.path.split(self.file_path)
+        if self.scan_index is None or self.scan_index.directory != directory:
+            self.scan_index = ScanIndex(directory)
+        self.scan_index.add_file(file_name, self.specfile)
+        if folder:
+            self.scan_index.update()
+        self.scan_index.save()
+
+    def filter_scans_ids(self, scans_ids):
+        ' Scans of the open file matching the filter entry, looked up in the folder scan index '
+        text = self.get_scans_filter()
+        if not text or self.scan_index is None:
+            return scans_ids
+        try:
+            matches = set(scan_id for file_name, scan_id in self.scan_index.query_text(text, files=[os.path.basename(self.file_path)]))
+        except ValueError:
+            self.log('Invalid scans filter: ' + text)
+            return scans_ids
+        return [scan_id for scan_id in scans_ids if scan_id in matches]
+
+    def action_filter_scans(self, *args, **kwargs):
+        if self.specfile is None:
+            return
+        text = self.get_scans_filter()
+        if text:
+            self.update_scan_index(folder=True)
+        self.widgets['scans_listbox'].clear()
+        self.append_scans_to_listbox(self.spec_scans.keys())
+        if text:
+            self.log('* Filter "' + text + '": ' + str(len(self.widgets['scans_listbox'].get_data())) + ' scan(s)')
+            # Matches in the other SPEC files of the folder
+            try:
+                matches = OrderedDict()
+                for file_name, scan_id in self.scan_index.query_text(text):
+                    if file_name != self.filename:
+                        matches[file_name] = matches.get(file_name, 0) + 1
+                for file_name, count in matches.items():
+                    self.log('  also in ' + file_name + ': ' + str(count) + ' scan(s)')
+            except ValueError:
+                pass
+        self.load_first_scan()
+
+    @Profiler.profiled('Application.list_scan_data', 'gui')
     def list_scan_data(self, scan_num):
         self.list_scan_headers(scan_num)
         # Populate table with scan data
         self.current_scan = scan_num
         self.scan_data_model = lib.tkintertable.TableModels.TableModel()
 
-        num_cols = len(self.spec_scans[scan_num]['data_values_indexed'][0])
+        scan = self.spec_scans[scan_num]
+        num_cols = scan.num_columns()
 
         column_count = 0
-        for column in self.spec_scans[scan_num]['columns_names']:
+        for column in scan.columns_names:
             if column_count == num_cols:
                 break
             self.scan_data_model.addColumn(column)
             column_count += 1 
         
-        self.scan_data_model.data.update(self.spec_scans[scan_num]['data_values_indexed'])
+        # String rows are built from the numeric array only now, for the table
+        self.scan_data_model.data.update(scan.data_values_indexed)
         self.scan_data_model.reclist = self.scan_data_model.data.keys()
 
         self.widgets['data_table'].setModel(self.scan_data_model)
@@ -419,8 +525,8 @@ class Application(ttk.Frame):
 
     def list_scan_headers(self, scan_num):
         self.widgets['tree_headers'].clear()
-        for key, value in OrderedDict(sorted(zip(self.spec_scans[scan_num]['motors_names'], self.spec_scans[scan_num]['motors_positions']))).iteritems():
-            self.widgets['tree_headers'].append([key, value])
+        for name, position in self.spec_scans[scan_num].motors_items():
+            self.widgets['tree_headers'].append([name, position])
 
     def action_scans_listbox_select(self, *args, **kwargs):
         index = int(self.widgets['scans_listbox'].curselection()[0])
@@ -453,6 +559,27 @@ class Application(ttk.Frame):
         except:
             self.debug_log('Error writing ' + self.config_ini_file)
 
+    # Plotting stack, in import order (each module is a short step)
+    prewarm_modules = ['matplotlib', 'matplotlib.figure', 'matplotlib.pyplot', 'matplotlib.backends.backend_tkagg',
+                       'mpl_toolkits.axes_grid1', 'scipy.optimize', 'classes.gaussian_fit', 'classes.plots']
+
+    def prewarm_imports(self, step=0):
+        ''' Import the plotting stack while the user picks a file, one module per idle moment of the Tk thread
+        (an import in another thread would hold the import lock and could block the event handlers) '''
+        if step >= len(self.prewarm_modules):
+            return
+        try:
+            with self.profiler.span('Application.prewarm_imports', 'startup', module=self.prewarm_modules[step]):
+                importlib.import_module(self.prewarm_modules[step])
+        except Exception:
+            # Same import is done again (and its error shown) when a plot is requested
+            return
+        # Events waiting since this step are handled before the next one
+        self.after(50, self.after_idle, self.prewarm_imports, step + 1)
+
+    def action_profiling(self):
+        ProfilerWindow(master=self.master, application=self)
+
     def action_select_file(self):
         file_path = fd.askopenfilename(initialdir=self.default_open_dir, initialfile=self.default_open_file)
         self.open_file(file_path)
@@ -462,6 +589,7 @@ class Application(ttk.Frame):
         if file_path:
 
             file_path = file_path.replace('_xds-vhpt.ini', '') # Open data file even when clicking on project config file
+            file_path = re.sub('_xds-vhpt\.cache(-index)?$', '', file_path) # ... or on the parsed scans cache
             self.file_path = file_path
             self.store_default_open_dir(self.file_path)
             self.filename = os.path.basename(self.file_path)
@@ -530,91 +658,57 @@ class Application(ttk.Frame):
     def debug_log(self, text):
         print text
 
-    def get_selected_data(self):
-
+    def get_selected_dataset(self):
+        ''' Plot data and parameters of the current selection, computed once per (file, scan, rows,
+        columns selectors, formula, calibration), so that all the views of a selection share the data.
+        Each call gets its own copy of the parameters, which plot windows may modify. '''
+        key = self.selected_dataset_key()
+        if key in self.datasets:
+            self.datasets[key] = self.datasets.pop(key)
+            self.profiler.count('datasets cache hits')
+            data, parameters = self.datasets[key]
+            return data, copy.deepcopy(parameters)
+        self.profiler.count('datasets cache misses')
+        with self.profiler.span('Application.compute_dataset', 'gui'):
+            parameters = self.get_plot_parameters(None)
+            data = self.get_selected_data(parameters)
+        # Shared by plot windows, which must not modify it
+        data.flags.writeable = False
+        self.datasets[key] = (data, parameters)
+        while len(self.datasets) > self.max_datasets:
+            self.datasets.popitem(last=False)
+        return data, copy.deepcopy(parameters)
+
+    def selected_dataset_key(self):
+        entries = ['entry_pilatus_signal_columns', 'entry_pilatus_bg1_columns', 'entry_pilatus_bg2_columns', 'entry_i0_column', 'entry_energy_column',
+                   'entry_pilatus_formula', 'entry_incoming_energy_calib_param_A', 'entry_incoming_energy_calib_param_B']
+        scan = self.spec_scans[self.current_scan]
+        return (self.file_path, self.current_scan,
+                scan.end_offset, # Changes when rows are appended to the scan (auto refresh)
+                tuple(self.widgets['data_table'].get_selectedRecordNames()),
+                tuple(self.widgets[entry].stringvar.get() for entry in entries),
+                self.widgets['cb_calib'].var.get(),
+                self.widgets['cb_mogonio_calib'].var.get(),
+                RoiAxis.calibration_key(self.widgets['calib_tree'].get_data()))
+
+    def get_selected_data(self, p=None):
 
         indices = self.widgets['data_table'].get_selectedRecordNames()
-        data = self.widgets['data_table'].getModel().data
-        # At first I was using deepcopy to avoid messing up with the original data,
-        # but it was too slow, and I don't think it is needed anymore
-        # data = copy.deepcopy(self.widgets['data_table'].getModel().data)
-        p = self.get_plot_parameters_and_validate(data)
-        error = False
-
-        fields = {  'S': 'rois_signal_columns',
-                    'BG1': 'rois_bg1_columns',
-                    'BG2': 'rois_bg2_columns',
-                    'I0': 'i0_column'
-                 }
-
-        formula_contains_S = self.formula_contains_variable('S')
-        formula_contains_BG1 = self.formula_contains_variable('BG1')
-        formula_contains_BG2 = self.formula_contains_variable('BG2')
-        formula_contains_I0 = self.formula_contains_variable('I0')
-
-
-        for key in fields:
-            # Fields with False or [] contents should throw errors if on formula
-            if (self.formula_contains_variable(key)
-               and ((isinstance(p[fields[key]], (bool)) and not p[fields[key]])
-               or (not isinstance(p[fields[key]], (bool, int)) and len(p[fields[key]]) == 0))):
-                error = '* Error: Formula contains ' + key + ', but no column matched the user-defined filter'
-
-        if (formula_contains_S and formula_contains_BG1 and len(p['rois_signal_columns']) != len(p['rois_bg1_columns'])):
-            error = '* Error: Formula contains both S and BG1, but the number of columns differ'
-            
-        if (formula_contains_S and formula_contains_BG2 and len(p['rois_signal_columns']) != len(p['rois_bg2_columns'])):
-            error = '* Error: Formula contains both S and BG2, but the number of columns differ'
-
-        if (formula_contains_BG1 and formula_contains_BG2 and len(p['rois_bg1_columns']) != len(p['rois_bg2_columns'])):
-            error = '* Error: Formula contains both BG1 and BG2, but the number of columns differ'
-
-        if error:
-            self.log(error)
-            raise ValueError(error)
-
-        selected_data = list()
-        
-        rois_signal_cols = []
-        rois_bg1_cols = []
-        rois_bg2_cols = []
-
-        if formula_contains_S:
-            rois_signal_cols = p['rois_signal_columns']
-
-        if formula_contains_BG1:
-            rois_bg1_cols = p['rois_bg1_columns']
-        
-        if formula_contains_BG2:
-            rois_bg2_cols = p['rois_bg2_columns']
+        # Table records are the row indices of the scan float array
+        data = self.spec_scans[self.current_scan].data
+        if p is None:
+            p = self.get_plot_parameters_and_validate(data)
 
-        for row in indices:
-            if row in data:
-                selected_data.append(data[row])
-        selected_data = np.array(selected_data)
-
-        formula = p['rois_formula'] 
-        if formula_contains_S:
-            formula = formula.replace('S', 'selected_data[:, [' + ', '.join(map(str, rois_signal_cols))  + ']].astype("float")')
-        if formula_contains_BG1:
-            formula = formula.replace('BG1', 'selected_data[:, [' + ', '.join(map(str, rois_bg1_cols))  + ']].astype("float")')
-        if formula_contains_BG2:
-            formula = formula.replace('BG2', 'selected_data[:, [' + ', '.join(map(str, rois_bg2_cols))  + ']].astype("float")')
-        if formula_contains_I0:
-            formula = formula.replace('I0', 'selected_data[:, ' + str(p['i0_column']) + '].reshape(' + str(len(selected_data)) + ', 1).astype("float")')
-
-        intensity_values = eval(formula).astype('string')
-        selected_data = np.column_stack((selected_data, intensity_values))
-
-        return selected_data
+        try:
+            return Processing.intensities(data, p, indices)
+        except ValueError as e:
+            self.log('* Error: ' + str(e))
+            raise
 
     def formula_contains_variable(self, variable):
-        rois_formula = self.widgets['entry_pilatus_formula'].stringvar.get()
-        # A white space is preppended to the formula to simplify the regex
-        formula = ' ' + rois_formula + ' '
-        if re.search('[^a-zA-Z0-9]' + re.escape(variable) + '[^a-zA-Z0-9]', formula) is not None:
-            return True
-        else:
+        try:
+            return variable in Formula.compile(self.widgets['entry_pilatus_formula'].stringvar.get()).names
+        except ValueError:
             return False
 
     def save_project_config(self):
@@ -730,91 +824,86 @@ class Application(ttk.Frame):
         except:
             self.debug_log('Error reading config "Mogonio_Calibration_A and/or Mogonio_Calibration_B"')
 
+    @Profiler.profiled('Application.action_xes', 'gui')
     def action_xes(self):
         self.save_project_config()
-        self.plot_xes(self.get_selected_data())
+        self.plot_xes(*self.get_selected_dataset())
 
     def action_mogonio_calibration_wizard(self):
         self.save_project_config()
         self.widgets['cb_mogonio_calib'].var.set(0)
-        self.plot_mogonio_calibration_wizard(self.get_selected_data())
+        self.plot_mogonio_calibration_wizard(*self.get_selected_dataset())
 
+    @Profiler.profiled('Application.action_rxes', 'gui')
     def action_rxes(self):
         self.save_project_config()
-        self.plot_rxes(self.get_selected_data())
+        self.plot_rxes(*self.get_selected_dataset())
 
+    @Profiler.profiled('Application.action_herfd', 'gui')
     def action_herfd(self):
         self.save_project_config()
-        self.plot_herfd(self.get_selected_data())
+        self.plot_herfd(*self.get_selected_dataset())
 
-    def plot_mogonio_calibration_wizard(self, data):
+    def plot_mogonio_calibration_wizard(self, data, parameters):
 
         self.log('======== Mogonio Calibration ==========')
         self.figure_number += 1
         self.log('* Figure %.0f - Mogonio Calibration - %s' % (self.figure_number, os.path.basename(self.file_path))) 
 
-        # Prepare numpy array
-        parameters = self.get_plot_parameters_and_validate(data)
-        nparray = Tools.mixed_array_to_float(data)
+        self.validate_plot_parameters(parameters)
 
         # Create a new plot window
-        plot = MogonioCalibrationPlot(master = self.master, parameters = parameters, data = nparray, application = self, figure_number = self.figure_number)
+        from classes.plots import MogonioCalibrationPlot
+        plot = MogonioCalibrationPlot(master = self.master, parameters = parameters, data = data, application = self, figure_number = self.figure_number)
 
-    def plot_xes(self, data):
+    def plot_xes(self, data, parameters):
 
         self.log('======== XES ==========')
         self.figure_number += 1
         self.log('* Figure %.0f - XES - %s' % (self.figure_number, os.path.basename(self.file_path))) 
 
-        # Prepare numpy array
-        parameters = self.get_plot_parameters_and_validate(data)
-        nparray = Tools.mixed_array_to_float(data)
+        self.validate_plot_parameters(parameters)
 
         # Create a new plot window
-        plot = XESPlot(master = self.master, parameters = parameters, data = nparray, application = self, figure_number = self.figure_number)
+        from classes.plots import XESPlot
+        plot = XESPlot(master = self.master, parameters = parameters, data = data, application = self, figure_number = self.figure_number)
 
-    def plot_herfd(self, data):
+    def plot_herfd(self, data, parameters):
 
         self.log('======= HERFD =========')
         self.figure_number += 1
         self.log('* Figure %.0f' % self.figure_number) 
 
-        # Prepare numpy array
-        nparray = Tools.mixed_array_to_float(data)
+        self.validate_plot_parameters(parameters)
 
         # Create a new plot window
-        parameters = self.get_plot_parameters_and_validate(data)
-        plot = HERFDPlot(master = self.master, parameters = parameters, data = nparray, application = self, figure_number = self.figure_number)
+        from classes.plots import HERFDPlot
+        plot = HERFDPlot(master = self.master, parameters = parameters, data = data, application = self, figure_number = self.figure_number)
 
     def update_current_selected_data(self):
         # Prepare data
-        data = self.get_selected_data()
-        nparray = Tools.mixed_array_to_float(data)
-        # Create new plot window
-        parameters = self.get_plot_parameters_and_validate(data)
-        self.current_selected_data = nparray 
-        self.current_parameters = parameters
+        self.current_selected_data, self.current_parameters = self.get_selected_dataset()
+        self.validate_plot_parameters(self.current_parameters)
 
     def action_calib_preview(self, *args, **kwargs):
         # Prepare data
-        data = self.get_selected_data()
-        nparray = Tools.mixed_array_to_float(data)
-        parameters = self.get_plot_parameters_and_validate(data)
+        data, parameters = self.get_selected_dataset()
+        self.validate_plot_parameters(parameters)
         # Create new plot window
-        plot = CalibrationPlot(master = self.master, parameters = parameters, data = nparray, application = self, figure_number = self.figure_number)
+        from classes.plots import CalibrationPlot
+        plot = CalibrationPlot(master = self.master, parameters = parameters, data = data, application = self, figure_number = self.figure_number)
 
-    def plot_rxes(self, data):
+    def plot_rxes(self, data, parameters):
 
         self.log('======== RXES =========')
         self.figure_number += 1
         self.log('* Figure %.0f' % self.figure_number) 
 
-        # Prepare data
-        nparray = Tools.mixed_array_to_float(data)
-        parameters = self.get_plot_parameters_and_validate(data)
+        self.validate_plot_parameters(parameters)
 
         # Create new plot window
-        plot = RXESPlot(master = self.master, parameters = parameters, data = nparray, application = self, figure_number = self.figure_number)
+        from classes.plots import RXESPlot
+        plot = RXESPlot(master = self.master, parameters = parameters, data = data, application = self, figure_number = self.figure_number)
 
     def get_plot_parameters_and_validate(self, data):
         parameters = self.get_plot_parameters(data)
@@ -836,72 +925,21 @@ class Application(ttk.Frame):
             self.log('* Using mogonio energy calibration')
 
     def get_plot_parameters(self, data):
+        # Same parameters as the batch mode, from the current fields values instead of the project config
+        return self.get_project().plot_parameters(self.scan_data_model.columnNames)
 
-        columnNames = self.scan_data_model.columnNames
-    
-        rois_signal_columns = self.get_columns_indices(columnNames, self.widgets['entry_pilatus_signal_columns'].stringvar.get())
-        rois_signal_names = np.asarray(columnNames)[rois_signal_columns]
-
-        rois_bg1_columns = self.get_columns_indices(columnNames, self.widgets['entry_pilatus_bg1_columns'].stringvar.get())
-        rois_bg1_names = np.asarray(columnNames)[rois_bg1_columns]
-
-        rois_bg2_columns = self.get_columns_indices(columnNames, self.widgets['entry_pilatus_bg2_columns'].stringvar.get())
-        rois_bg2_names = np.asarray(columnNames)[rois_bg2_columns]
-
-        # This is automatically populated elsewhere according to Intensity Formula
-        #intensity_columns = self.get_columns_indices(columnNames, '__intensity_*')
-        intensity_columns = range(len(columnNames), len(columnNames)+len(rois_signal_columns))
-        intensity_names = rois_signal_names
-
-        energy_column_list = self.get_columns_indices(columnNames, self.widgets['entry_energy_column'].stringvar.get())
-        if energy_column_list:
-            energy_column = energy_column_list[0]
-        else:
-            energy_column = False
-
-        i0_column_list = self.get_columns_indices(columnNames, self.widgets['entry_i0_column'].stringvar.get())
-        if i0_column_list:
-            i0_column = i0_column_list[0]
-            i0_name = np.asarray(columnNames)[i0_column]
-        else:
-            i0_column = False
-            i0_name = ''
-
-        rois_formula = self.widgets['entry_pilatus_formula'].stringvar.get()
-        use_calibration = self.widgets['cb_calib'].var.get()
-        calibration_data = self.widgets['calib_tree'].get_data()
-        use_mogonio_calibration = self.widgets['cb_mogonio_calib'].var.get()
-        try:
-            mogonio_calibration_a = float(self.widgets['entry_incoming_energy_calib_param_A'].stringvar.get())
-        except:
-            mogonio_calibration_a = 1.0
-
-        try:
-            mogonio_calibration_b = float(self.widgets['entry_incoming_energy_calib_param_B'].stringvar.get())
-        except:
-            mogonio_calibration_b = 1.0
-
-        parameters = {
-            'rois_signal_columns': rois_signal_columns,
-            'rois_bg1_columns': rois_bg1_columns,
-            'rois_bg2_columns': rois_bg2_columns,
-            'energy_column': energy_column,
-            'i0_column': i0_column,
-            'i0_name': i0_name,
-            'rois_signal_names': rois_signal_names,
-            'rois_bg1_names': rois_bg1_names,
-            'rois_bg2_names': rois_bg2_names,
-            'rois_formula': rois_formula,
-            'use_calibration': use_calibration,
-            'use_mogonio_calibration': use_mogonio_calibration,
-            'calibration_data': calibration_data,
-            'intensity_columns': intensity_columns,
-            'intensity_names': intensity_names,
-            'mogonio_calibration_a': mogonio_calibration_a,
-            'mogonio_calibration_b': mogonio_calibration_b,
-            'row_number_column': 0,
-        }
-        return parameters
+    def get_project(self):
+        settings = dict()
+        for config in self.configs:
+            try:
+                settings[config] = str(self.widgets[self.configs[config]].var.get())
+            except:
+                pass
+            try:
+                settings[config] = self.widgets[self.configs[config]].stringvar.get()
+            except:
+                pass
+        return Project(settings, self.widgets['calib_tree'].get_data())
     
     def columns_names_parse_as_int(self, columns_names):
         return_list = list()
@@ -910,50 +948,8 @@ class Application(ttk.Frame):
         return return_list
 
     def get_columns_indices(self, columns_list, pattern=''):
-        # Remove spaces
-        pattern = pattern.replace(' ', '')
-        # Split into commas 
-        groups = pattern.split(',')
-        range_list = list()
-        pattern_list = list()
-        for group in groups:
-            # First check if group is a range
-            group_limits = group.split('-') 
-            if len(group_limits) == 2:
-                range_list.append({'begin': group_limits[0], 'end': group_limits[1], 'status': False})
-            elif len(group_limits) == 1 and group_limits[0].find('*') == -1:
-                range_list.append({'begin': group_limits[0], 'end': group_limits[0], 'status': False})
-            elif len(group_limits) == 1 and group_limits[0].find('*') > -1:
-                escaped_pattern = re.escape(group_limits[0])
-                escaped_pattern = '^' + escaped_pattern.replace('\*', '.+') + '$'
-                pattern_list.append(escaped_pattern)
-        
-        return_list = list()
-        index = 0
-        for column_name in columns_list:
-            inside_range = False
-            # Range start
-            for group_limit in range_list:
-                if group_limit['status'] == True:
-                    inside_range = True
-                if column_name == group_limit['begin']:
-                    group_limit['status'] = True
-                    inside_range = True
-
-            for regex_pattern in pattern_list:
-                if re.search(regex_pattern, column_name):
-                    inside_range = True
-
-            # Inside range logic
-            if inside_range:
-                return_list.append(index)
-
-            # Range end
-            for group_limit in range_list:
-                if column_name == group_limit['end']:
-                    group_limit['status'] = False
-            index += 1
-        return return_list
+        # Parsed once per pattern, resolved once per (pattern, columns names)
+        return ColumnSelector.select(pattern, columns_list)
 
     # This functions loops every 10 seconds
     def timer(self):
@@ -963,11 +959,17 @@ class Application(ttk.Frame):
         self.after(10000, self.timer)
 
 
-# Init TK Master
-root = tk.Tk()
-root.geometry("1000x700+30+30") # width x height + padding_x + padding_y
+# Guard needed by multiprocessing, whose workers (on Windows) import this module again
+if __name__ == '__main__':
+
+    # Init TK Master
+    root = tk.Tk()
+    root.geometry("1000x700+30+30") # width x height + padding_x + padding_y
 
-# Init Application
-app = Application(master=root)
-#app.after(0, app.timer)
-app.mainloop()
+    # Init Application
+    app = Application(master=root)
+    app.after(0, app.timer)
+    app.after(500, app.prewarm_imports)
+    app.mainloop()
+    if app.specfile is not None:
+        app.specfile.close()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline of LNLS
+# Batch mode: XES, HERFD and RXES results of SPEC files, without the GUI (Tkinter is never imported)
+# Created: 2026-10-17
+#
+# Usage examples:
+#   python batch.py sample_data/H2PtCl6_Lalpha_Si100-LNLS002
+#   python batch.py --list /data/night
+#   python batch.py --scans 0.1,0.2 --types xes,herfd --output /tmp/results /data/night/file1 /data/night/file2
+#   python batch.py --filter "ascan mo_e time=60" --config /data/project_xds-vhpt.ini /data/night
+#   python batch.py --profile /tmp/trace.json sample_data/H2PtCl6_Lalpha_Si100-LNLS002
+# Columns selectors, intensity formula and calibrations are read from each file project config
+# (<file>_xds-vhpt.ini, as saved by the GUI), or from --config for all the files.
+# Folders are expanded to the SPEC files they contain. Scans are processed in parallel (--processes),
+# and results are written as text files <file>_S<scan>_<type>.txt in the output folder
+# (by default, the folder of each SPEC file):
+# * xes: emitted energy (or ROI) and intensity summed over all the scan rows
+# * herfd: incoming energy and intensity summed over all the ROIs
+# * rxes: intensities matrix (rows = incoming energies, columns = ROIs), the emitted axis being its
+#   first row and the incoming energies its first column
+# With --profile, the slowest operations are printed at the end and the trace is written in the Chrome
+# trace format (chrome://tracing, Perfetto); scans are then processed in this process only.
+
+import os
+import sys
+import argparse
+import multiprocessing
+import numpy as np
+
+# Custom classes
+from classes.spec_parser import *
+from classes.scan_index import *
+from classes.project import *
+from classes.processing import *
+from classes.profiler import *
+
+result_types = ['xes', 'herfd', 'rxes']
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='XES, HERFD and RXES results of SPEC files, without the GUI.')
+    parser.add_argument('paths', nargs='+', help='SPEC files, or folders of SPEC files')
+    parser.add_argument('--output', '-o', default=None, help='output folder (default: the folder of each SPEC file)')
+    parser.add_argument('--scans', default='', help='comma separated scans ids, as listed by --list (default: all scans)')
+    parser.add_argument('--filter', default='', help='scans filter, with the syntax of the GUI "Filter scans" field (e.g. "ascan dcm_energy=11.5:11.6")')
+    parser.add_argument('--types', default=','.join(result_types), help='comma separated results to write among ' + ', '.join(result_types) + ' (default: all)')
+    parser.add_argument('--config', default=None, help='project config (ini file) used for all the files, instead of their own')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='worker processes (default: one per CPU)')
+    parser.add_argument('--list', action='store_true', help='only list the selected scans')
+    parser.add_argument('--profile', default=None, metavar='TRACE_FILE', help='print the slowest operations and write a trace (JSON) to TRACE_FILE')
+    options = parser.parse_args(argv)
+    options.types = [name.strip() for name in options.types.split(',') if name.strip()]
+    for name in options.types:
+        if name not in result_types:
+            parser.error('unknown result type: ' + name)
+    options.scans = set(scan_id.strip() for scan_id in options.scans.split(',') if scan_id.strip())
+    if options.profile is not None:
+        # Spans are recorded per process, so the workers would not be in the trace
+        options.processes = 1
+    return options
+
+def spec_files(paths):
+    ' SPEC files of the given paths, folders being expanded to the SPEC files they contain '
+    files = list()
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, file_name) for file_name in sorted(os.listdir(path)) if ScanIndex.is_spec_file(os.path.join(path, file_name)))
+        else:
+            files.append(path)
+    return files
+
+def select_scans(file_path, options):
+    ' Scans (headers only, data is read by the workers) of a SPEC file selected by --scans and --filter '
+    # Headers only: data blocks are not parsed in lazy mode
+    parser = SpecParser(file_path, lazy=True, reader='mmap')
+    scans = parser.get_scans()
+    scans_ids = scans.keys()
+    if options.scans:
+        scans_ids = [scan_id for scan_id in scans_ids if scan_id in options.scans]
+    if options.filter:
+        directory, file_name = os.path.split(os.path.abspath(file_path))
+        # The folder index is only updated in memory, so that parallel runs never write it at the same time
+        scan_index = ScanIndex(directory)
+        scan_index.add_file(file_name, parser)
+        matches = set(scan_id for match_file, scan_id in scan_index.query_text(options.filter, files=[file_name]))
+        scans_ids = [scan_id for scan_id in scans_ids if scan_id in matches]
+    # Scans without data lines (aborted) have nothing to process
+    return [scans[scan_id] for scan_id in scans_ids if scans[scan_id].data_offset is not None]
+
+def output_path(file_path, scan, result_type, options):
+    directory = options.output if options.output is not None else os.path.dirname(os.path.abspath(file_path))
+    return os.path.join(directory, '%s_S%s_%s.txt' % (os.path.basename(file_path), scan.id, result_type))
+
+@Profiler.profiled('batch.process_scan', 'batch')
+def process_scan(job):
+    ''' Process pool worker: parse the data of one scan, compute its intensities and write its results.
+    Returns (file path, scan id, written files, error message or None). '''
+    file_path, scan, project, options = job
+    written = list()
+    try:
+        SpecParser.read_scan_text(file_path, scan, 'mmap')
+        p = project.plot_parameters(scan.columns_names)
+        data = Processing.intensities(scan.get_loaded_data(), p)
+        if len(p['intensity_columns']) == 0:
+            raise ValueError('No ROI column was selected')
+        if isinstance(p['energy_column'], bool) and not p['energy_column'] and set(options.types) & set(['herfd', 'rxes']):
+            raise ValueError('No energy column was selected')
+        emitted_label = 'Emitted energy (keV)' if p['use_calibration'] and p['calibration_data'] else 'ROI'
+        incoming_label = 'Incoming energy (keV)' if p['use_mogonio_calibration'] else scan.columns_names[p['energy_column']]
+        header = '%s - scan %s - %s\nFormula: %s\n' % (os.path.basename(file_path), scan.id, scan.command, p['rois_formula'])
+        for result_type in options.types:
+            path = output_path(file_path, scan, result_type, options)
+            if result_type == 'xes':
+                x, y = Processing.xes(data, p)
+                np.savetxt(path, np.column_stack([x, y]), header=header + emitted_label + '\tIntensity (sum of %d rows)' % len(data))
+            elif result_type == 'herfd':
+                x, y = Processing.herfd(data, p)
+                np.savetxt(path, np.column_stack([x, y]), header=header + incoming_label + '\tIntensity (sum of %d ROIs)' % len(p['intensity_columns']))
+            elif result_type == 'rxes':
+                x, y, z = Processing.rxes(data, p)
+                matrix = np.empty((z.shape[0] + 1, z.shape[1] + 1))
+                matrix[0, 0] = np.nan
+                matrix[0, 1:] = x
+                matrix[1:, 0] = y
+                matrix[1:, 1:] = z
+                np.savetxt(path, matrix, header=header + 'First row: ' + emitted_label + ', first column: ' + incoming_label)
+            written.append(path)
+    except Exception as e:
+        return file_path, scan.id, written, str(e)
+    finally:
+        scan.unload()
+    return file_path, scan.id, written, None
+
+def main(argv):
+    options = parse_arguments(argv)
+    if options.output is not None and not os.path.isdir(options.output):
+        os.makedirs(options.output)
+
+    jobs = list()
+    for file_path in spec_files(options.paths):
+        try:
+            scans = select_scans(file_path, options)
+            project = Project.load(options.config if options.config is not None else file_path)
+        except (IOError, OSError, ValueError) as e:
+            print 'Error: %s: %s' % (file_path, e)
+            return 1
+        for scan in scans:
+            if options.list:
+                print '%s\t%s\t%s\t%s' % (file_path, scan.id, scan.command, scan.date)
+            jobs.append((file_path, scan, project, options))
+    if options.list or not jobs:
+        if not jobs:
+            print 'No scan selected'
+        return 0
+
+    errors = 0
+    if options.processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(options.processes, len(jobs)))
+        results = pool.imap_unordered(process_scan, jobs)
+    else:
+        pool = None
+        results = (process_scan(job) for job in jobs)
+    try:
+        for file_path, scan_id, written, error in results:
+            if error is not None:
+                errors += 1
+                print 'Error: %s scan %s: %s' % (file_path, scan_id, error)
+            else:
+                print '%s scan %s: %s' % (file_path, scan_id, ', '.join(os.path.basename(path) for path in written))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    print '%d scan(s) processed, %d error(s)' % (len(jobs), errors)
+    if options.profile is not None:
+        print '\n'.join(Profiler.report())
+        print 'Trace with %d events written to %s' % (Profiler.export_trace(options.profile), options.profile)
+    return 1 if errors else 0
+
+# Guard needed by multiprocessing, whose workers (on Windows) import this module again
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
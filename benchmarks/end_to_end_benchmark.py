@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Benchmark suite: parsing, selection, formula, RXES gridding and export on synthetic SPEC files at several scales
+# Date created: 2026-10-17
+#
+# Usage examples:
+#   python benchmarks/end_to_end_benchmark.py                          # small and medium scales
+#   python benchmarks/end_to_end_benchmark.py --scale large --stage parse --stage stream
+#   python benchmarks/end_to_end_benchmark.py --scans 50 --points 200 --rois 487 --transferred-scans 0
+# Files are generated once by spec_generator.py in the temporary folder (and reused by later runs).
+# Each stage runs in its own process, so that its peak memory is measured alone:
+# * parse: whole file parsed at once (SpecParser, mmap reader)
+# * index: headers only (lazy SpecParser), as when a file is opened in the GUI
+# * stream: every scan read one at a time (iter_scans)
+# * select: plot parameters (columns selectors) and rows selection of every scan
+# * formula: intensity formula over every scan
+# * rxes: RXES grids of every scan, emitted energy and energy transfer (the latter for --transferred-scans scans)
+# * export: XES, HERFD and RXES text files of every scan, as written by batch.py
+# Throughput is given in MB of the SPEC file per second for every stage (select, formula and rxes times
+# do not include reading the scans; stream and export times do).
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import multiprocessing
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import spec_generator
+from classes.spec_parser import SpecParser, iter_scans
+from classes.project import Project
+from classes.processing import Processing
+
+# Scale name: (scans, points per scan, ROIs)
+scales = {
+    'small': (20, 65, 487),
+    'medium': (100, 65, 1461),
+    'large': (400, 65, 1461),
+    'wide': (20, 1000, 1461),
+}
+stages = ['parse', 'index', 'stream', 'select', 'formula', 'rxes', 'export']
+
+def spec_file(scans, points, rois):
+    ' Generated file for these dimensions (with restarts, interleaved motors headers and aborted scans) '
+    file_path = os.path.join(tempfile.gettempdir(), 'xds_vhpt_e2e_%ds_%dp_%dr.spec' % (scans, points, rois))
+    if not os.path.exists(file_path):
+        print 'Generating ' + file_path
+        spec_generator.generate(file_path, scans, points=points, rois=rois, restarts=2, motors_every=25, aborted_every=9)
+    return file_path
+
+def project(rois):
+    ' Signal and two backgrounds of a third of the ROIs each, as set up at the beamline '
+    third = rois // 3
+    return Project({
+        's': 'pl0-pl%d' % (third - 1),
+        'bg1': 'pl%d-pl%d' % (third, 2 * third - 1),
+        'bg2': 'pl%d-pl%d' % (2 * third, 3 * third - 1),
+        'i0': 'I0',
+        'energy': 'dcm_energy',
+        'formula': '(S-(BG1+BG2)/2)/I0',
+        'emitted_energy_calibration_enabled': '1',
+    }, [{'roi': 0.1 * third, 'energy': 9.44}, {'roi': 0.9 * third, 'energy': 9.36}])
+
+def run_stage(stage, file_path, rois, transferred_scans):
+    ' Run one stage, returns (seconds, scans, cells) '
+    if stage == 'parse':
+        start = time.time()
+        scans = SpecParser(file_path, reader='mmap').get_scans()
+        elapsed = time.time() - start
+        return elapsed, len(scans), sum(scan.data.size for scan in scans.values())
+
+    if stage == 'index':
+        start = time.time()
+        scans = SpecParser(file_path, lazy=True, reader='mmap').get_scans()
+        return time.time() - start, len(scans), 0
+
+    if stage == 'stream':
+        start = time.time()
+        num_scans = 0
+        cells = 0
+        for scan in iter_scans(file_path):
+            num_scans += 1
+            cells += scan.get_loaded_data().size
+        return time.time() - start, num_scans, cells
+
+    if stage == 'export':
+        import batch
+        output = tempfile.mkdtemp(prefix='xds_vhpt_e2e_export_')
+        try:
+            options = batch.parse_arguments(['--output', output, '--processes', '1', file_path])
+            start = time.time()
+            jobs = [(file_path, scan, project(rois), options) for scan in batch.select_scans(file_path, options)]
+            results = [batch.process_scan(job) for job in jobs]
+            elapsed = time.time() - start
+        finally:
+            shutil.rmtree(output)
+        errors = [error for file_name, scan_id, written, error in results if error is not None]
+        if errors:
+            raise RuntimeError(errors[0])
+        return elapsed, len(jobs), 0
+
+    # Stages over the scans read one at a time, the reading time is not included
+    elapsed = 0.0
+    num_scans = 0
+    cells = 0
+    settings = project(rois)
+    for scan in iter_scans(file_path):
+        data = scan.get_loaded_data()
+        num_scans += 1
+        cells += data.size
+        start = time.time()
+        if stage == 'select':
+            p = settings.plot_parameters(scan.columns_names)
+            # All the rows, as selected by default in the GUI table
+            selected = data[range(len(data))]
+        elif stage in ['formula', 'rxes']:
+            p = settings.plot_parameters(scan.columns_names)
+            computed = Processing.intensities(data, p)
+            if stage == 'rxes':
+                start = time.time()
+                emitted, incoming = Processing.emitted_axis(p), Processing.incoming_energies(computed, p)
+                block = Processing.intensity_block(computed, p)
+                Processing.rxes_grid(emitted, incoming, block)
+                # Maps of a single row can not be interpolated
+                if num_scans <= transferred_scans and len(block) > 1:
+                    Processing.rxes_grid(emitted, incoming, block, transferred=True)
+        elapsed += time.time() - start
+    return elapsed, num_scans, cells
+
+def stage_in_child(stage, file_path, rois, transferred_scans, queue):
+    try:
+        elapsed, num_scans, cells = run_stage(stage, file_path, rois, transferred_scans)
+        # ru_maxrss is in kilobytes on Linux
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        queue.put((elapsed, num_scans, cells, peak_mb, None))
+    except Exception as e:
+        queue.put((0, 0, 0, 0, str(e)))
+
+def run(stage, file_path, rois, transferred_scans):
+    # Each measurement runs in its own process, so that the peak memory is not shared
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=stage_in_child, args=(stage, file_path, rois, transferred_scans, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end benchmark suite')
+    parser.add_argument('--scale', action='append', choices=sorted(scales), help='scale(s) to run (default: small and medium)')
+    parser.add_argument('--scans', type=int, help='custom scale: number of scans (with --points and --rois)')
+    parser.add_argument('--points', type=int, default=65, help='custom scale: points per scan')
+    parser.add_argument('--rois', type=int, default=1461, help='custom scale: number of ROIs')
+    parser.add_argument('--stage', action='append', choices=stages, help='stage(s) to run (default: all)')
+    parser.add_argument('--transferred-scans', type=int, default=1000000, help='scans with an energy transfer RXES grid in the rxes stage (default: all)')
+    args = parser.parse_args()
+
+    dimensions = [scales[name] for name in (args.scale or ([] if args.scans else ['small', 'medium']))]
+    if args.scans:
+        dimensions.append((args.scans, args.points, args.rois))
+
+    for scans, points, rois in dimensions:
+        file_path = spec_file(scans, points, rois)
+        file_mb = os.path.getsize(file_path) / 1024.0 / 1024.0
+        print '[%d scans x %d points x %d ROIs] %s (%.1f MB)' % (scans, points, rois, file_path, file_mb)
+        for stage in args.stage or stages:
+            elapsed, num_scans, cells, peak_mb, error = run(stage, file_path, rois, args.transferred_scans)
+            if error is not None:
+                print '  %-8s error: %s' % (stage, error)
+                continue
+            print '  %-8s %9.3f s  %9.1f MB/s  scans: %4d  peak memory: %7.1f MB' % (stage, elapsed, file_mb / elapsed if elapsed > 0 else float('inf'), num_scans, peak_mb)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Benchmark: Processing steps (intensity formula, sums, RXES grids, profiles) on synthetic scans
+# Date created: 2026-10-17
+#
+# Usage examples:
+#   python benchmarks/processing_benchmark.py
+#   python benchmarks/processing_benchmark.py --rows 65 --rows 1000 --rois 487 --rois 1461 --repeat 5
+#   python benchmarks/processing_benchmark.py --no-transferred   # skip the energy transfer interpolation (slowest step)
+#   python benchmarks/processing_benchmark.py --no-griddata      # energy transfer map by row resampling only
+# Scans are generated in memory (no SPEC file): dcm_energy, I0 and three blocks of pl* columns
+# (signal and two backgrounds), with Poisson counts around an emission line that moves with energy.
+# The energy transfer map is interpolated both ways (row resampling and griddata triangulation), and the
+# differences between the two meshes are reported.
+
+import os
+import sys
+import time
+import argparse
+import warnings
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+import numpy as np
+from classes.project import Project
+from classes.processing import Processing
+
+def synthetic_scan(rows, rois, seed=0):
+    ' (columns names, data array) of a scan with rows energies and 3 x rois Pilatus columns '
+    random = np.random.RandomState(seed)
+    columns_names = ['row_number', 'dcm_energy', 'I0'] + ['pl' + str(i) for i in range(3 * rois)]
+    energies = np.linspace(11.54, 11.605, rows)
+    # Emission line centered on a ROI that depends on the incoming energy (sheared map, as in real RXES)
+    centers = np.linspace(0.3, 0.7, rows) * rois
+    signal = 20 + 500 * np.exp(-0.5 * ((np.arange(rois)[np.newaxis, :] - centers[:, np.newaxis]) / (0.02 * rois)) ** 2)
+    data = np.empty((rows, len(columns_names)))
+    data[:, 0] = np.arange(1, rows + 1)
+    data[:, 1] = energies
+    data[:, 2] = random.normal(8.4e6, 1e4, rows)
+    data[:, 3:3 + rois] = random.poisson(signal)
+    data[:, 3 + rois:] = random.poisson(20, size=(rows, 2 * rois))
+    return columns_names, data
+
+def project(rois):
+    return Project({
+        's': 'pl0-pl%d' % (rois - 1),
+        'bg1': 'pl%d-pl%d' % (rois, 2 * rois - 1),
+        'bg2': 'pl%d-pl%d' % (2 * rois, 3 * rois - 1),
+        'i0': 'I0',
+        'energy': 'dcm_energy',
+        'formula': '(S-(BG1+BG2)/2)/I0',
+        'emitted_energy_calibration_enabled': '1',
+    }, [{'roi': 0.1 * rois, 'energy': 9.44}, {'roi': 0.9 * rois, 'energy': 9.36}])
+
+def best_time(function, repeat):
+    ' Best wall time of repeat calls, and the last result '
+    best = None
+    for index in range(repeat):
+        start = time.time()
+        result = function()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def clicked_profiles(grid):
+    ' Profiles centered on a point of the map, fitted inside a view of half of it (as after a click on "Profile center") '
+    X, Y = grid[0], grid[1]
+    (x_low, x_high), (y_low, y_high) = sorted([np.amin(X), np.amax(X)]), sorted([np.amin(Y), np.amax(Y)])
+    xlim = [x_low + (x_high - x_low) / 4, x_high - (x_high - x_low) / 4]
+    ylim = [y_low + (y_high - y_low) / 4, y_high - (y_high - y_low) / 4]
+    return Processing.rxes_profiles(grid, sum(xlim) / 2, sum(ylim) / 2, xlim, ylim)
+
+def run(rows, rois, repeat, transferred, compare_griddata=True):
+    columns_names, data = synthetic_scan(rows, rois)
+    p = project(rois).plot_parameters(columns_names)
+    input_mb = data.nbytes / 1024.0 / 1024.0
+    results = list()
+
+    elapsed, computed = best_time(lambda: Processing.intensities(data, p), repeat)
+    results.append(('intensities (formula)', elapsed, input_mb))
+    block = Processing.intensity_block(computed, p)
+    block_mb = block.nbytes / 1024.0 / 1024.0
+
+    elapsed, normalized = best_time(lambda: Processing.normalize(block, 2.0, 0.5), repeat)
+    results.append(('normalize', elapsed, block_mb))
+    elapsed, xes = best_time(lambda: Processing.xes(computed, p), repeat)
+    results.append(('XES sum', elapsed, block_mb))
+    elapsed, herfd = best_time(lambda: Processing.herfd(computed, p), repeat)
+    results.append(('HERFD sum', elapsed, block_mb))
+
+    emitted, incoming = Processing.emitted_axis(p), Processing.incoming_energies(computed, p)
+    elapsed, grid = best_time(lambda: Processing.rxes_grid(emitted, incoming, block), repeat)
+    results.append(('RXES grid (emitted)', elapsed, block_mb))
+    elapsed, profiles = best_time(lambda: Processing.rxes_profiles(grid), repeat)
+    results.append(('RXES profiles (emitted)', elapsed, block_mb))
+    elapsed, profiles = best_time(lambda: clicked_profiles(grid), repeat)
+    results.append(('RXES profiles (emitted, clicked)', elapsed, block_mb))
+
+    notes = list()
+    if transferred:
+        elapsed, grid = best_time(lambda: Processing.rxes_grid(emitted, incoming, block, transferred=True, interpolation='rows'), repeat)
+        results.append(('RXES grid (transferred, rows)', elapsed, block_mb))
+        elapsed, profiles = best_time(lambda: Processing.rxes_profiles(grid), repeat)
+        results.append(('RXES profiles (transferred)', elapsed, block_mb))
+        elapsed, profiles = best_time(lambda: clicked_profiles(grid), repeat)
+        results.append(('RXES profiles (transferred, clicked)', elapsed, block_mb))
+        if compare_griddata:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore') # matplotlib.mlab.griddata deprecation
+                elapsed, reference = best_time(lambda: Processing.rxes_grid(emitted, incoming, block, transferred=True, interpolation='griddata'), repeat)
+            results.append(('RXES grid (transferred, griddata)', elapsed, block_mb))
+            # Mesh points interpolated by both (the row resampling leaves out thin slivers along the slanted edges)
+            rows_mesh, griddata_mesh = grid[5], reference[5]
+            both = ~np.ma.getmaskarray(rows_mesh) & ~np.ma.getmaskarray(griddata_mesh)
+            difference = np.abs(rows_mesh.filled(0) - griddata_mesh.filled(0))[both]
+            notes.append('rows vs griddata: max difference %.4f, mean %.5f (of 1), %d of %d griddata points' % (
+                         np.amax(difference), np.mean(difference), both.sum(), (~np.ma.getmaskarray(griddata_mesh)).sum()))
+
+    return results, notes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Processing benchmark')
+    parser.add_argument('--rows', type=int, action='append', help='number(s) of scan rows (default: 65 and 300)')
+    parser.add_argument('--rois', type=int, action='append', help='number(s) of ROIs per block (default: 487)')
+    parser.add_argument('--repeat', type=int, default=3, help='calls per step, the best time is reported')
+    parser.add_argument('--no-transferred', dest='transferred', action='store_false', help='skip the energy transfer map')
+    parser.add_argument('--no-griddata', dest='griddata', action='store_false', help='skip the griddata triangulation of the energy transfer map')
+    args = parser.parse_args()
+
+    for rows in args.rows or [65, 300]:
+        for rois in args.rois or [487]:
+            print '[%d rows x %d ROIs (x3 blocks)]' % (rows, rois)
+            results, notes = run(rows, rois, args.repeat, args.transferred, args.griddata)
+            for name, elapsed, mb in results:
+                print '  %-38s %9.2f ms  %9.1f MB/s' % (name, elapsed * 1000, mb / elapsed if elapsed > 0 else float('inf'))
+            for note in notes:
+                print '  ' + note
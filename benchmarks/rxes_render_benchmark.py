@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Benchmark: drawing RXES maps as filled contours or as images (all the cells, or reduced to the pixels of the view)
+# Date created: 2026-10-17
+#
+# Usage examples:
+#   python benchmarks/rxes_render_benchmark.py
+#   python benchmarks/rxes_render_benchmark.py --size 65x487 --size 2000x1461 --repeat 5 --transferred
+# Maps are drawn off-screen (Agg canvas of 1000 x 700 pixels, as a plot window), in the RXESPlot renderings:
+# * contours: contourf with 50 levels (100 for the energy transfer map)
+# * image_full: pcolormesh of all the cells
+# * image: pcolormesh of the cells of the view, merged to about one per pixel (rebuilt on zoom and pan)
+# Steps (best time of the runs, in ms):
+# * first: artist created and figure drawn, as when the map is plotted
+# * redraw: figure drawn again (window exposed or resized, profiles moved)
+# * zoom: view narrowed 4 times around the center, then drawn (the image is rebuilt with the visible cells)
+# * pan: zoomed view moved by a tenth of its width, then drawn
+
+import os
+import sys
+import time
+import argparse
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
+from classes.processing import Processing
+
+renderings = ['contours', 'image_full', 'image']
+
+def synthetic_map(rows, rois, seed=0):
+    ' RXES grid products (see Processing.rxes_grid) with rows incoming energies and rois emitted energies '
+    random = np.random.RandomState(seed)
+    emitted = np.linspace(9.44, 9.36, rois)
+    incoming = np.linspace(11.54, 11.605, rows)
+    centers = np.linspace(0.3, 0.7, rows) * rois
+    signal = 20 + 500 * np.exp(-0.5 * ((np.arange(rois)[np.newaxis, :] - centers[:, np.newaxis]) / (0.02 * rois)) ** 2)
+    return emitted, incoming, random.poisson(signal).astype(float)
+
+class MapView:
+
+    ''' One map drawn on its own figure, as RXESPlot does it (draw_map, update_map_mesh) '''
+
+    def __init__(self, plot_data, rendering, transferred):
+        self.plot_data = plot_data
+        self.rendering = rendering
+        self.transferred = transferred
+        self.fig = Figure(figsize=(10, 7), dpi=100)
+        FigureCanvasAgg(self.fig)
+        self.axes = self.fig.add_subplot(111)
+        self.cells = None
+        self.mesh = None
+
+    def plot(self):
+        X, Y, Z = self.plot_data[:3]
+        if self.rendering == 'contours':
+            mappable = self.axes.contourf(X, Y, Z, 100 if self.transferred else 50)
+        else:
+            self.cells = Processing.rxes_cells(self.plot_data, self.transferred)
+            mappable = self.update_mesh(whole=True)
+        self.fig.colorbar(mappable, ax=self.axes, ticks=np.linspace(0, 1, 11))
+        self.fig.canvas.draw()
+
+    def update_mesh(self, whole=False):
+        if self.cells is None:
+            return None
+        emitted_edges, incoming_edges, Z = self.cells
+        if whole:
+            rows, columns = slice(0, Z.shape[0]), slice(0, Z.shape[1])
+        else:
+            rows, columns = Processing.visible_cells(emitted_edges, incoming_edges, self.axes.get_xlim(), self.axes.get_ylim(), self.transferred)
+        if self.rendering == 'image_full':
+            if self.mesh is not None:
+                return self.mesh
+            max_rows, max_columns = Z.shape
+        else:
+            max_rows, max_columns = int(self.axes.bbox.height), int(self.axes.bbox.width)
+        emitted_edges, incoming_edges, Z = Processing.downsample_cells(emitted_edges, incoming_edges, Z, max_rows, max_columns, rows, columns)
+        X_corners, Y_corners = Processing.cell_corners(emitted_edges, incoming_edges, self.transferred)
+        limits = self.axes.get_xlim(), self.axes.get_ylim()
+        mesh = self.axes.pcolormesh(X_corners, Y_corners, np.ma.masked_invalid(Z), vmin=0, vmax=1)
+        if self.mesh is not None:
+            self.mesh.remove()
+            self.axes.set_xlim(limits[0])
+            self.axes.set_ylim(limits[1])
+        self.mesh = mesh
+        return mesh
+
+    def set_view(self, xlim, ylim):
+        self.axes.set_xlim(xlim)
+        self.axes.set_ylim(ylim)
+        self.update_mesh()
+        self.fig.canvas.draw()
+
+def measure(plot_data, rendering, transferred, repeat):
+    ' Best times (seconds) of each step '
+    best = dict()
+    for index in range(repeat):
+        times = dict()
+        view = MapView(plot_data, rendering, transferred)
+        start = time.time()
+        view.plot()
+        times['first'] = time.time() - start
+        start = time.time()
+        view.fig.canvas.draw()
+        times['redraw'] = time.time() - start
+        (x0, x1), (y0, y1) = view.axes.get_xlim(), view.axes.get_ylim()
+        xlim = (x0 + 3 * (x1 - x0) / 8, x0 + 5 * (x1 - x0) / 8)
+        ylim = (y0 + 3 * (y1 - y0) / 8, y0 + 5 * (y1 - y0) / 8)
+        start = time.time()
+        view.set_view(xlim, ylim)
+        times['zoom'] = time.time() - start
+        shift = (xlim[1] - xlim[0]) / 10
+        start = time.time()
+        view.set_view((xlim[0] + shift, xlim[1] + shift), ylim)
+        times['pan'] = time.time() - start
+        for step, elapsed in times.items():
+            best[step] = min(best.get(step, elapsed), elapsed)
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RXES map rendering benchmark')
+    parser.add_argument('--size', action='append', help='map size ROWSxROIS (default: 65x487, 500x1461 and 2000x1461)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best time is reported')
+    parser.add_argument('--rendering', action='append', choices=renderings, help='rendering(s) to measure (default: all)')
+    parser.add_argument('--transferred', action='store_true', help='energy transfer maps (row resampling) instead of emitted energy maps')
+    args = parser.parse_args()
+
+    sizes = [tuple(int(value) for value in size.lower().split('x')) for size in (args.size or ['65x487', '500x1461', '2000x1461'])]
+    for rows, rois in sizes:
+        emitted, incoming, counts = synthetic_map(rows, rois)
+        plot_data = Processing.rxes_grid(emitted, incoming, counts, transferred=args.transferred)
+        print '[%d x %d %s map]' % (rows, rois, 'energy transfer' if args.transferred else 'emitted energy')
+        print '  %-12s %10s %10s %10s %10s' % ('rendering', 'first', 'redraw', 'zoom', 'pan')
+        for rendering in args.rendering or renderings:
+            best = measure(plot_data, rendering, args.transferred, args.repeat)
+            print '  %-12s %10.1f %10.1f %10.1f %10.1f' % (rendering, best['first'] * 1000, best['redraw'] * 1000, best['zoom'] * 1000, best['pan'] * 1000)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Synthetic SPEC files with the structure of the XDS beamline files, of any size
+# Date created: 2026-10-17
+#
+# Usage examples:
+#   python benchmarks/spec_generator.py /tmp/night.spec --scans 200 --points 65 --rois 1461
+#   python benchmarks/spec_generator.py /tmp/big.spec --size-mb 500 --restarts 3 --motors-every 20 --aborted-every 15
+# Each scan has the headers of the real files (#S, #D, #T, #G, #Q, #P, #N, #L) and the columns
+# dcm_energy ... Iring, then pl0 ... pl<rois-1> with an RXES-like signal: an emission line whose
+# ROI moves with the incoming energy, over a Poisson background.
+# * --restarts: the file is reopened this many times (new #F/#E/#D/#O header, #S numbering restarts at 1)
+# * --motors-every: a new #E/#D/#O header block (one more motor) every N scans, so that #O and #P
+#   blocks are interleaved with the scans
+# * --aborted-every: every N-th scan stops early, with a "#C ... Scan aborted" comment
+
+import os
+import time
+import argparse
+import numpy as np
+
+counters = ['dcm_energy', 'H', 'K', 'L', 'Epoch', 'Seconds', 'I0', 'I1', 'I2', 'I3', 'res2', 'Sample', 'Reference', 'Iring']
+motors = ['del', 'eta', 'chi', 'phi', 'nu', 'mu', 'Zero-Motor', 'dcm_xtal_change',
+          'dcm_vertical', 'dcm_goniometer', 'dcm_t1_x2_trans', 'dcm_t2_x2_gap', 'dcm_roll_x2_adj', 'dcm_pitch_adj', 'dcm_piezo_pitch', 'dcm_x2sag_yaw',
+          'dcm_x2sag_bend1', 'dcm_x2sag_bend2', 'dcm_energy', 'dcm_sag_bender', 'mono', 'mon_y', 'mon_z', 'dcm_crystal_cha',
+          'xbpm_hor_adjust', 'xbpm_ver_adjust', 'zsamp', 'pitch_harm_mirr', 'x_harm_mirror', 'z_harm_mirror', 'Ana_angle', 'crystal_height',
+          'mogonio', 'gonioth', 'goniox']
+# Motors per #O / #P line
+motors_per_line = 8
+date_format = '%a %b %d %H:%M:%S %Y'
+
+class SpecGenerator:
+
+    ''' Writes one synthetic SPEC file, scan by scan (the file is never held in memory) '''
+
+    def __init__(self, file_path, points=65, rois=1461, restarts=0, motors_every=0, aborted_every=0, seed=0):
+        self.file_path = file_path
+        self.points = points
+        self.rois = rois
+        self.restarts = restarts
+        self.motors_every = motors_every
+        self.aborted_every = aborted_every
+        self.random = np.random.RandomState(seed)
+        self.columns = counters + ['pl' + str(i) for i in range(rois)]
+        self.motors = list(motors)
+        self.epoch = 1447327538
+        self.scan_number = 0
+        self.scans_written = 0
+        # Sections of the file (each one starts with a #F header)
+        self.current_section = -1
+
+    def generate(self, scans=None, size_mb=None):
+        ' Write scans scans, or scans until the file reaches size_mb (restarts are spread evenly) '
+        total = scans
+        with open(self.file_path, 'w') as fp:
+            self.write_file_header(fp)
+            while True:
+                if total is not None and self.scans_written >= total:
+                    break
+                if total is None and fp.tell() >= size_mb * 1024 * 1024:
+                    break
+                if self.restart_due(fp, total, size_mb):
+                    fp.write('\n')
+                    self.scan_number = 0
+                    self.write_file_header(fp)
+                elif self.motors_every and self.scans_written and self.scans_written % self.motors_every == 0:
+                    # Motors configuration changed: one more motor from now on
+                    self.motors.append('extra_motor' + str(len(self.motors) - len(motors)))
+                    fp.write('\n')
+                    self.write_motors_header(fp)
+                self.write_scan(fp)
+        return self.scans_written
+
+    def restart_due(self, fp, total, size_mb):
+        ' Whether the next scan starts a new section (restarted #S numbering) '
+        if not self.restarts or not self.scans_written:
+            return False
+        sections = self.restarts + 1
+        if total is not None:
+            per_section = max(1, total // sections)
+            return self.scans_written % per_section == 0 and self.scans_written // per_section < sections
+        section_bytes = size_mb * 1024 * 1024 / sections
+        return fp.tell() // section_bytes > self.current_section and self.current_section < self.restarts
+
+    def write_file_header(self, fp):
+        self.current_section += 1
+        fp.write('#F %s\n' % os.path.basename(self.file_path))
+        self.write_motors_header(fp)
+
+    def write_motors_header(self, fp):
+        fp.write('#E %d\n#D %s\n#C psic  User = xafs\n' % (self.epoch, self.date()))
+        for line, start in enumerate(range(0, len(self.motors), motors_per_line)):
+            fp.write('#O%d %s\n' % (line, '  '.join(self.motors[start:start + motors_per_line])))
+        fp.write('\n')
+
+    def date(self):
+        return time.strftime(date_format, time.localtime(self.epoch))
+
+    def write_scan(self, fp):
+        self.scan_number += 1
+        self.scans_written += 1
+        random = self.random
+        start_energy, end_energy = 11.54, 11.605
+        exposure = 60
+        fp.write('#S %d  ascan  mo_e %g %g  %d %d\n' % (self.scan_number, start_energy, end_energy, self.points - 1, exposure))
+        fp.write('#D %s\n#T %d  (Seconds)\n' % (self.date(), exposure))
+        fp.write('#G0 0 0 0 0 0 1 0 0 0 0 0 0 0 0 0 0 1 0 0 0 0 0\n#G1 1.54 1.54 1.54 90 90 90 4.079990459 4.079990459 4.079990459 90 90 90 1 0 0 0 1 0 60 30 0 0 0 0 60 30 0 -90 0 0 1.54 1.54\n')
+        fp.write('#Q 0.0465833 -0.00134154 -0.00104633\n')
+        positions = random.uniform(-10, 100, len(self.motors))
+        # Positions that change from scan to scan (queried by the scan index and the filters)
+        positions[self.motors.index('mogonio')] = 15 + 0.01 * self.scans_written
+        positions[self.motors.index('dcm_energy')] = start_energy
+        for line, start in enumerate(range(0, len(self.motors), motors_per_line)):
+            fp.write('#P%d %s\n' % (line, ' '.join('%.8g' % position for position in positions[start:start + motors_per_line])))
+        fp.write('#N %d\n#L %s\n' % (len(self.columns), '  '.join(self.columns)))
+
+        points = self.points
+        aborted = self.aborted_every and self.scans_written % self.aborted_every == 0
+        if aborted:
+            points = random.randint(1, max(2, self.points))
+        energies = np.linspace(start_energy, end_energy, self.points)[:points]
+        # Emission line centered on a ROI that depends on the incoming energy
+        centers = np.linspace(0.3, 0.7, self.points)[:points] * self.rois
+        signal = 20 + 500 * np.exp(-0.5 * ((np.arange(self.rois)[np.newaxis, :] - centers[:, np.newaxis]) / (0.02 * self.rois)) ** 2)
+        counts = random.poisson(signal)
+        i0 = random.normal(8.45e6, 1e4, points)
+        for row in range(points):
+            self.epoch += exposure + 1
+            fp.write('%g 0.0465833 -0.00134154 -0.00104633 %d %d %g 0 0 0 0 0 0 %g ' % (energies[row], self.epoch - 1447327538, exposure, i0[row], 210 - 0.01 * row))
+            fp.write(' '.join(map(str, counts[row])))
+            fp.write('\n')
+        if aborted:
+            fp.write('#C %s.  Scan aborted after %d points.\n' % (self.date(), points))
+        fp.write('\n')
+
+def generate(file_path, scans=None, size_mb=None, **options):
+    ' Write a synthetic SPEC file (scans scans, or about size_mb megabytes), returns the number of scans '
+    return SpecGenerator(file_path, **options).generate(scans, size_mb)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Synthetic SPEC file generator')
+    parser.add_argument('file', help='SPEC file to write')
+    parser.add_argument('--scans', type=int, default=None, help='number of scans (default: 20, unless --size-mb is given)')
+    parser.add_argument('--size-mb', type=float, default=None, help='write scans until the file reaches this size')
+    parser.add_argument('--points', type=int, default=65, help='points (data rows) per scan')
+    parser.add_argument('--rois', type=int, default=1461, help='number of pl* ROI columns')
+    parser.add_argument('--restarts', type=int, default=0, help='times the file is reopened (#S numbering restarts)')
+    parser.add_argument('--motors-every', type=int, default=0, help='new #O block every N scans (0: never)')
+    parser.add_argument('--aborted-every', type=int, default=0, help='every N-th scan is aborted (0: never)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    if args.scans is None and args.size_mb is None:
+        args.scans = 20
+    start = time.time()
+    scans = generate(args.file, args.scans, args.size_mb, points=args.points, rois=args.rois, restarts=args.restarts,
+                     motors_every=args.motors_every, aborted_every=args.aborted_every, seed=args.seed)
+    print '%s: %d scans, %.1f MB, %.1f s' % (args.file, scans, os.path.getsize(args.file) / 1024.0 / 1024.0, time.time() - start)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Benchmark: SpecParser time and peak memory on large SPEC files
+# Date created: 2026-10-17
+#
+# Usage examples:
+#   python benchmarks/spec_parser_benchmark.py --size-mb 100 --rois 1461
+#   python benchmarks/spec_parser_benchmark.py --sample 2000 --reader legacy --reader mmap
+#   python benchmarks/spec_parser_benchmark.py --file /path/to/specfile
+# Without --file, a synthetic file with Pilatus ROI columns (pl0, pl1, ...) of about --size-mb
+# megabytes is generated in a temporary folder by spec_generator.py, with the structure of the
+# end-to-end benchmark files (restarts, interleaved motors headers, aborted scans). With --sample N,
+# the file is sample_data H2PtCl6_Lalpha_Si100-LNLS002 repeated N times instead.
+# The "legacy" reader is the original line by line parser (legacy_spec_parser.py), the reference of the speedups.
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import resource
+import multiprocessing
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from classes.spec_parser import SpecParser
+import spec_generator
+from legacy_spec_parser import LegacySpecParser
+
+def generate_scaled_sample(file_path, copies):
+    ' Repeat the sample data file (the #S numbering restarts on each copy, as in real files) '
+    with open(os.path.join(root_dir, 'sample_data', 'H2PtCl6_Lalpha_Si100-LNLS002')) as fp:
+        sample = fp.read()
+    with open(file_path, 'w') as fp:
+        for copy in range(copies):
+            fp.write(sample)
+
+def parse_in_child(file_path, options, queue):
+    start = time.time()
+    if options['reader'] == 'legacy':
+        scans = LegacySpecParser(file_path).get_scans()
+        elapsed = time.time() - start
+        cells = sum(len(row) for scan in scans.values() for row in scan['data_values'])
+    else:
+        scans = SpecParser(file_path, **options).get_scans()
+        elapsed = time.time() - start
+        cells = sum(scan.data.size for scan in scans.values())
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    queue.put((elapsed, len(scans), cells, peak_mb))
+
+def run(file_path, options):
+    # Each measurement runs in its own process, so that the peak memory is not shared
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=parse_in_child, args=(file_path, options, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SpecParser benchmark')
+    parser.add_argument('--file', help='existing SPEC file to parse')
+    parser.add_argument('--size-mb', type=float, default=100, help='size of the generated file')
+    parser.add_argument('--rois', type=int, default=1461, help='number of pl* columns of the generated file')
+    parser.add_argument('--sample', type=int, default=0, help='use the sample data repeated this many times')
+    parser.add_argument('--reader', action='append', choices=['legacy', 'lines', 'mmap'], help='reader(s) to benchmark (default: all)')
+    parser.add_argument('--processes', type=int, action='append', help='number(s) of parsing processes (default: 1)')
+    args = parser.parse_args()
+
+    if args.file:
+        file_path = args.file
+    elif args.sample:
+        file_path = os.path.join(tempfile.gettempdir(), 'xds_vhpt_benchmark_sample_x%d.spec' % args.sample)
+        if not os.path.exists(file_path):
+            generate_scaled_sample(file_path, args.sample)
+    else:
+        file_path = os.path.join(tempfile.gettempdir(), 'xds_vhpt_parser_%gMB_%dr.spec' % (args.size_mb, args.rois))
+        if not os.path.exists(file_path):
+            print 'Generating ' + file_path
+            spec_generator.generate(file_path, size_mb=args.size_mb, rois=args.rois, restarts=2, motors_every=25, aborted_every=9)
+
+    file_mb = os.path.getsize(file_path) / 1024.0 / 1024.0
+    print 'File: %s (%.1f MB)' % (file_path, file_mb)
+    legacy_time = None
+    for reader in args.reader or ['legacy', 'lines', 'mmap']:
+        # The legacy parser has no processes option
+        for processes in [1] if reader == 'legacy' else args.processes or [1]:
+            elapsed, num_scans, cells, peak_mb = run(file_path, {'reader': reader, 'processes': processes})
+            if reader == 'legacy':
+                legacy_time = elapsed
+            speedup = ', %.1fx legacy' % (legacy_time / elapsed) if legacy_time else ''
+            print '[%s, %d process(es)] scans: %d, cells: %d, parse time: %.2f s (%.1f MB/s%s), peak memory: %.1f MB' % (reader, processes, num_scans, cells, elapsed, file_mb / elapsed, speedup, peak_mb)
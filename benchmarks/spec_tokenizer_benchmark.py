@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Micro-benchmark: SpecParser.parse_line throughput (lines/s) per line type
+# Date created: 2026-10-17
+#
+# Usage:
+#   python benchmarks/spec_tokenizer_benchmark.py                    # print results
+#   python benchmarks/spec_tokenizer_benchmark.py --save base.json   # store results as baseline
+#   python benchmarks/spec_tokenizer_benchmark.py --compare base.json [--tolerance 0.2]
+# With --compare, exits with status 1 if any line type is slower than the baseline by more than the tolerance.
+
+import os
+import sys
+import json
+import time
+import argparse
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from classes.spec_parser import SpecParser
+
+sample_file = os.path.join(root_dir, 'sample_data', 'H2PtCl6_Lalpha_Si100-LNLS002')
+
+# Representative lines, taken from the sample data (plus a wide Pilatus data row)
+lines = {
+    '#S': '#S 2  ascan  mo_e 11.54 11.605  65 60\n',
+    '#D': '#D Thu Nov 12 09:47:07 2015\n',
+    '#T': '#T 60  (Seconds)\n',
+    '#O': '#O1 dcm_vertical  dcm_goniometer  dcm_t1_x2_trans  dcm_t2_x2_gap  dcm_roll_x2_adj  dcm_pitch_adj  dcm_piezo_pitch  dcm_x2sag_yaw\n',
+    '#P': '#P2 -3.6311228 -2.783715 11.8 -3.2075 9.645741 18.765303 110.4112 111\n',
+    '#N': '#N 105\n',
+    '#L': '#L dcm_energy  H  K  L  Epoch  Seconds  I0  I1  I2  I3  res2  ' + '  '.join('pl' + str(i) for i in range(94)) + '\n',
+    '#C': '#C Thu Nov 12 10:02:11 2015.  Scan aborted after 12 points.\n',
+    'blank': '\n',
+    'data': '11.541 0.0465833 -0.00134154 -0.00104633 1413 60 8.45103e+06 ' + ' '.join(['0'] * 98) + '\n',
+    'data (1465 columns)': '11.541 1413 60 8.45103e+06 ' + ' '.join(str(i % 97) for i in range(1461)) + '\n',
+}
+
+def measure(parser, line, min_time=0.3):
+    ' Lines per second of parser.parse_line for a single kind of line '
+    count = 0
+    batch = 1000
+    start = time.time()
+    elapsed = 0
+    while elapsed < min_time:
+        # Start from a clean state, so that data rows do not accumulate
+        parser.reset()
+        parser.changed_scans = list()
+        parse_line = parser.parse_line
+        for i in xrange(batch):
+            parse_line(line)
+        count += batch
+        elapsed = time.time() - start
+    return count / elapsed
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='SpecParser line tokenizer micro-benchmark')
+    arg_parser.add_argument('--save', help='save results to this JSON file')
+    arg_parser.add_argument('--compare', help='compare results with this JSON file')
+    arg_parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown fraction when comparing')
+    args = arg_parser.parse_args()
+
+    parser = SpecParser(sample_file)
+    results = dict()
+    for line_type in sorted(lines):
+        results[line_type] = measure(parser, lines[line_type])
+        print '%-22s %12.0f lines/s' % (line_type, results[line_type])
+
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        regressions = [line_type for line_type in results if line_type in baseline and results[line_type] < baseline[line_type] * (1 - args.tolerance)]
+        for line_type in regressions:
+            print 'REGRESSION %s: %.0f lines/s (baseline %.0f)' % (line_type, results[line_type], baseline[line_type])
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Benchmark: application startup time, and heavy modules loaded before the main window appears
+# Date created: 2026-10-17
+#
+# Usage examples:
+#   python benchmarks/startup_benchmark.py
+#   python benchmarks/startup_benchmark.py --repeat 10 --max-seconds 0.5   # exit code 1 if slower, or if a heavy module is loaded
+# Each measurement runs in a new Python process (modules already imported would hide the cost):
+# * import: application module (__main__.py) imported, without starting it
+# * window: main window built and drawn (skipped when there is no display)
+# * plots: plot windows module imported afterwards, as on the first plot (or by the pre-warm steps while the window is idle)
+# The best time of the runs is reported.
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported when a plot or a fit is requested
+heavy_modules = ['pandas', 'scipy', 'matplotlib.pyplot', 'matplotlib.mlab', 'classes.plots']
+
+child_code = '''
+import sys, time, json, imp
+sys.path.insert(0, %(root_dir)r)
+sys.argv = [%(main_path)r]
+result = dict()
+start = time.time()
+application = imp.load_source('xds_vhpt_application', %(main_path)r)
+result['import'] = time.time() - start
+result['heavy'] = [name for name in %(heavy_modules)r if name in sys.modules]
+if %(window)r:
+    try:
+        start = time.time()
+        root = application.tk.Tk()
+        app = application.Application(master=root)
+        root.update()
+        result['window'] = time.time() - start
+        root.destroy()
+    except Exception as e:
+        result['window_error'] = str(e)
+start = time.time()
+import classes.plots
+result['plots'] = time.time() - start
+print json.dumps(result)
+'''
+
+def has_display():
+    return os.name != 'posix' or sys.platform == 'darwin' or bool(os.environ.get('DISPLAY'))
+
+def run_once(window):
+    code = child_code % {'root_dir': root_dir, 'main_path': os.path.join(root_dir, '__main__.py'), 'heavy_modules': heavy_modules, 'window': window}
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=root_dir)
+    # Only the last line is the result (modules may print while imported)
+    return json.loads(output.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Startup time benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs, the best time is reported')
+    parser.add_argument('--max-seconds', type=float, default=None, help='exit with code 1 if the import (and window) time is above this')
+    args = parser.parse_args()
+
+    window = has_display()
+    results = [run_once(window) for index in range(args.repeat)]
+    best = dict((step, min(result[step] for result in results)) for step in ['import', 'window', 'plots'] if step in results[0])
+    for step in ['import', 'window', 'plots']:
+        if step in best:
+            print '  %-8s %8.1f ms' % (step, best[step] * 1000)
+        elif step == 'window':
+            print '  %-8s %s' % (step, results[0].get('window_error', 'skipped (no display)'))
+
+    failed = False
+    heavy = results[0]['heavy']
+    if heavy:
+        print 'Heavy modules imported at startup: ' + ', '.join(heavy)
+        failed = True
+    startup = best['import'] + best.get('window', 0)
+    if args.max_seconds is not None and startup > args.max_seconds:
+        print 'Startup (%.3f s) is slower than %.3f s' % (startup, args.max_seconds)
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Benchmark: drawing and picking many XES spectra, one Line2D each or as a single SpectraCollection
+# Date created: 2026-10-17
+#
+# Usage examples:
+#   python benchmarks/xes_lines_benchmark.py
+#   python benchmarks/xes_lines_benchmark.py --spectra 10000 --rois 1461 --max-lines 0   # collection only
+# Spectra are drawn off-screen (Agg canvas of 1000 x 700 pixels, as a plot window):
+# * lines: one Line2D per spectrum with a picker (former XESPlot.plot_multiple), skipped above --max-lines spectra
+# * collection: SpectraCollection (decimated to the view, in wider bins above its points budget)
+# Steps (best time of the runs, in ms):
+# * first: artists created and figure drawn
+# * redraw: figure drawn again
+# * pick: spectrum found under a click (pick events of all the lines, or SpectraCollection.pick)
+# * zoom: view narrowed to a tenth of the x axis, then drawn
+
+import os
+import sys
+import time
+import argparse
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backend_bases import MouseEvent
+import numpy as np
+from classes.spectra_collection import SpectraCollection
+
+def synthetic_spectra(spectra, rois, seed=0):
+    ' (emitted energies, spectra x rois intensities): an emission line moving from spectrum to spectrum, with Poisson noise '
+    random = np.random.RandomState(seed)
+    centers = np.linspace(0.3, 0.7, spectra) * rois
+    signal = 20 + 500 * np.exp(-0.5 * ((np.arange(rois)[np.newaxis, :] - centers[:, np.newaxis]) / (0.02 * rois)) ** 2)
+    return np.linspace(9.44, 9.36, rois), random.poisson(signal) / 520.0
+
+def measure(x, Y, rendering, repeat):
+    ' Best times (seconds) of each step '
+    best = dict()
+    labels = ['<Spectrum %d>' % index for index in range(len(Y))]
+    for index in range(repeat):
+        times = dict()
+        fig = Figure(figsize=(10, 7), dpi=100)
+        FigureCanvasAgg(fig)
+        axes = fig.add_subplot(111)
+        picked = list()
+        start = time.time()
+        if rendering == 'lines':
+            for row, label in zip(Y, labels):
+                axes.plot(x, row, picker=5.0, label=label)
+            fig.canvas.mpl_connect('pick_event', lambda event: picked.append(event.artist))
+        else:
+            spectra = SpectraCollection(axes, x, Y, labels)
+        fig.canvas.draw()
+        times['first'] = time.time() - start
+        start = time.time()
+        fig.canvas.draw()
+        times['redraw'] = time.time() - start
+        # Click on the peak of the middle spectrum
+        middle = len(Y) // 2
+        column = int(np.argmax(Y[middle]))
+        click = axes.transData.transform([x[column], Y[middle, column]])
+        mouseevent = MouseEvent('button_press_event', fig.canvas, click[0], click[1], button=1)
+        start = time.time()
+        if rendering == 'lines':
+            fig.canvas.pick(mouseevent)
+        else:
+            picked.append(spectra.pick(mouseevent))
+        times['pick'] = time.time() - start
+        if not picked or picked[0] is None:
+            raise RuntimeError('nothing picked by ' + rendering)
+        start = time.time()
+        axes.set_xlim(x[column] - (x[0] - x[-1]) / 20, x[column] + (x[0] - x[-1]) / 20)
+        if rendering == 'collection':
+            spectra.update()
+        fig.canvas.draw()
+        times['zoom'] = time.time() - start
+        for step, elapsed in times.items():
+            best[step] = min(best.get(step, elapsed), elapsed)
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='XES spectra drawing and picking benchmark')
+    parser.add_argument('--spectra', type=int, action='append', help='number of spectra (default: 65, 1000 and 10000)')
+    parser.add_argument('--rois', type=int, default=1461, help='points per spectrum')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best time is reported')
+    parser.add_argument('--max-lines', type=int, default=1000, help='one Line2D per spectrum only up to this number of spectra (slow)')
+    args = parser.parse_args()
+
+    for num_spectra in args.spectra or [65, 1000, 10000]:
+        x, Y = synthetic_spectra(num_spectra, args.rois)
+        print '[%d spectra x %d ROIs]' % (num_spectra, args.rois)
+        print '  %-12s %10s %10s %10s %10s' % ('rendering', 'first', 'redraw', 'pick', 'zoom')
+        for rendering in ['lines', 'collection']:
+            if rendering == 'lines' and num_spectra > args.max_lines:
+                print '  %-12s skipped (more than %d spectra)' % (rendering, args.max_lines)
+                continue
+            best = measure(x, Y, rendering, args.repeat)
+            print '  %-12s %10.1f %10.1f %10.1f %10.1f' % (rendering, best['first'] * 1000, best['redraw'] * 1000, best['pick'] * 1000, best['zoom'] * 1000)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Columns selection patterns (e.g. pl0-pl486, I0, pl*)
+# Date created: 2026-10-17
+
+import re
+import numpy as np
+
+class ColumnSelector:
+
+    ''' Columns selection pattern, parsed once. Comma separated terms:
+    * name: the column with this name
+    * begin-end: ROI index range when both ends are <prefix><number> with the same prefix
+      (pl0-pl486 selects pl0 ... pl486 whatever columns exist), otherwise every column
+      from the one named begin to the one named end
+    * wildcard: * matches one or more characters (pl*)
+    Resolved index arrays are cached by (pattern, columns names). '''
+
+    roi_name_regex = re.compile('^(.*?)([0-9]+)$')
+
+    # pattern: ColumnSelector
+    selectors = dict()
+    # (pattern, tuple(columns_names)): index array
+    cache = dict()
+    max_cached = 256
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.names = set()
+        self.wildcards = list()
+        # prefix: list of (first ROI number, last ROI number)
+        self.roi_ranges = dict()
+        # (begin name, end name)
+        self.name_ranges = list()
+        for term in pattern.replace(' ', '').split(','):
+            limits = term.split('-')
+            if len(limits) == 2:
+                begin, end = self.roi_name_regex.match(limits[0]), self.roi_name_regex.match(limits[1])
+                if begin and end and begin.group(1) == end.group(1):
+                    numbers = sorted((int(begin.group(2)), int(end.group(2))))
+                    self.roi_ranges.setdefault(begin.group(1), list()).append(tuple(numbers))
+                else:
+                    self.name_ranges.append((limits[0], limits[1]))
+            elif len(limits) == 1 and '*' not in term:
+                self.names.add(term)
+            elif len(limits) == 1:
+                self.wildcards.append(re.compile('^' + re.escape(term).replace('\\*', '.+') + '$'))
+
+    @classmethod
+    def compile(cls, pattern):
+        selector = cls.selectors.get(pattern)
+        if selector is None:
+            if len(cls.selectors) >= cls.max_cached:
+                cls.selectors.clear()
+            selector = cls.selectors[pattern] = ColumnSelector(pattern)
+        return selector
+
+    @classmethod
+    def select(cls, pattern, columns_names):
+        ' Indices (read-only integer array, in columns order) of the columns matching the pattern '
+        key = (pattern, tuple(columns_names))
+        indices = cls.cache.get(key)
+        if indices is None:
+            if len(cls.cache) >= cls.max_cached:
+                cls.cache.clear()
+            indices = cls.cache[key] = cls.compile(pattern).resolve(columns_names)
+        return indices
+
+    def resolve(self, columns_names):
+        ' Single pass over the columns names '
+        indices = list()
+        # Ranges by name are open from the begin column until the end column
+        open_ranges = [False] * len(self.name_ranges)
+        for index, name in enumerate(columns_names):
+            selected = name in self.names
+            for range_index, (begin, end) in enumerate(self.name_ranges):
+                if name == begin:
+                    open_ranges[range_index] = True
+                if open_ranges[range_index]:
+                    selected = True
+                if name == end:
+                    open_ranges[range_index] = False
+            if not selected and self.roi_ranges:
+                match = self.roi_name_regex.match(name)
+                if match and match.group(1) in self.roi_ranges:
+                    number = int(match.group(2))
+                    selected = any(first <= number <= last for first, last in self.roi_ranges[match.group(1)])
+            if not selected:
+                selected = any(wildcard.match(name) for wildcard in self.wildcards)
+            if selected:
+                indices.append(index)
+        indices = np.array(indices, dtype=np.intp)
+        indices.flags.writeable = False
+        return indices
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Compiler for the intensity formula (e.g. (S-(BG1+BG2)/2)/I0)
+# Date created: 2026-10-17
+
+import ast
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+class Formula:
+
+    ''' Intensity formula compiled once into a tree of NumPy ufuncs over the S, BG1, BG2 and I0 blocks.
+    Only numbers, these variables, + - * / ** % and a few elementwise functions are accepted,
+    anything else (attributes, other names, calls, etc.) raises ValueError, so no user code is ever run.
+    Evaluation writes into an output array (e.g. the intensity columns of the plot data), using
+    scratch buffers kept between calls, or numexpr (multithreaded) when it is installed. '''
+
+    variables = ('S', 'BG1', 'BG2', 'I0')
+    binary_operators = {
+        ast.Add: (np.add, '+'),
+        ast.Sub: (np.subtract, '-'),
+        ast.Mult: (np.multiply, '*'),
+        ast.Div: (np.true_divide, '/'),
+        ast.Pow: (np.power, '**'),
+        ast.Mod: (np.mod, '%'),
+    }
+    unary_operators = {
+        ast.USub: (np.negative, '-'),
+        ast.UAdd: (np.positive, '+'),
+    }
+    # Also accepted as np.<name> and numpy.<name>
+    functions = {
+        'abs': np.absolute,
+        'sqrt': np.sqrt,
+        'exp': np.exp,
+        'log': np.log,
+        'log10': np.log10,
+        'sin': np.sin,
+        'cos': np.cos,
+        'tan': np.tan,
+    }
+
+    # Compiled formulas by text
+    cache = dict()
+    max_cached = 64
+
+    def __init__(self, text):
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError:
+            raise ValueError('Invalid formula: ' + text)
+        self.names = set()
+        # Plan: nested tuples ('var', name), ('const', value), ('ufunc', ufunc, operands)
+        self.plan = self.compile_node(tree.body)
+        # Same expression, rebuilt from the validated tree, for numexpr
+        self.expression = self.node_expression(self.plan)
+        # Scratch buffers by nesting level, all with the shape of the last output
+        self.buffers = dict()
+        self.buffers_shape = None
+
+    @classmethod
+    def compile(cls, text):
+        ' Compiled formula for this text, from the cache when it was already compiled '
+        formula = cls.cache.get(text)
+        if formula is None:
+            formula = Formula(text)
+            if len(cls.cache) >= cls.max_cached:
+                cls.cache.clear()
+            cls.cache[text] = formula
+        return formula
+
+    def compile_node(self, node):
+        if isinstance(node, ast.Num) and isinstance(node.n, (int, long, float)):
+            return ('const', node.n)
+        if isinstance(node, ast.Name) and node.id in self.variables:
+            self.names.add(node.id)
+            return ('var', node.id)
+        if isinstance(node, ast.BinOp) and type(node.op) in self.binary_operators:
+            return ('ufunc', type(node.op), [self.compile_node(node.left), self.compile_node(node.right)])
+        if isinstance(node, ast.UnaryOp) and type(node.op) in self.unary_operators:
+            return ('ufunc', type(node.op), [self.compile_node(node.operand)])
+        if isinstance(node, ast.Call) and len(node.args) == 1 and not node.keywords and not node.starargs and not node.kwargs:
+            name = self.function_name(node.func)
+            if name in self.functions:
+                return ('ufunc', name, [self.compile_node(node.args[0])])
+        raise ValueError('Not allowed in formula: ' + self.text)
+
+    @staticmethod
+    def function_name(node):
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in ('np', 'numpy'):
+            return node.attr
+        return None
+
+    def ufunc(self, operation):
+        if operation in self.binary_operators:
+            return self.binary_operators[operation][0]
+        if operation in self.unary_operators:
+            return self.unary_operators[operation][0]
+        return self.functions[operation]
+
+    def node_expression(self, node):
+        if node[0] == 'var':
+            return node[1]
+        if node[0] == 'const':
+            return repr(node[1])
+        operation, operands = node[1], [self.node_expression(operand) for operand in node[2]]
+        if operation in self.binary_operators:
+            return '(' + operands[0] + ' ' + self.binary_operators[operation][1] + ' ' + operands[1] + ')'
+        if operation in self.unary_operators:
+            return '(' + self.unary_operators[operation][1] + operands[0] + ')'
+        return operation + '(' + operands[0] + ')'
+
+    def shape(self, variables):
+        ' Shape of the result for these variables (all operations are elementwise, so it is their broadcast shape) '
+        arrays = [np.asarray(variables[name]) for name in self.names]
+        if not arrays:
+            return ()
+        if len(arrays) == 1:
+            return arrays[0].shape
+        return np.broadcast(*arrays).shape
+
+    def evaluate(self, variables, out=None):
+        ' Result for a dict of variables (S, BG1, BG2, I0 float arrays), written into out when given '
+        if out is None:
+            out = np.empty(self.shape(variables))
+        # numexpr writes into strided outputs too (e.g. the intensity columns of the plot data). Division is always true
+        # division, as np.true_divide in the plan (numexpr would otherwise follow the caller's __future__ import).
+        if numexpr is not None:
+            try:
+                numexpr.evaluate(self.expression, local_dict=dict((name, variables[name]) for name in self.names), global_dict={}, out=out, truediv=True)
+                return out
+            except Exception:
+                pass # Evaluated with NumPy below
+        self.evaluate_node(self.plan, variables, out, 0)
+        return out
+
+    def operand(self, node, variables):
+        ' Leaves are used as they are, without copying them to a buffer '
+        if node[0] == 'var':
+            return variables[node[1]]
+        if node[0] == 'const':
+            return node[1]
+        return None
+
+    def evaluate_node(self, node, variables, out, level):
+        ''' Evaluate node into out. The first operand is evaluated into out itself,
+        the others into the scratch buffer of this nesting level. '''
+        value = self.operand(node, variables)
+        if value is not None:
+            np.copyto(out, value)
+            return
+        operands = list()
+        for index, operand in enumerate(node[2]):
+            value = self.operand(operand, variables)
+            if value is None:
+                target = out if index == 0 else self.buffer(out.shape, level)
+                self.evaluate_node(operand, variables, target, level + 1)
+                value = target
+            operands.append(value)
+        self.ufunc(node[1])(*operands, out=out)
+
+    def buffer(self, shape, level):
+        if shape != self.buffers_shape:
+            self.buffers = dict()
+            self.buffers_shape = shape
+        if level not in self.buffers:
+            self.buffers[level] = np.empty(shape)
+        return self.buffers[level]
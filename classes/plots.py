@@ -12,18 +12,22 @@ import ttk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from matplotlib.figure import Figure
-from matplotlib.mlab import griddata
+from matplotlib.backend_bases import PickEvent
 import matplotlib.pyplot as plt
 import matplotlib
 import re
+from collections import OrderedDict
 import numpy as np
 import scipy
 import tkSimpleDialog
 # Custom classes
 from tools import *
+from roi_axis import *
+from processing import *
 from custom_widgets import *
 from gaussian_fit import *
 from profiler import *
+from spectra_collection import *
 import timeit
 
 class PlotWindow(tk.Toplevel):
@@ -48,6 +52,8 @@ class PlotWindow(tk.Toplevel):
         self.widgets = dict() # To be used by class descendants
         self.picker_tolerance = 5.0
         self.selected_artist = None
+        # Curves drawn as a single collection (see SpectraCollection), besides the lines of the main axes
+        self.spectra = None
         self.profiler = Profiler()
         self.figure_number = figure_number
 
@@ -79,19 +85,6 @@ class PlotWindow(tk.Toplevel):
     def artist_label_prefix(self):
         return 'Fig. ' + str(self.figure_number)
 
-    def find_closest_in_array(self, X, x0):
-            # Find x position in array X
-            x_pos = 0
-            x_index = -1
-            last_diff = np.abs(np.amax(X)-np.amin(X))
-            for x in X:
-                if abs(x-x0) < last_diff:
-                    x_index = x_pos
-                    last_diff = abs(x-x0) 
-                x_pos += 1
-            return x_index
-
-
     def onpick(self, event):
 
         xy = [ event.mouseevent.x, event.mouseevent.y ]
@@ -111,7 +104,7 @@ class PlotWindow(tk.Toplevel):
             self.log('* Selected plot object: ' + event.artist.get_label())
 
         # Redraw changes
-        self.fig.canvas.draw()
+        self.draw_canvas()
 
     def select_artist(self, artist, xy, xydata):
         # Store current selected artist
@@ -229,17 +222,26 @@ class PlotWindow(tk.Toplevel):
             self.main_axes.set_xlim([min_x, max_x])
             self.main_axes.set_ylim([min_y, max_y])
             # Redraw changes
-            self.fig.canvas.draw()
+            self.draw_canvas()
 
 
     def action_btn_export(self, *args, **kwargs):
         file_path = fd.asksaveasfilename()
         if file_path:
             line_num = 0
-            for line in self.main_axes.get_lines():
+            for x, y in self.curves():
                 line_num += 1
                 path = file_path + '_' + self.plot_type + '_' + str(line_num) + '.txt'
-                np.savetxt(path, np.column_stack([line.get_xdata(), line.get_ydata()]))
+                np.savetxt(path, np.column_stack([x, y]))
+
+    def curves(self):
+        ' (x, y) of every curve of the main axes: the lines, then the spectra of the collection (if any) '
+        for line in self.main_axes.get_lines():
+            if self.spectra is None or line is not self.spectra.line:
+                yield line.get_xdata(), line.get_ydata()
+        if self.spectra is not None:
+            for y in self.spectra.Y:
+                yield self.spectra.x, y
 
     def action_btn_quick_normalization(self, *args, **kwargs):
         for line in self.main_axes.get_lines():
@@ -247,6 +249,10 @@ class PlotWindow(tk.Toplevel):
             y = y-np.amin(y)
             y = np.divide(y, np.amax(y))
             line.set_ydata(y)
+        if self.spectra is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                Y = self.spectra.Y - np.nanmin(self.spectra.Y, axis=1)[:, np.newaxis]
+                self.spectra.set_ydata(Y / np.nanmax(Y, axis=1)[:, np.newaxis])
         self.action_btn_zoomall()
 
     def disable_picker(self, *args, **kwargs):
@@ -296,19 +302,19 @@ class PlotWindow(tk.Toplevel):
 
     def plot_redraw(self):
         self.config_plot()
-        self.fig.canvas.draw()
+        self.draw_canvas()
+
+    def draw_canvas(self):
+        with self.profiler.span('PlotWindow.draw', 'plot', plot_type=self.plot_type):
+            self.fig.canvas.draw()
+        Profiler.count('artists drawn', sum(len(axes.lines) + len(axes.collections) + len(axes.images) for axes in self.fig.axes))
 
     def columns_names_parse_as_int(self, columns_names):
-        return_list = list()
-        for name in columns_names:
-            return_list.append(int(re.findall('([0-9]+)', str(name))[0]))
-        return return_list
+        return RoiAxis.numbers(columns_names).astype(int)
 
     def columns_names_parse_as_float(self, columns_names):
-        return_list = list()
-        for name in columns_names:
-            return_list.append(float(re.findall('([0-9]+)', str(name))[0]))
-        return np.array(return_list)
+        # Computed once per columns selection, shared by all plot windows
+        return RoiAxis.numbers(columns_names)
 
     def action_close(self):
         # Custom code when closing plot window
@@ -322,7 +328,6 @@ class PlotWindow(tk.Toplevel):
     def roi_axis(self):
         ' Used on plots which have ROI as x axis '
         p = self.parameters
-        rois_numbers = self.columns_names_parse_as_float(p['intensity_names'])
         if p['use_calibration'] and p['calibration_data']:
             try:
                 self.bottom_axes.set_xlabel('Energy (keV)')
@@ -336,38 +341,23 @@ class PlotWindow(tk.Toplevel):
                 self.main_axes.set_xlabel('')
             except:
                 self.main_axes.set_xlabel('ROI')
-            return rois_numbers
+            return self.columns_names_parse_as_float(p['intensity_names'])
 
     def mogonio_to_energy(self):
-        p = self.parameters
-        energies_values = np.array(self.data[:, p['energy_column']], dtype=float)
-        if p['use_mogonio_calibration']:
-            A = p['mogonio_calibration_a']
-            B = p['mogonio_calibration_b']
-            hc = 1239.8 # nm.eV
-            a = 0.543102 # lattice parameter for Si, in nm 
-            miller_indices = [1, 1, 1]
-            m = miller_indices
-            return (hc * np.sqrt(m[0]**2 + m[1]**2 + m[2]**2)/(2*a*np.sin(np.radians(A + B*energies_values))))/1000.0
-        else:
-            return energies_values
+        return Processing.incoming_energies(self.data, self.parameters)
 
     def rois_to_energies(self, fresh=False):
         ' Used on plots which have ROI as x axis '
         p = self.parameters
-        rois_numbers = self.columns_names_parse_as_int(p['intensity_names'])
 
-        # Fitting
+        # Fitting (and fitting equation applied to ROIs numbers), cached by selection and calibration points
         if not fresh:
-            calib = Tools.list_to_numpy(p['calibration_data']) 
+            calibration_data = p['calibration_data']
         else:
-            calib = Tools.list_to_numpy(self.application.widgets['calib_tree'].get_data())
-        equation_parameters = np.polyfit(calib[:, 1], calib[:, 0], min(2, calib.shape[0]-1))
+            calibration_data = self.application.widgets['calib_tree'].get_data()
+        equation_parameters, energies = RoiAxis.calibration(p['intensity_names'], calibration_data)
         self.log('* Energy calibration coefficients: ' + str(equation_parameters))
 
-        # Apply fitting equation to ROIs numbers
-        energies = np.polyval(equation_parameters, rois_numbers)
-
         return energies
 
     def action_btn_zoomall(self, *args, **kwargs):
@@ -384,11 +374,18 @@ class PlotWindow(tk.Toplevel):
                 max_x = max(max_x, max(line.get_xdata()))
                 min_y = min(min_y, min(line.get_ydata()))
                 max_y = max(max_y, max(line.get_ydata()))
+        if self.spectra is not None:
+            limits = self.spectra.limits()
+            if first:
+                min_x, max_x, min_y, max_y = limits
+                first = False
+            else:
+                min_x, max_x, min_y, max_y = min(min_x, limits[0]), max(max_x, limits[1]), min(min_y, limits[2]), max(max_y, limits[3])
         if not first: # If there is at least 1 line
             self.main_axes.set_xlim([min_x, max_x])
             self.main_axes.set_ylim([min_y, max_y])
             # Redraw changes
-            self.fig.canvas.draw()
+            self.draw_canvas()
 
     def action_btn_normalization(self, *args, **kwargs):
         if not self.normalization_flag:
@@ -425,11 +422,15 @@ class PlotWindow(tk.Toplevel):
             delta_data = np.convolve(np.array([-1, 0, 1]), x, mode='same')
             derivative_data = np.divide(derivative_data, delta_data)
             self.main_axes.plot(x, derivative_data, picker=self.picker_tolerance, label='<Derivative of ' + self.selected_artist['artist'].get_label() + '>')
-        self.fig.canvas.draw()
+        self.draw_canvas()
 
 
 class RXESPlot(PlotWindow):
 
+    # Ways of drawing the maps: (name, label). Images have one quadrilateral per measured point,
+    # reduced to about one per pixel of the current view (then refreshed on zoom and pan) unless all the cells are asked for
+    renderings = [('image', 'Image'), ('image_full', 'Image (all cells)'), ('contours', 'Filled contours')]
+
     def __init__(self, *args, **kwargs):
 
         # Inheritance
@@ -438,6 +439,15 @@ class RXESPlot(PlotWindow):
         # Object properties
         self.calibration_flag = False
         self.profile_flag = False
+        # Grid products (see update_plot_data) of self.plot_data_source, keyed by plot_data_key, most recently used last
+        self.plot_data_cache = OrderedDict()
+        self.plot_data_source = None
+        self.max_plot_data = 4
+        # Image of the map (see draw_map): cells, QuadMesh artist, and rows, columns and steps it shows
+        self.map_cells = None
+        self.map_mesh = None
+        self.map_view = None
+        self.map_update_pending = None
 
         self.add_profiles_and_colorbar()
 
@@ -459,6 +469,20 @@ class RXESPlot(PlotWindow):
         self.widgets['cb_transferred'].pack(side=tk.LEFT, padx=10, pady=10)
         self.widgets['cb_transferred'].add_click_action(self.action_cb_transferred_click)
 
+        # Energy transfer map interpolation
+        labels = [label for name, label in Processing.transfer_interpolations]
+        self.widgets['combo_interpolation'] = ttk.Combobox(self.widgets['frame_widgets'], values=labels, state='readonly', width=max(len(label) for label in labels))
+        self.widgets['combo_interpolation'].set(labels[0])
+        self.widgets['combo_interpolation'].bind('<<ComboboxSelected>>', self.action_combo_interpolation_select)
+        self.widgets['combo_interpolation'].pack(side=tk.LEFT, padx=(0, 10), pady=5)
+
+        # Map rendering
+        labels = [label for name, label in self.renderings]
+        self.widgets['combo_rendering'] = ttk.Combobox(self.widgets['frame_widgets'], values=labels, state='readonly', width=max(len(label) for label in labels))
+        self.widgets['combo_rendering'].set(labels[0])
+        self.widgets['combo_rendering'].bind('<<ComboboxSelected>>', self.action_combo_rendering_select)
+        self.widgets['combo_rendering'].pack(side=tk.LEFT, padx=10, pady=5)
+
         # Profile checkbox
         self.widgets['btn_profile'] = ttk.Button(self.widgets['frame_widgets'], text='Profile center')
         self.widgets['btn_profile']["command"] = self.action_btn_profile
@@ -467,6 +491,97 @@ class RXESPlot(PlotWindow):
         # Pack buttons frame
         self.widgets['frame_widgets'].grid(row=0, column=0)
 
+    def transfer_interpolation(self):
+        ' Name (see Processing.transfer_interpolations) of the interpolation selected for the energy transfer map '
+        label = self.widgets['combo_interpolation'].get()
+        for name, interpolation_label in Processing.transfer_interpolations:
+            if interpolation_label == label:
+                return name
+        return Processing.transfer_interpolations[0][0]
+
+    def action_combo_interpolation_select(self, *args, **kwargs):
+        if self.widgets['cb_transferred'].value():
+            self.refresh_plot()
+
+    def rendering(self):
+        ' Name (see renderings) of the map rendering selected '
+        label = self.widgets['combo_rendering'].get()
+        for name, rendering_label in self.renderings:
+            if rendering_label == label:
+                return name
+        return self.renderings[0][0]
+
+    def action_combo_rendering_select(self, *args, **kwargs):
+        self.refresh_plot()
+
+    def draw_map(self, X, Y, Z, levels, transferred=False, **kwargs):
+        ' Draw the map (filled contours or image, see renderings), returns the mappable for the colorbar '
+        self.map_cells = None
+        self.map_mesh = None
+        self.map_view = None
+        rendering = self.rendering()
+        if rendering == 'contours':
+            return self.main_axes.contourf(X, Y, Z, levels, stride=1, **kwargs)
+        self.map_cells = Processing.rxes_cells(self.plot_data, transferred) + (transferred,)
+        self.update_map_mesh()
+        if rendering == 'image':
+            # Axes callbacks are cleared with the axes (refresh_plot), so they are connected once per map.
+            # Limits changed on the profiles axes are not emitted by the main axes, although they are shared.
+            for axes, limit in [(self.main_axes, 'xlim_changed'), (self.main_axes, 'ylim_changed'), (self.bottom_axes, 'xlim_changed'), (self.right_axes, 'ylim_changed')]:
+                axes.callbacks.connect(limit, self.action_map_view_changed)
+        return self.map_mesh
+
+    def action_map_view_changed(self, *args, **kwargs):
+        # Zoom and pan change both limits, several times per redraw: the image is rebuilt once, when idle
+        if self.map_update_pending is None:
+            self.map_update_pending = self.after_idle(self.action_map_update)
+
+    def action_map_update(self, *args, **kwargs):
+        self.map_update_pending = None
+        if self.update_map_mesh():
+            self.fig.canvas.draw_idle()
+
+    def update_map_mesh(self):
+        """ (Re)build the image of the map with the cells of the current view, merged so that there are about as many as
+        pixels in the axes (or all the cells, see renderings). Returns False if the image already matches the view. """
+        if self.map_cells is None:
+            return False
+        emitted_edges, incoming_edges, Z, transferred = self.map_cells
+        if self.map_mesh is None:
+            # First image: the whole map, as the limits are only set by the autoscaling afterwards
+            rows, columns = slice(0, Z.shape[0]), slice(0, Z.shape[1])
+        else:
+            rows, columns = Processing.visible_cells(emitted_edges, incoming_edges, self.main_axes.get_xlim(), self.main_axes.get_ylim(), transferred)
+        if self.rendering() == 'image_full':
+            max_rows, max_columns = Z.shape
+        else:
+            bbox = self.main_axes.bbox
+            max_rows, max_columns = int(bbox.height), int(bbox.width)
+        # Views showing all their cells have the same image, whatever the size of the axes
+        max_rows, max_columns = min(max_rows, rows.stop - rows.start), min(max_columns, columns.stop - columns.start)
+        view = (rows.start, rows.stop, columns.start, columns.stop, max_rows, max_columns)
+        if view == self.map_view:
+            return False
+        with self.profiler.span('RXESPlot.update_map_mesh', 'plot', cells=Z.size):
+            emitted_edges, incoming_edges, Z = Processing.downsample_cells(emitted_edges, incoming_edges, Z, max_rows, max_columns, rows, columns)
+            X_corners, Y_corners = Processing.cell_corners(emitted_edges, incoming_edges, transferred)
+            limits = self.main_axes.get_xlim(), self.main_axes.get_ylim()
+            # Same color scale for all the images, so that the colorbar still applies
+            mesh = self.main_axes.pcolormesh(X_corners, Y_corners, np.ma.masked_invalid(Z), vmin=0, vmax=1)
+            if self.map_mesh is not None:
+                self.map_mesh.remove()
+                # Replacing the image must not move the view
+                self.main_axes.set_xlim(limits[0], emit=False)
+                self.main_axes.set_ylim(limits[1], emit=False)
+            self.map_mesh = mesh
+            self.map_view = view
+        self.profiler.count('RXES image cells drawn', Z.size)
+        return True
+
+    def action_close_custom(self):
+        if self.map_update_pending is not None:
+            self.after_cancel(self.map_update_pending)
+
     def action_btn_profile(self, *args, **kwargs):
         if not self.profile_flag:
             self.profile_flag = True
@@ -500,7 +615,7 @@ class RXESPlot(PlotWindow):
                 self.main_axes.plot(x, y, '+', markerfacecolor='black', markeredgecolor='black', markeredgewidth=2.0, markersize=10.0)
                 self.preview_calibration()
                 # Redraw changes
-                self.fig.canvas.draw()
+                self.draw_canvas()
                 w.see(item_id)
                 self.application.widgets['cb_calib'].var.set(True)
 
@@ -536,17 +651,24 @@ class RXESPlot(PlotWindow):
         self.bottom_axes.get_yaxis().set_major_locator(matplotlib.ticker.FixedLocator([0, 0.5, 1]))
         plt.setp(self.right_axes.get_yticklabels(), visible=False)
 
+    @Profiler.profiled('RXESPlot.plot_transferred', 'plot')
     def plot_transferred(self):
 
         # Plot Data
-        self.update_plot_data('transferred') 
+        try:
+            self.update_plot_data('transferred')
+        except ValueError as e:
+            # Interpolation not available (e.g. griddata in newer matplotlib): back to the default one
+            self.log('* Error: ' + str(e))
+            self.widgets['combo_interpolation'].set(Processing.transfer_interpolations[0][1])
+            self.update_plot_data('transferred')
         X, Y, Z, Xmesh, Ymesh, Zmesh = self.plot_data
 
         # Show colormap scatter grid
         # self.main_axes.plot(Xmesh, Ymesh, 'o', markerfacecolor='black', markeredgecolor=None, markeredgewidth=0, markersize=2.0)
 
         # Colormap
-        cs = self.main_axes.contourf(X, Y, Z, 100, stride=1)
+        cs = self.draw_map(X, Y, Z, 100, transferred=True)
 
         # Profiles
         self.plot_profiles(X, Y, Z, Xmesh, Ymesh, Zmesh)
@@ -556,50 +678,38 @@ class RXESPlot(PlotWindow):
         self.fig.colorbar(cs, orientation="vertical", label="Intensity (a.u.)", ticks=np.linspace(0,1,11), cax=self.colorbar_axes)
         self.plot_redraw()
 
-    def update_plot_data(self, plot_type):
-
+    def plot_data_key(self, plot_type):
+        ''' Everything the grid products depend on, besides the data: map, interpolation and calibrations
+        (the normalization and base values of the window are not used: rxes_grid scales the map to a maximum of 1) '''
         p = self.parameters
-        # Intensities
-        counts = self.data[:, p['intensity_columns']]
-        # Normalize
-        counts = np.divide(counts, np.amax(counts))
-        # Axis
-        roi_axis = self.roi_axis()
-        energies_values = self.mogonio_to_energy().tolist()
-
-        X = roi_axis
-        Y = energies_values
-        Z = counts.astype(float)
-
-        if np.array(X).shape != Z.shape:
-            X = np.transpose(np.tile(np.array(X)[:, np.newaxis], Z.shape[0]))
-        if np.array(Y).shape != Z.shape:
-            Y = np.tile(np.array(Y)[:, np.newaxis], Z.shape[1])
-
-        if plot_type == 'emitted':
-
-            self.plot_data = [X, Y, Z, X, Y, Z]
-
-        elif plot_type == 'transferred':
-
-            # Matrix of energy transfer
-            X_transferred = Y - X
-
-            # Some useful values
-            min_x = float(np.amin(X))
-            max_x = float(np.amax(X))
-            x_average_step = (max_x-min_x)/(X.shape[0]-1)
-            min_y = float(np.amin(Y))
-            max_y = float(np.amax(Y))
-            y_average_step = (max_y-min_y)/(Y.shape[1]-1)
-            min_x_transferred = np.amin(X_transferred)
-            max_x_transferred = np.amax(X_transferred)
+        return (plot_type,
+                self.transfer_interpolation() if plot_type == 'transferred' else None,
+                bool(p['use_calibration'] and p['calibration_data']),
+                RoiAxis.calibration_key(p['calibration_data'] or []),
+                bool(p['use_mogonio_calibration']),
+                p['mogonio_calibration_a'],
+                p['mogonio_calibration_b'])
 
-            Xmesh, Ymesh = np.meshgrid(np.arange(min_x_transferred, max_x_transferred, x_average_step), np.arange(min_y, max_y, y_average_step))
-            Zmesh = griddata(np.reshape(X_transferred,-1), np.reshape(Y,-1), np.reshape(counts,-1), Xmesh, Ymesh, interp='linear')
-
-            self.plot_data = [X_transferred, Y, Z, Xmesh, Ymesh, Zmesh]
+    def update_plot_data(self, plot_type):
+        p = self.parameters
+        # Axis (roi_axis also sets the axes labels, which are cleared on every refresh)
+        emitted = self.roi_axis()
+        # Switching maps, interpolations or profiles centers redraws the cached grids without computing them again
+        if self.plot_data_source is not self.data:
+            self.plot_data_cache.clear()
+            self.plot_data_source = self.data
+        key = self.plot_data_key(plot_type)
+        if key in self.plot_data_cache:
+            self.plot_data_cache[key] = self.plot_data_cache.pop(key)
+            self.profiler.count('RXES grids cache hits')
+        else:
+            self.profiler.count('RXES grids cache misses')
+            self.plot_data_cache[key] = Processing.rxes_grid(emitted, self.mogonio_to_energy(), Processing.intensity_block(self.data, p), transferred=(plot_type == 'transferred'), interpolation=self.transfer_interpolation())
+            while len(self.plot_data_cache) > self.max_plot_data:
+                self.plot_data_cache.popitem(last=False)
+        self.plot_data = self.plot_data_cache[key]
 
+    @Profiler.profiled('RXESPlot.plot_emitted', 'plot')
     def plot_emitted(self):
 
         # Plot Data
@@ -607,7 +717,7 @@ class RXESPlot(PlotWindow):
         X, Y, Z, Xmesh, Ymesh, Zmesh = self.plot_data
 
         # Colormap
-        cs = self.main_axes.contourf(X, Y, Z, 50, stride=1, picker=self.picker_tolerance)
+        cs = self.draw_map(X, Y, Z, 50, picker=self.picker_tolerance)
 
         # Profiles
         self.plot_profiles(X, Y, Z, Xmesh, Ymesh, Zmesh)
@@ -617,23 +727,16 @@ class RXESPlot(PlotWindow):
         self.fig.colorbar(cs, orientation="vertical", label="Intensity (a.u.)", ticks=np.linspace(0,1,11), cax=self.colorbar_axes)
         self.plot_redraw()
 
+    @Profiler.profiled('RXESPlot.plot_profiles', 'plot')
     def plot_profiles(self, X, Y, Z, Xmesh=None, Ymesh=None, Zmesh=None, profile_x=None, profile_y=None):
 
-        # Getting profile center position
+        # Profiles crossing at the maximum intensity, or at the clicked position (fitted inside the current view)
         if profile_x is None or profile_y is None: 
-            # If profile_x and profile_y not defined, use max intensity as center
-            x_index, y_index = np.unravel_index(Z.argmax(), Z.shape)
-            x_index_mesh, y_index_mesh = np.unravel_index(Zmesh.argmax(), Zmesh.shape)
-            xlim = [ np.amin(X), np.amax(X) ]
-            ylim = [ np.amin(Ymesh), np.amax(Ymesh) ]
+            profiles = Processing.rxes_profiles([X, Y, Z, Xmesh, Ymesh, Zmesh])
         else:
-            # Find the closest positions (x, y) to the ones clicked by the user
-            x_index = self.find_closest_in_array(Y[:, 0], profile_y)
-            y_index = self.find_closest_in_array(X[x_index, :], profile_x)
-            x_index_mesh = self.find_closest_in_array(Ymesh[:, 0], profile_y)
-            y_index_mesh = self.find_closest_in_array(Xmesh[x_index_mesh, :], profile_x)
-            ylim = self.main_axes.get_ylim()
-            xlim = self.main_axes.get_xlim()
+            profiles = Processing.rxes_profiles([X, Y, Z, Xmesh, Ymesh, Zmesh], profile_x, profile_y, self.main_axes.get_xlim(), self.main_axes.get_ylim())
+        x_index, y_index = profiles['center']
+        x_index_mesh, y_index_mesh = profiles['mesh_center']
 
         # Try to remove horizontal and vertical line, if they already exist
         try:
@@ -647,45 +750,41 @@ class RXESPlot(PlotWindow):
         self.vline = self.main_axes.vlines(X[x_index, y_index], np.amin(Y), np.amax(Y), linewidth=2, color='fuchsia', linestyles='dashed') 
 
         # Gaussian fit for right axes
-        y_index_min = self.find_closest_in_array(Ymesh[:, y_index_mesh], ylim[0])
-        y_index_max = self.find_closest_in_array(Ymesh[:, y_index_mesh], ylim[1])
-        y_index_min, y_index_max = sorted([y_index_min, y_index_max]) # Sort lower and higher indices
-        fit = GaussianFit(np.nan_to_num(Ymesh[y_index_min:y_index_max+1, y_index_mesh]), np.nan_to_num(Zmesh[y_index_min:y_index_max+1, y_index_mesh]))
+        fit = GaussianFit(*profiles['right_fit'])
         self.log('* Right axes Gaussian fit FWHM: ' + str(fit.get_fwhm()))
 
         # Profile at right axes
+        right_z, right_y = profiles['right']
         if self.right_profile is None:
-            self.right_profile = self.right_axes.plot(Zmesh[:, y_index_mesh], Ymesh[:, y_index_mesh], picker=self.picker_tolerance)[0] # Line plot
-            self.right_profile_scatter = self.right_axes.plot(Zmesh[:, y_index_mesh], Ymesh[:, y_index_mesh], 'o', markerfacecolor='black', markeredgecolor=None, markeredgewidth=0, markersize=2.0)[0] # Scatter plot
+            self.right_profile = self.right_axes.plot(right_z, right_y, picker=self.picker_tolerance)[0] # Line plot
+            self.right_profile_scatter = self.right_axes.plot(right_z, right_y, 'o', markerfacecolor='black', markeredgecolor=None, markeredgewidth=0, markersize=2.0)[0] # Scatter plot
             #self.right_profile_fit = self.right_axes.plot(fit.get_fit_y_data(), Ymesh[y_index_min:y_index_max+1, y_index_mesh], '--', color='red', linewidth=2.0, picker=self.picker_tolerance)[0] # Fit plot
             self.right_profile_fit = self.right_axes.plot(fit.get_fit_y_data(), fit.get_fit_x_data(), '--', color='red', linewidth=2.0, picker=self.picker_tolerance)[0] # Fit plot
         else:
-            self.right_profile.set_xdata(Zmesh[:, y_index_mesh])
-            self.right_profile.set_ydata(Ymesh[:, y_index_mesh])
-            self.right_profile_scatter.set_xdata(Zmesh[:, y_index_mesh])
-            self.right_profile_scatter.set_ydata(Ymesh[:, y_index_mesh])
+            self.right_profile.set_xdata(right_z)
+            self.right_profile.set_ydata(right_y)
+            self.right_profile_scatter.set_xdata(right_z)
+            self.right_profile_scatter.set_ydata(right_y)
             self.right_profile_fit.set_xdata(fit.get_fit_y_data())
             #self.right_profile_fit.set_ydata(Ymesh[y_index_min:y_index_max+1, y_index_mesh])
             self.right_profile_fit.set_ydata(fit.get_fit_x_data())
 
         # Gaussian fit for bottom axes
-        x_index_min = self.find_closest_in_array(X[x_index, :], xlim[0])
-        x_index_max = self.find_closest_in_array(X[x_index, :], xlim[1])
-        x_index_min, x_index_max = sorted([x_index_min, x_index_max]) # Sort lower and higher indices
-        fit = GaussianFit(X[x_index, x_index_min:x_index_max+1], Z[x_index, x_index_min:x_index_max+1])
+        fit = GaussianFit(*profiles['bottom_fit'])
         self.log('* Bottom axes Gaussian fit FWHM: ' + str(fit.get_fwhm()))
 
         # Profile at bottom axes
+        bottom_x, bottom_z = profiles['bottom']
         if self.bottom_profile is None:
-            self.bottom_profile = self.bottom_axes.plot(X[x_index, :], Z[x_index, :], picker=self.picker_tolerance)[0]
-            self.bottom_profile_scatter = self.bottom_axes.plot(X[x_index, :], Z[x_index, :], 'o', markerfacecolor='black', markeredgecolor=None, markeredgewidth=0, markersize=2.0)[0] # Scatter plot
+            self.bottom_profile = self.bottom_axes.plot(bottom_x, bottom_z, picker=self.picker_tolerance)[0]
+            self.bottom_profile_scatter = self.bottom_axes.plot(bottom_x, bottom_z, 'o', markerfacecolor='black', markeredgecolor=None, markeredgewidth=0, markersize=2.0)[0] # Scatter plot
             #self.bottom_profile_fit = self.bottom_axes.plot(X[x_index, x_index_min:x_index_max+1], fit.get_fit_y_data(), '--', color='red', linewidth=2.0, picker=self.picker_tolerance)[0] # Fit plot
             self.bottom_profile_fit = self.bottom_axes.plot(fit.get_fit_x_data(), fit.get_fit_y_data(), '--', color='red', linewidth=2.0, picker=self.picker_tolerance)[0] # Fit plot
         else:
-            self.bottom_profile.set_xdata(X[x_index, :])
-            self.bottom_profile.set_ydata(Z[x_index, :])
-            self.bottom_profile_scatter.set_xdata(X[x_index, :])
-            self.bottom_profile_scatter.set_ydata(Z[x_index, :])
+            self.bottom_profile.set_xdata(bottom_x)
+            self.bottom_profile.set_ydata(bottom_z)
+            self.bottom_profile_scatter.set_xdata(bottom_x)
+            self.bottom_profile_scatter.set_ydata(bottom_z)
             #self.bottom_profile_fit.set_xdata(X[x_index, x_index_min:x_index_max+1])
             self.bottom_profile_fit.set_xdata(fit.get_fit_x_data())
             self.bottom_profile_fit.set_ydata(fit.get_fit_y_data())
@@ -700,7 +799,7 @@ class RXESPlot(PlotWindow):
         self.bottom_profile_fit.set_label(label)
 
         # Redraw changes
-        self.fig.canvas.draw()
+        self.draw_canvas()
 
     def config_plot_custom(self):
         self.main_axes.set_ylabel('Incoming energy (keV)')
@@ -720,7 +819,7 @@ class RXESPlot(PlotWindow):
             self.plot_transferred()
         else:
             self.plot_emitted()
-        self.fig.canvas.draw()
+        self.draw_canvas()
 
 class HERFDPlot(PlotWindow):
 
@@ -743,23 +842,26 @@ class HERFDPlot(PlotWindow):
         # Pack buttons frame
         self.widgets['frame_widgets'].grid(row=0, column=0)
 
+    @Profiler.profiled('HERFDPlot.plot_multiple', 'plot')
     def plot_multiple(self):
         p = self.parameters
         self.main_axes.clear()
 
-        normalized_data = np.divide(self.data[:, p['intensity_columns']], self.normalization_value) - self.base_value/self.normalization_value
+        normalized_data = Processing.normalize(Processing.intensity_block(self.data, p), self.normalization_value, self.base_value)
+        energies = self.mogonio_to_energy()
         
         for roi_index in range(len(p['intensity_columns'])):
             label = '<Fig. ' + str(self.figure_number) + '; ROI = ' + p['intensity_names'][roi_index] + '>'
-            self.main_axes.plot(self.mogonio_to_energy(), normalized_data[:, roi_index], picker=self.picker_tolerance, label=label)
+            self.main_axes.plot(energies, normalized_data[:, roi_index], picker=self.picker_tolerance, label=label)
 
         self.plot_redraw()
 
+    @Profiler.profiled('HERFDPlot.plot_sum', 'plot')
     def plot_sum(self):
         p = self.parameters
         self.main_axes.clear()
 
-        normalized_data = np.sum(np.divide(self.data[:, p['intensity_columns']], self.normalization_value), axis=1) - self.base_value/self.normalization_value
+        normalized_data = Processing.normalized_sum(Processing.intensity_block(self.data, p), 1, self.normalization_value, self.base_value)
 
         # Add plot line of the sum
         label = '<Fig. ' + str(self.figure_number) + '; Sum>'
@@ -784,8 +886,10 @@ class XESPlot(PlotWindow):
 
     def __init__(self, *args, **kwargs):
         PlotWindow.__init__(self, plot_type='XES', *args, **kwargs)
+        self.spectra_update_pending = None
         self.add_widgets()
         self.show()
+        self.canvas.mpl_connect('button_press_event', self.action_spectra_click)
         self.plot_multiple()
 
     def add_widgets(self):
@@ -801,6 +905,7 @@ class XESPlot(PlotWindow):
         # Pack buttons frame
         self.widgets['frame_widgets'].grid(row=0, column=0)
 
+    @Profiler.profiled('XESPlot.plot_multiple', 'plot')
     def plot_multiple(self):
         p = self.parameters
         self.main_axes.clear()
@@ -809,15 +914,22 @@ class XESPlot(PlotWindow):
         rows, columns = self.data.shape
         roi_axis = self.roi_axis()
 
-        normalized_data = np.divide(self.data[:, min(p['intensity_columns']):max(p['intensity_columns'])+1], self.normalization_value) - self.base_value/self.normalization_value
+        normalized_data = Processing.normalize(Processing.intensity_block(self.data, p), self.normalization_value, self.base_value)
 
+        labels = list()
         for row_index in range(len(normalized_data)):
-            label = '<Fig. ' + str(self.figure_number) + '; Row = ' + str(self.data[row_index, p['row_number_column']]) + '; Energy = ' + str(self.data[row_index, p['energy_column']]) + '>'
+            labels.append('<Fig. ' + str(self.figure_number) + '; Row = ' + str(self.data[row_index, p['row_number_column']]) + '; Energy = ' + str(self.data[row_index, p['energy_column']]) + '>')
 
-            self.main_axes.plot(roi_axis, normalized_data[row_index, :], picker=self.picker_tolerance, label=label)
+        # One collection for all the rows (thousands of Line2D artists are slow to draw and to pick)
+        self.spectra = SpectraCollection(self.main_axes, roi_axis, normalized_data, labels, self.picker_tolerance)
+        # Axes callbacks are cleared with the axes, so they are connected once per plot
+        self.main_axes.callbacks.connect('xlim_changed', self.action_spectra_view_changed)
+        # Spectra leaving or entering the y range change the points budget of the others
+        self.main_axes.callbacks.connect('ylim_changed', self.action_spectra_view_changed)
 
         self.plot_redraw()
 
+    @Profiler.profiled('XESPlot.plot_sum', 'plot')
     def plot_sum(self):
         p = self.parameters
         self.main_axes.clear()
@@ -826,7 +938,8 @@ class XESPlot(PlotWindow):
         rows, columns = self.data.shape
         roi_axis = self.roi_axis()
 
-        normalized_data = np.sum(np.divide(self.data[0:rows, min(p['intensity_columns']):max(p['intensity_columns'])+1], self.normalization_value), axis=0) - self.base_value/self.normalization_value
+        normalized_data = Processing.normalized_sum(Processing.intensity_block(self.data, p), 0, self.normalization_value, self.base_value)
+        self.spectra = None
         # Add plot line
         label = '<Fig. ' + str(self.figure_number) + '; Sum>'
         self.main_axes.plot(roi_axis, normalized_data, picker=self.picker_tolerance, label=label)
@@ -838,6 +951,33 @@ class XESPlot(PlotWindow):
     def action_cb_sum_click(self, *args, **kwargs):
         self.refresh_plot()
 
+    def action_spectra_view_changed(self, *args, **kwargs):
+        # Zoom and pan change the limits several times per redraw: the segments are rebuilt once, when idle
+        if self.spectra_update_pending is None:
+            self.spectra_update_pending = self.after_idle(self.action_spectra_update)
+
+    def action_spectra_update(self, *args, **kwargs):
+        self.spectra_update_pending = None
+        if self.spectra is not None and self.spectra.update():
+            self.fig.canvas.draw_idle()
+
+    def action_spectra_click(self, event):
+        if self.spectra is None:
+            return
+        with self.profiler.span('XESPlot.pick', 'plot', spectra=len(self.spectra.Y)):
+            index = self.spectra.pick(event)
+        # The line of the spectrum already selected receives its own pick events
+        if index is None or index == self.spectra.selected:
+            return
+        if self.selected_artist is not None and self.selected_artist['artist'] is self.spectra.line:
+            self.selected_artist = None
+        line = self.spectra.select(index)
+        self.onpick(PickEvent('pick_event', self.canvas, event, line))
+
+    def action_close_custom(self):
+        if self.spectra_update_pending is not None:
+            self.after_cancel(self.spectra_update_pending)
+
     def refresh_plot(self):
         plot_sum = self.widgets['cb_sum'].value()
         if plot_sum:
@@ -885,7 +1025,7 @@ class MogonioCalibrationPlot(PlotWindow):
     def plot(self):
         p = self.parameters
 
-        normalized_data = np.sum(np.divide(self.data[:, p['intensity_columns']], self.normalization_value), axis=1) - self.base_value/self.normalization_value
+        normalized_data = Processing.normalized_sum(Processing.intensity_block(self.data, p), 1, self.normalization_value, self.base_value)
 
         # Add plot line of the sum
         label = '<Fig. ' + str(self.figure_number) + '; Mogonio Calibration XAS>'
@@ -916,27 +1056,16 @@ class MogonioCalibrationPlot(PlotWindow):
                 #self.main_axes.plot(x, y, '+', markerfacecolor='black', markeredgecolor='black', markeredgewidth=2.0, markersize=10.0)
                 self.main_axes.vlines(x, 0, 1, linewidth=1, color='black', linestyles='dashed') 
                 self.mogonio_calib_points.append(x)
-                self.fig.canvas.draw()
+                self.draw_canvas()
                 self.mogonio_calib_energies.append(float(tkSimpleDialog.askstring("Enter energy", "Energy (keV)", parent=self)))
     
     def action_find_mogonio_params(self, *args, **kwargs):
 
-        def residuals(p, energy, mogonio):
-            A, B = p
-            hc = 1239.8 # nm.eV
-            a = 0.543102 # lattice parameter for Si, in nm 
-            miller_indices = [1, 1, 1]
-            m = miller_indices
-            return energy - (hc * np.sqrt(m[0]**2 + m[1]**2 + m[2]**2)/(2*a*np.sin(np.radians(A + B*mogonio))))/1000.0
-
-        p0 = [-0.6, 1.0]
-        mogonio = np.array(self.mogonio_calib_points)
-        energy =  np.array(self.mogonio_calib_energies)
-        plsq = scipy.optimize.leastsq(residuals, p0, args=(energy, mogonio))
-
-        self.log('* Found parameters A = %f, B = %f.' % (plsq[0][0], plsq[0][1]) )
-        self.application.widgets['entry_incoming_energy_calib_param_A'].stringvar.set(plsq[0][0])
-        self.application.widgets['entry_incoming_energy_calib_param_B'].stringvar.set(plsq[0][1])
+        A, B = Processing.fit_mogonio_calibration(self.mogonio_calib_points, self.mogonio_calib_energies)
+
+        self.log('* Found parameters A = %f, B = %f.' % (A, B) )
+        self.application.widgets['entry_incoming_energy_calib_param_A'].stringvar.set(A)
+        self.application.widgets['entry_incoming_energy_calib_param_B'].stringvar.set(B)
         self.application.widgets['cb_mogonio_calib'].var.set(True)
 
 class ClipboardPlot(PlotWindow):
@@ -1004,7 +1133,7 @@ class ClipboardPlot(PlotWindow):
 
             smooth_data = np.convolve(discrete_gauss_y, np.concatenate((d[1, np.newaxis], d[0, np.newaxis], d, d[-1, np.newaxis], d[-2, np.newaxis])), mode='same')
             self.selected_artist['artist'].set_ydata(smooth_data[2:-2])
-        self.fig.canvas.draw()
+        self.draw_canvas()
 
     def action_btn_normalization_single(self, *args, **kwargs):
         if not self.normalization_single_flag:
@@ -1021,7 +1150,7 @@ class ClipboardPlot(PlotWindow):
             y = event.ydata
             if self.selected_artist is not None:
                 self.selected_artist['artist'].set_ydata(self.selected_artist['artist'].get_ydata()-y)
-                self.fig.canvas.draw()
+                self.draw_canvas()
             self.canvas.mpl_disconnect(self.normalization_single_connection)
             self.normalization_single_connection = self.canvas.mpl_connect('button_press_event', self.action_normalization_single_secondclick)
             self.widgets['btn_normalization_single']['text'] = 'Please double-click on y=1...'
@@ -1031,14 +1160,14 @@ class ClipboardPlot(PlotWindow):
             y = event.ydata
             if self.selected_artist is not None:
                 self.selected_artist['artist'].set_ydata(np.divide(self.selected_artist['artist'].get_ydata(),y))
-                self.fig.canvas.draw()
+                self.draw_canvas()
             self.action_btn_normalization_single()
 
     def action_btn_delete(self, *args, **kwargs):
         if self.selected_artist is not None:
             self.main_axes.lines.remove(self.selected_artist['artist'])
             self.selected_artist = None
-            self.fig.canvas.draw()
+            self.draw_canvas()
 
     def action_btn_swap_xy(self, *args, **kwargs):
         if self.selected_artist is not None:
@@ -1047,7 +1176,7 @@ class ClipboardPlot(PlotWindow):
             y = a.get_ydata() 
             a.set_xdata(y)
             a.set_ydata(x)
-            self.fig.canvas.draw()
+            self.draw_canvas()
 
     def action_btn_gaussfit(self, *args, **kwargs):
         if self.selected_artist is not None:
@@ -1055,16 +1184,14 @@ class ClipboardPlot(PlotWindow):
             xlim = self.main_axes.get_xlim()
             X = np.array(a.get_xdata()).astype('float')
             Z = np.array(a.get_ydata()).astype('float')
-            x_index_min = self.find_closest_in_array(X, xlim[0])
-            x_index_max = self.find_closest_in_array(X, xlim[1])
-            x_index_min, x_index_max = sorted([x_index_min, x_index_max]) # Sort lower and higher indices
+            x_index_min, x_index_max = sorted(Processing.closest_index(X, xlim)) # Sort lower and higher indices
             fit = GaussianFit(X[x_index_min:x_index_max+1], Z[x_index_min:x_index_max+1])
             self.log('* Gaussian fit w/ FWHM=' + str(fit.get_fwhm()) + ' for ' + str(a.get_label()))
             #fitplot = self.main_axes.plot(X[x_index_min:x_index_max+1], fit.get_fit_y_data(), '--', linewidth=2.0, picker=self.picker_tolerance)[0] # Fit plot
             fitplot = self.main_axes.plot(fit.get_fit_x_data(), fit.get_fit_y_data(), '--', linewidth=2.0, picker=self.picker_tolerance)[0] # Fit plot
             label = '<Gaussian fit w/ FWHM=' + str(fit.get_fwhm()) + ' for ' + a.get_label() + '>'
             fitplot.set_label(label)
-            self.fig.canvas.draw()
+            self.draw_canvas()
 
     def action_close_custom(self):
         # Remove reference from deleted clipboard plot
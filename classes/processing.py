@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Plot data computations without any GUI (used by the plot windows and by batch.py)
+# Date created: 2026-10-17
+
+import numpy as np
+
+# Custom classes
+from tools import *
+from formula import *
+from roi_axis import *
+from profiler import *
+
+class Processing:
+
+    ''' Numeric steps from a scan float array to the XES, HERFD and RXES plots: intensity formula
+    over the selected rows, incoming energy axis (with the mogonio calibration), emitted energy
+    axis (ROI numbers or calibrated energies), normalization and sums, RXES grids and profiles.
+    Plot parameters are the dicts built by Project. Nothing here depends on Tk or on a figure. '''
+
+    # Si(111) analyzer
+    hc = 1239.8 # nm.eV
+    lattice_parameter = 0.543102 # lattice parameter for Si, in nm
+    miller_indices = [1, 1, 1]
+
+    # Interpolations of the energy transfer RXES map on its regular mesh: (name, label in the RXES plot window)
+    transfer_interpolations = [('rows', 'Row resampling'), ('griddata', 'Triangulation (griddata)')]
+
+    @staticmethod
+    @Profiler.profiled('Processing.intensities', 'processing')
+    def intensities(data, p, rows=None):
+        ''' Rows of the scan array (all rows if None) with the intensity columns of the formula appended
+        (p['intensity_columns']). Raises ValueError when the formula or its columns are not valid. '''
+        # Formula is parsed (and checked) once per formula text
+        formula = Formula.compile(p['rois_formula'])
+
+        fields = {  'S': 'rois_signal_columns',
+                    'BG1': 'rois_bg1_columns',
+                    'BG2': 'rois_bg2_columns',
+                    'I0': 'i0_column'
+                 }
+
+        for key in fields:
+            # Fields with False or [] contents should throw errors if on formula
+            if (key in formula.names
+               and ((isinstance(p[fields[key]], (bool)) and not p[fields[key]])
+               or (not isinstance(p[fields[key]], (bool, int)) and len(p[fields[key]]) == 0))):
+                raise ValueError('Formula contains ' + key + ', but no column matched the user-defined filter')
+
+        # Pairs of ROI blocks used together must have the same number of columns
+        for first, second in [('S', 'BG1'), ('S', 'BG2'), ('BG1', 'BG2')]:
+            if first in formula.names and second in formula.names and len(p[fields[first]]) != len(p[fields[second]]):
+                raise ValueError('Formula contains both ' + first + ' and ' + second + ', but the number of columns differ')
+
+        # Selected rows are sliced directly out of the float array (no string conversion)
+        if rows is None:
+            selected_data = data
+        else:
+            selected_data = data[[row for row in rows if 0 <= row < len(data)]]
+
+        # Formula variables are float views of the selected rows
+        variables = dict()
+        for key in ['S', 'BG1', 'BG2']:
+            if key in formula.names:
+                variables[key] = Tools.as_float_columns(selected_data, p[fields[key]])
+        if 'I0' in formula.names:
+            variables['I0'] = selected_data[:, [p['i0_column']]]
+
+        # Intensity columns are appended after the scan columns, the formula writes them in place
+        shape = formula.shape(variables)
+        num_intensity_columns = shape[-1] if len(shape) == 2 else 1
+        output = np.empty((len(selected_data), selected_data.shape[1] + num_intensity_columns))
+        output[:, :selected_data.shape[1]] = selected_data
+        formula.evaluate(variables, out=output[:, selected_data.shape[1]:])
+        Profiler.count('intensity cells computed', len(selected_data) * num_intensity_columns)
+
+        return output
+
+    @classmethod
+    def mogonio_to_energy(cls, mogonio, a, b):
+        ' Incoming energy (keV) from mogonio angles, with the calibration angle = a + b * mogonio '
+        m = cls.miller_indices
+        return (cls.hc * np.sqrt(m[0]**2 + m[1]**2 + m[2]**2)/(2*cls.lattice_parameter*np.sin(np.radians(a + b*np.asarray(mogonio, dtype=float)))))/1000.0
+
+    @classmethod
+    def fit_mogonio_calibration(cls, mogonio, energies, initial=(-0.6, 1.0)):
+        ' Calibration parameters (a, b) of mogonio_to_energy, least squares fit of (mogonio, energy) points '
+        # scipy is only imported when a fit is requested (slow to import)
+        import scipy.optimize
+        def residuals(parameters, energies, mogonio):
+            return energies - cls.mogonio_to_energy(mogonio, parameters[0], parameters[1])
+        plsq = scipy.optimize.leastsq(residuals, list(initial), args=(np.array(energies, dtype=float), np.array(mogonio, dtype=float)))
+        return plsq[0][0], plsq[0][1]
+
+    @classmethod
+    def incoming_energies(cls, data, p):
+        ' Energy column of the data, converted from mogonio angles when the mogonio calibration is enabled '
+        energies_values = np.array(data[:, p['energy_column']], dtype=float)
+        if p['use_mogonio_calibration']:
+            return cls.mogonio_to_energy(energies_values, p['mogonio_calibration_a'], p['mogonio_calibration_b'])
+        return energies_values
+
+    @staticmethod
+    def emitted_axis(p):
+        ' ROI numbers of the intensity columns, or their energies when the emitted energy calibration is enabled '
+        if p['use_calibration'] and p['calibration_data']:
+            return RoiAxis.energies(p['intensity_names'], p['calibration_data'])
+        return RoiAxis.numbers(p['intensity_names'])
+
+    @staticmethod
+    def intensity_block(data, p):
+        ' Intensity columns (rows x ROIs) of computed plot data: a view when they are consecutive, else a copy '
+        columns = np.asarray(p['intensity_columns'], dtype=int)
+        if len(columns) == 0:
+            raise ValueError('No intensity columns: no ROI column matched the signal (S) filter')
+        if np.all(np.diff(columns) == 1):
+            return data[:, columns[0]:columns[-1]+1]
+        return data[:, columns]
+
+    @staticmethod
+    def normalize(values, normalization_value=1, base_value=0):
+        ' Intensities scaled so that base_value is 0 and base_value + normalization_value is 1 '
+        return np.divide(values, normalization_value) - base_value/normalization_value
+
+    @staticmethod
+    def normalized_sum(values, axis, normalization_value=1, base_value=0):
+        ' Sum of the scaled intensities along axis (0: over rows, XES; 1: over ROIs, HERFD), minus a single base '
+        return np.sum(np.divide(values, normalization_value), axis=axis) - base_value/normalization_value
+
+    @classmethod
+    def xes(cls, data, p):
+        ' XES spectrum summed over all rows: (emitted axis, intensity) '
+        return cls.emitted_axis(p), cls.normalized_sum(cls.intensity_block(data, p), 0)
+
+    @classmethod
+    def herfd(cls, data, p):
+        ' HERFD spectrum summed over all ROIs: (incoming energies, intensity) '
+        return cls.incoming_energies(data, p), cls.normalized_sum(cls.intensity_block(data, p), 1)
+
+    @classmethod
+    def rxes(cls, data, p):
+        ' RXES map: (emitted axis, incoming energies, rows x ROIs intensities) '
+        return cls.emitted_axis(p), cls.incoming_energies(data, p), cls.intensity_block(data, p)
+
+    @staticmethod
+    @Profiler.profiled('Processing.rxes_grid', 'processing')
+    def rxes_grid(emitted, incoming, counts, transferred=False, interpolation='rows'):
+        """ RXES map products [X, Y, Z, Xmesh, Ymesh, Zmesh] (rows = incoming energies, columns = ROIs),
+        intensities normalized to a maximum of 1. For the emitted energy map the mesh is the data itself,
+        for the energy transfer map (X = incoming - emitted) Zmesh is interpolated on a regular mesh
+        (masked outside the measured area), by resample_rows or by a Delaunay triangulation ('griddata'). """
+        # Normalize
+        Z = np.divide(counts, np.amax(counts)).astype(float)
+
+        X = np.asarray(emitted, dtype=float)
+        Y = np.asarray(incoming, dtype=float)
+        if X.shape != Z.shape:
+            X = np.tile(X, (Z.shape[0], 1))
+        if Y.shape != Z.shape:
+            Y = np.tile(Y[:, np.newaxis], (1, Z.shape[1]))
+
+        if not transferred:
+            return [X, Y, Z, X, Y, Z]
+
+        # Matrix of energy transfer
+        X_transferred = Y - X
+
+        # Some useful values
+        min_x = float(np.amin(X))
+        max_x = float(np.amax(X))
+        x_average_step = (max_x-min_x)/(X.shape[0]-1)
+        min_y = float(np.amin(Y))
+        max_y = float(np.amax(Y))
+        y_average_step = (max_y-min_y)/(Y.shape[1]-1)
+        min_x_transferred = np.amin(X_transferred)
+        max_x_transferred = np.amax(X_transferred)
+
+        Xmesh, Ymesh = np.meshgrid(np.arange(min_x_transferred, max_x_transferred, x_average_step), np.arange(min_y, max_y, y_average_step))
+        Profiler.count('RXES mesh points interpolated', Xmesh.size)
+        with Profiler.span('RXES ' + interpolation, 'processing', points=Z.size, mesh=Xmesh.size):
+            if interpolation == 'rows':
+                Zmesh = Processing.resample_rows(X[0], Y[:, 0], Z, Xmesh[0], Ymesh[:, 0])
+            elif interpolation == 'griddata':
+                try:
+                    # Only this interpolation needs matplotlib (slow to import), and it was removed from matplotlib 3.1
+                    from matplotlib.mlab import griddata
+                except ImportError:
+                    raise ValueError('Triangulation (griddata) is not available with this matplotlib version')
+                Zmesh = griddata(np.reshape(X_transferred,-1), np.reshape(Y,-1), np.reshape(Z,-1), Xmesh, Ymesh, interp='linear')
+            else:
+                raise ValueError('Unknown interpolation: ' + str(interpolation))
+
+        return [X_transferred, Y, Z, Xmesh, Ymesh, Zmesh]
+
+    @staticmethod
+    def resample_rows(emitted, incoming, Z, transfer, mesh_incoming):
+        """ Energy transfer map on the regular mesh (rows = mesh_incoming, columns = transfer), from Z
+        (rows = incoming energies, columns = emitted axis, which is the same for all the rows). The data is a
+        sheared regular grid, so each row is interpolated linearly onto the transfer axis, then the mesh rows
+        between the two closest rows, for all the rows at once. Masked outside the measured area. """
+        emitted = np.asarray(emitted, dtype=float)
+        incoming = np.asarray(incoming, dtype=float)
+        if len(emitted) < 2 or len(incoming) < 2:
+            return np.ma.masked_all((len(mesh_incoming), len(transfer)))
+        # np.interp needs increasing abscissas
+        columns_order = np.argsort(emitted, kind='mergesort')
+        rows_order = np.argsort(incoming, kind='mergesort')
+        emitted = emitted[columns_order]
+        incoming = incoming[rows_order]
+        Z = np.asarray(Z, dtype=float)[rows_order][:, columns_order]
+
+        # Emitted energy (incoming - transfer) of each (row, transfer) point, as a fractional column index
+        columns_position = np.interp(incoming[:, np.newaxis] - np.asarray(transfer)[np.newaxis, :], emitted, np.arange(len(emitted)), left=np.nan, right=np.nan)
+        rows_values = Processing.interpolate_positions(Z, columns_position, axis=1)
+
+        # Mesh rows between the two closest data rows
+        rows_position = np.interp(mesh_incoming, incoming, np.arange(len(incoming)), left=np.nan, right=np.nan)
+        rows_position = np.tile(rows_position[:, np.newaxis], (1, rows_values.shape[1]))
+        return np.ma.masked_invalid(Processing.interpolate_positions(rows_values, rows_position, axis=0))
+
+    @staticmethod
+    def interpolate_positions(values, positions, axis):
+        ' Values at fractional indices along axis (positions has the output shape, NaN where outside) '
+        valid = ~np.isnan(positions)
+        positions = np.where(valid, positions, 0)
+        first = np.minimum(np.floor(positions).astype(int), values.shape[axis] - 2)
+        weight = positions - first
+        if axis == 1:
+            rows = np.arange(values.shape[0])[:, np.newaxis]
+            before, after = values[rows, first], values[rows, first + 1]
+        else:
+            columns = np.arange(values.shape[1])[np.newaxis, :]
+            before, after = values[first, columns], values[first + 1, columns]
+        # Exact positions do not depend on the next value (which may be NaN)
+        result = np.where(weight > 0, before * (1 - weight) + after * weight, before)
+        result[~valid] = np.nan
+        return result
+
+    @staticmethod
+    def cell_edges(centers):
+        ' Boundaries (one more than centers) of the cells around increasing centers: midpoints, and half steps beyond the ends '
+        centers = np.asarray(centers, dtype=float)
+        if len(centers) < 2:
+            return np.concatenate([centers - 0.5, centers + 0.5])
+        middle = (centers[:-1] + centers[1:]) / 2
+        return np.concatenate([[2 * centers[0] - middle[0]], middle, [2 * centers[-1] - middle[-1]]])
+
+    @classmethod
+    def rxes_cells(cls, plot_data, transferred=False):
+        """ Cells of an RXES map (see rxes_grid), to be drawn as an image: (emitted edges, incoming edges, Z) with
+        rows and columns sorted by increasing energy. The cells of the energy transfer map are the measured cells
+        sheared by X = incoming - emitted (see cell_corners), not the interpolated mesh. """
+        X, Y, Z = plot_data[:3]
+        incoming = Y[:, 0]
+        emitted = Y[0, :] - X[0, :] if transferred else X[0, :]
+        rows_order = np.argsort(incoming, kind='mergesort')
+        columns_order = np.argsort(emitted, kind='mergesort')
+        return cls.cell_edges(emitted[columns_order]), cls.cell_edges(incoming[rows_order]), Z[rows_order][:, columns_order]
+
+    @staticmethod
+    def cell_corners(emitted_edges, incoming_edges, transferred=False):
+        ' Corners (X, Y) of the cells, (rows + 1) x (columns + 1) arrays as expected by pcolormesh '
+        X, Y = np.meshgrid(emitted_edges, incoming_edges)
+        if transferred:
+            X = Y - X
+        return X, Y
+
+    @staticmethod
+    def visible_cells(emitted_edges, incoming_edges, xlim, ylim, transferred=False):
+        ' (rows slice, columns slice) of the cells inside the view xlim x ylim (axes limits) '
+        def edges_range(edges, low, high):
+            first = max(0, np.searchsorted(edges, low, side='right') - 1)
+            last = min(len(edges) - 1, np.searchsorted(edges, high, side='left'))
+            return slice(first, max(first + 1, last))
+        y_low, y_high = sorted(ylim)
+        rows = edges_range(incoming_edges, y_low, y_high)
+        x_low, x_high = sorted(xlim)
+        if transferred:
+            # Emitted energies seen at the visible incoming energies: emitted = incoming - transfer
+            x_low, x_high = incoming_edges[rows.start] - x_high, incoming_edges[rows.stop] - x_low
+        return rows, edges_range(emitted_edges, x_low, x_high)
+
+    @staticmethod
+    def downsample_cells(emitted_edges, incoming_edges, Z, max_rows, max_columns, rows=slice(None), columns=slice(None)):
+        """ Cells (see rxes_cells) inside rows x columns, merged by blocks (mean of the cells, NaN ignored) so that
+        there are at most max_rows x max_columns of them (about the pixels of the axes): level of detail of a view """
+        first_row, last_row = rows.indices(Z.shape[0])[:2]
+        first_column, last_column = columns.indices(Z.shape[1])[:2]
+        Z = Z[first_row:last_row, first_column:last_column]
+        emitted_edges = emitted_edges[first_column:last_column + 1]
+        incoming_edges = incoming_edges[first_row:last_row + 1]
+        num_rows, num_columns = Z.shape
+        row_step = max(1, int(np.ceil(num_rows / float(max(1, max_rows)))))
+        column_step = max(1, int(np.ceil(num_columns / float(max(1, max_columns)))))
+        if row_step == 1 and column_step == 1:
+            return emitted_edges, incoming_edges, Z
+        row_starts = np.arange(0, num_rows, row_step)
+        column_starts = np.arange(0, num_columns, column_step)
+        valid = ~np.isnan(Z)
+        sums = np.add.reduceat(np.add.reduceat(np.where(valid, Z, 0), row_starts, axis=0), column_starts, axis=1)
+        counts = np.add.reduceat(np.add.reduceat(valid.astype(float), row_starts, axis=0), column_starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            merged = sums / counts
+        return emitted_edges[np.append(column_starts, num_columns)], incoming_edges[np.append(row_starts, num_rows)], merged
+
+    @staticmethod
+    def closest_index(X, x0):
+        """ Index of the value of X closest to x0 (the first one on ties, NaN values ignored), or an array of indices if
+        x0 is a list of values (queried at once). Binary search when X is sorted (increasing or decreasing, as the
+        energy axes), else the distances to all the values of X. """
+        X = np.asarray(X, dtype=float)
+        values = np.asarray(x0, dtype=float)
+        if len(X) == 0:
+            raise ValueError('No values to search')
+        # Any comparison with NaN is False
+        with np.errstate(invalid='ignore'):
+            steps = np.diff(X)
+            if np.all(steps <= 0) and not np.all(steps == 0):
+                # Decreasing: the same search on the opposite values, which are increasing
+                X, values = -X, -values
+                steps = -steps
+            if np.all(steps >= 0):
+                after = np.clip(np.searchsorted(X, values, side='left'), 0, len(X) - 1)
+                # First of the equal values before
+                before = np.searchsorted(X, X[np.maximum(after - 1, 0)], side='left')
+                indices = np.where(np.abs(values - X[before]) <= np.abs(X[after] - values), before, after)
+            else:
+                # Unsorted, or with NaN values
+                distances = np.abs(X[np.newaxis, :] - np.atleast_1d(values)[:, np.newaxis])
+                distances[np.isnan(distances)] = np.inf
+                indices = np.argmin(distances, axis=1).reshape(values.shape)
+        return int(indices) if indices.ndim == 0 else indices
+
+    @classmethod
+    @Profiler.profiled('Processing.rxes_profiles', 'processing')
+    def rxes_profiles(cls, plot_data, profile_x=None, profile_y=None, xlim=None, ylim=None):
+        """ Profiles of an RXES map (see rxes_grid) crossing at (profile_x, profile_y), or at the maximum
+        intensity if not given, and the parts of them inside xlim and ylim (the current view) to be fitted:
+        * 'center': (row, column) of the crossing in X, Y and Z, 'mesh_center': the same in the mesh
+        * 'right': (intensities, incoming energies) along the mesh column, 'right_fit': (energies, intensities) inside ylim
+        * 'bottom': (emitted axis, intensities) along the row, 'bottom_fit': (emitted axis, intensities) inside xlim """
+        X, Y, Z, Xmesh, Ymesh, Zmesh = plot_data
+
+        # Getting profile center position
+        if profile_x is None or profile_y is None:
+            # If profile_x and profile_y not defined, use max intensity as center
+            x_index, y_index = np.unravel_index(Z.argmax(), Z.shape)
+            x_index_mesh, y_index_mesh = np.unravel_index(Zmesh.argmax(), Zmesh.shape)
+            xlim = [ np.amin(X), np.amax(X) ]
+            ylim = [ np.amin(Ymesh), np.amax(Ymesh) ]
+        else:
+            # Find the closest positions (x, y) to the ones clicked by the user
+            x_index = cls.closest_index(Y[:, 0], profile_y)
+            y_index = cls.closest_index(X[x_index, :], profile_x)
+            x_index_mesh = cls.closest_index(Ymesh[:, 0], profile_y)
+            y_index_mesh = cls.closest_index(Xmesh[x_index_mesh, :], profile_x)
+
+        # Part of the mesh column inside the view (right axes)
+        y_index_min, y_index_max = sorted(cls.closest_index(Ymesh[:, y_index_mesh], ylim)) # Sort lower and higher indices
+
+        # Part of the row inside the view (bottom axes)
+        x_index_min, x_index_max = sorted(cls.closest_index(X[x_index, :], xlim)) # Sort lower and higher indices
+
+        return {
+            'center': (x_index, y_index),
+            'mesh_center': (x_index_mesh, y_index_mesh),
+            'right': (Zmesh[:, y_index_mesh], Ymesh[:, y_index_mesh]),
+            'right_fit': (np.nan_to_num(Ymesh[y_index_min:y_index_max+1, y_index_mesh]), np.nan_to_num(Zmesh[y_index_min:y_index_max+1, y_index_mesh])),
+            'bottom': (X[x_index, :], Z[x_index, :]),
+            'bottom_fit': (X[x_index, x_index_min:x_index_max+1], Z[x_index, x_index_min:x_index_max+1]),
+        }
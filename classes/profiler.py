@@ -1,17 +1,182 @@
 # -*- coding: utf-8 -*-
 
-# Profiler (Timer)
+# Profiler: nestable timing spans (wall and CPU time) and counters, with a summary of the slowest
+# operations and an export to the Chrome trace format (chrome://tracing, Perfetto, speedscope)
 # Author: Rafael Pagliuca <rafael.pagliuca@lnls.br>
 # Date created: 2016-03-07
+# Modified: 2026-10-17
 
+import os
 import time
+import json
+import threading
+import functools
+from collections import deque
+
+# Process CPU time: time.clock() is CPU time on Unix only (it is wall time on Windows)
+if hasattr(time, 'process_time'):
+    cpu_clock = time.process_time
+elif os.name == 'posix':
+    cpu_clock = time.clock
+else:
+    cpu_clock = lambda: sum(os.times()[:2])
+
+class Span:
+
+    ''' One timed operation, used as a context manager (see Profiler.span) '''
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.child_wall = 0.0
+
+    def __enter__(self):
+        stack = Profiler.stack()
+        self.depth = len(stack)
+        stack.append(self)
+        self.start_cpu = cpu_clock()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.time() - self.start
+        cpu = cpu_clock() - self.start_cpu
+        stack = Profiler.stack()
+        # Spans started with Profiler.start() may be stopped out of order
+        if stack and stack[-1] is self:
+            stack.pop()
+        elif self in stack:
+            stack.remove(self)
+        if stack:
+            stack[-1].child_wall += wall
+        Profiler.record(self, wall, cpu)
+        return False
 
 class Profiler:
 
+    ''' Instrumentation shared by the whole process (all the instances record into the same trace):
+    * spans: "with self.profiler.span('name'):" or the @Profiler.profiled() decorator, nestable,
+      each one with its wall time, CPU time and the wall time spent outside its children (self time)
+    * counters: Profiler.count('rows parsed', n), totals and their evolution over time
+    * summary() / report(): operations sorted by total wall time, export_trace(): Chrome trace JSON
+    Only the last max_events spans and counter changes are kept, so memory use is bounded. '''
+
+    enabled = True
+    max_events = 100000
+    origin = time.time()
+    # Finished spans: (name, category, start, wall, cpu, self wall, depth, thread id, args)
+    events = deque(maxlen=max_events)
+    # Counter changes: (name, time, total)
+    counter_events = deque(maxlen=max_events)
+    counters = dict()
+    lock = threading.Lock()
+    local = threading.local()
+
     def __init__(self, *args, **kwargs):
-        self.profiler_stats = { 'start': dict(), 'total': dict(), 'state': dict() }
+        # Aliases started with start() and not stopped yet, and their accumulated totals
+        self.running = dict()
+        self.totals = dict()
         self.output_enabled = True
 
+    @classmethod
+    def stack(cls):
+        ' Open spans of the current thread, innermost last '
+        try:
+            return cls.local.stack
+        except AttributeError:
+            cls.local.stack = list()
+            return cls.local.stack
+
+    @classmethod
+    def span(cls, name, category='app', **args):
+        ' Context manager timing the operation name; args are attached to the trace event '
+        return Span(name, category, args)
+
+    @classmethod
+    def profiled(cls, name=None, category='app'):
+        ' Decorator timing each call of the function (named after it if name is not given) '
+        def decorator(function):
+            span_name = name if name is not None else function.__name__
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    return function(*args, **kwargs)
+                with Span(span_name, category, {}):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def record(cls, span, wall, cpu):
+        if cls.enabled:
+            cls.events.append((span.name, span.category, span.start, wall, cpu, wall - span.child_wall, span.depth, threading.current_thread().ident, span.args))
+
+    @classmethod
+    def count(cls, name, value=1):
+        ' Add value to the counter name (rows parsed, cells converted, artists drawn, ...) '
+        if not cls.enabled:
+            return
+        with cls.lock:
+            total = cls.counters.get(name, 0) + value
+            cls.counters[name] = total
+            cls.counter_events.append((name, time.time(), total))
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.events.clear()
+            cls.counter_events.clear()
+            cls.counters.clear()
+            cls.origin = time.time()
+
+    @classmethod
+    def summary(cls):
+        ''' One dict per operation name (name, calls, wall, self, cpu and max wall times, in seconds),
+        sorted by total wall time, slowest first '''
+        operations = dict()
+        for name, category, start, wall, cpu, self_wall, depth, thread, args in list(cls.events):
+            operation = operations.get(name)
+            if operation is None:
+                operation = operations[name] = {'name': name, 'calls': 0, 'wall': 0.0, 'self': 0.0, 'cpu': 0.0, 'max': 0.0}
+            operation['calls'] += 1
+            operation['wall'] += wall
+            operation['self'] += self_wall
+            operation['cpu'] += cpu
+            operation['max'] = max(operation['max'], wall)
+        return sorted(operations.values(), key=lambda operation: operation['wall'], reverse=True)
+
+    @classmethod
+    def report(cls, limit=20):
+        ' Text lines with the slowest operations and the counters '
+        lines = ['%-36s %7s %11s %11s %11s %11s' % ('Operation', 'Calls', 'Total (ms)', 'Self (ms)', 'CPU (ms)', 'Max (ms)')]
+        for operation in cls.summary()[:limit]:
+            lines.append('%-36s %7d %11.1f %11.1f %11.1f %11.1f' % (operation['name'][:36], operation['calls'],
+                         operation['wall'] * 1000, operation['self'] * 1000, operation['cpu'] * 1000, operation['max'] * 1000))
+        for name in sorted(cls.counters):
+            lines.append('%-36s %7s %11s' % (name[:36], '', cls.counters[name]))
+        return lines
+
+    @classmethod
+    def export_trace(cls, file_path):
+        ' Write the spans and counters in the Chrome trace event format (JSON) '
+        pid = os.getpid()
+        trace_events = list()
+        for name, category, start, wall, cpu, self_wall, depth, thread, args in list(cls.events):
+            event_args = dict((key, value if isinstance(value, (int, long, float, bool)) else str(value)) for key, value in args.items())
+            event_args['cpu_ms'] = round(cpu * 1000, 3)
+            trace_events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': thread,
+                                 'ts': round((start - cls.origin) * 1e6, 1), 'dur': round(wall * 1e6, 1), 'args': event_args})
+        for name, at, total in list(cls.counter_events):
+            trace_events.append({'name': name, 'ph': 'C', 'pid': pid, 'ts': round((at - cls.origin) * 1e6, 1), 'args': {name: total}})
+        # Parents first when they start at the same time, as expected by the viewers
+        trace_events.sort(key=lambda event: (event['ts'], -event.get('dur', 0)))
+        with open(file_path, 'w') as fp:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, fp)
+        return len(trace_events)
+
+    # Former API (one timer per alias, with suspend and resume), now recorded as spans
+
     def disable_output(self):
         self.output_enabled = False
 
@@ -19,30 +184,28 @@ class Profiler:
         self.output_enabled = True
 
     def start(self, alias):
-        self.state = 'running'
-        self.profiler_stats['total'][alias] = 0
-        self.profiler_stats['state'][alias] = 'running'
-        self.profiler_stats['start'][alias] = time.clock()
+        self.totals[alias] = 0.0
+        self.resume(alias)
 
     def stop(self, alias):
-        if self.profiler_stats['state'][alias] == 'running':
-            self.profiler_stats['total'][alias] += time.clock() - self.profiler_stats['start'][alias]
-            self.profiler_stats['state'][alias] = 'suspended'
-        else:
+        span = self.running.pop(alias, None)
+        if span is None:
             if self.output_enabled:
                 print 'Profiler <' + str(alias) + '> not running, cannot suspend.'
+            return
+        span.__exit__(None, None, None)
+        self.totals[alias] = self.totals.get(alias, 0.0) + time.time() - span.start
 
     def resume(self, alias):
-        if self.profiler_stats['state'][alias] == 'suspended':
-            self.profiler_stats['state'][alias] = 'running'
-            self.profiler_stats['start'][alias] = time.clock()
-        else:
+        if alias in self.running:
             if self.output_enabled:
                 print 'Profiler <' + str(alias) + '> not suspended, cannot resume.'
+            return
+        self.running[alias] = Span(str(alias), 'app', {}).__enter__()
 
     def print_total(self, alias):
         if self.output_enabled:
-            print 'profiler_stats[total][' + str(alias) + '] = ' + str(self.profiler_stats['total'][alias])
+            print 'Profiler <' + str(alias) + '> total: %.6f s' % self.totals.get(alias, 0.0)
 
     def stop_and_print(self, alias):
         self.stop(alias)
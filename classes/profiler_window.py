@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Profiling panel: slowest operations and counters recorded by the Profiler, and trace export
+# Date created: 2026-10-17
+
+import Tkinter as tk
+import tkFileDialog as fd
+import ttk
+# Custom classes
+from custom_widgets import *
+from profiler import *
+
+class ProfilerWindow(tk.Toplevel):
+
+    ''' Operations recorded since the application started (or since Reset), slowest first,
+    with the counters. The trace can be opened in chrome://tracing, Perfetto or speedscope. '''
+
+    def __init__(self, master=None, application=None):
+        self.application = application
+        self.widgets = dict()
+        tk.Toplevel.__init__(self, master=master)
+        self.title('Profiling')
+
+        self.widgets['frame_widgets'] = ttk.Frame(self)
+        for name, text, command in [('btn_refresh', 'Refresh', self.refresh),
+                                    ('btn_reset', 'Reset', self.action_btn_reset),
+                                    ('btn_log', 'Copy to log', self.action_btn_log),
+                                    ('btn_export', 'Export trace', self.action_btn_export)]:
+            self.widgets[name] = ttk.Button(self.widgets['frame_widgets'], text=text)
+            self.widgets[name]["command"] = command
+            self.widgets[name].pack(side=tk.LEFT, padx=10, pady=5)
+        self.widgets['frame_widgets'].grid(row=0, column=0)
+
+        self.widgets['tree_operations'] = ScrollableTreeview(self, height=15)
+        col_names = ['Operation', 'Calls', 'Total (ms)', 'Self (ms)', 'CPU (ms)', 'Max (ms)']
+        self.widgets['tree_operations']['columns'] = col_names
+        for col_name in col_names:
+            self.widgets['tree_operations'].heading(col_name, text=col_name)
+            self.widgets['tree_operations'].column(col_name, width=240 if col_name == 'Operation' else 80)
+        self.widgets['tree_operations']['show'] = 'headings'
+        self.widgets['tree_operations'].grid(row=1, column=0, sticky='nsew', padx=10)
+
+        self.widgets['tree_counters'] = ScrollableTreeview(self, height=5)
+        col_names = ['Counter', 'Total']
+        self.widgets['tree_counters']['columns'] = col_names
+        for col_name in col_names:
+            self.widgets['tree_counters'].heading(col_name, text=col_name)
+        self.widgets['tree_counters']['show'] = 'headings'
+        self.widgets['tree_counters'].grid(row=2, column=0, sticky='nsew', padx=10, pady=10)
+
+        tk.Grid.columnconfigure(self, 0, weight=1)
+        tk.Grid.rowconfigure(self, 1, weight=1)
+        self.refresh()
+
+    def refresh(self, *args, **kwargs):
+        self.widgets['tree_operations'].clear()
+        for operation in Profiler.summary():
+            self.widgets['tree_operations'].append([operation['name'], operation['calls'], '%.1f' % (operation['wall'] * 1000),
+                                                    '%.1f' % (operation['self'] * 1000), '%.1f' % (operation['cpu'] * 1000), '%.1f' % (operation['max'] * 1000)])
+        self.widgets['tree_counters'].clear()
+        for name in sorted(Profiler.counters):
+            self.widgets['tree_counters'].append([name, Profiler.counters[name]])
+
+    def action_btn_reset(self, *args, **kwargs):
+        Profiler.reset()
+        self.refresh()
+
+    def action_btn_log(self, *args, **kwargs):
+        if self.application is not None:
+            self.application.log('======= PROFILING =======')
+            for line in Profiler.report(limit=10):
+                self.application.log(line)
+
+    def action_btn_export(self, *args, **kwargs):
+        file_path = fd.asksaveasfilename(defaultextension='.json', filetypes=['"Chrome trace" .json'])
+        if file_path:
+            num_events = Profiler.export_trace(file_path)
+            if self.application is not None:
+                self.application.log('* Trace with %d events written to %s' % (num_events, file_path))
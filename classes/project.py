@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Project settings of a SPEC file (<file>_xds-vhpt.ini) and the plot parameters derived from them
+# Date created: 2026-10-17
+
+import os
+import codecs
+import numpy as np
+
+# Custom classes
+from column_selector import *
+# Third party local libraries
+import lib.configparser
+
+class Project:
+
+    ''' Analysis settings of a SPEC file: columns selectors, intensity formula and calibrations.
+    They are the values of the main window fields, saved by the GUI in <file>_xds-vhpt.ini,
+    and they are turned into plot parameters here, so that the batch mode (batch.py) uses
+    exactly the same selection as the GUI without any window. '''
+
+    config_file_suffix = '_xds-vhpt.ini'
+
+    # Setting name (as in the [project] section of the ini file): default value (the main window defaults)
+    defaults = {
+        's': 'pl0-pl486',
+        'bg1': 'pl487-pl973',
+        'bg2': 'pl974-pl1460',
+        'i0': 'I0',
+        'energy': 'energy',
+        'formula': '(S-(BG1+BG2)/2)/I0',
+        'mogonio_calib_a': '',
+        'mogonio_calib_b': '',
+        'mogonio_calibration_enabled': '0',
+        'emitted_energy_calibration_enabled': '0',
+    }
+
+    def __init__(self, settings=None, calibration_data=None):
+        self.settings = dict(self.defaults)
+        self.settings.update(settings or dict())
+        # Emitted energy calibration points: list of {'roi': .., 'energy': ..}
+        self.calibration_data = [dict(point) for point in (calibration_data or list())]
+
+    @classmethod
+    def load(cls, file_path):
+        ' Settings of a SPEC file from its project config (or another ini file), defaults where missing '
+        config_file = file_path if file_path.endswith('.ini') else file_path + cls.config_file_suffix
+        config = lib.configparser.ConfigParser()
+        if os.path.isfile(config_file):
+            with codecs.open(config_file, 'r', 'utf8') as configfile:
+                config.readfp(configfile)
+        settings = dict()
+        calibration_data = list()
+        if config.has_section('project'):
+            for name in cls.defaults:
+                if config.has_option('project', name):
+                    settings[name] = config.get('project', name)
+            if config.has_option('project', 'calibration'):
+                calibration_data = cls.parse_calibration(config.get('project', 'calibration'))
+        return Project(settings, calibration_data)
+
+    @staticmethod
+    def parse_calibration(text):
+        ' "roi,energy;roi,energy" to calibration points (invalid pairs are skipped) '
+        calibration_data = list()
+        for calib_pair in text.split(';'):
+            pair = calib_pair.split(',')
+            try:
+                calibration_data.append({'roi': float(pair[0]), 'energy': float(pair[1])})
+            except (ValueError, IndexError):
+                pass
+        return calibration_data
+
+    def enabled(self, name):
+        return str(self.settings[name]).strip() in ('1', 'True')
+
+    def float_setting(self, name, default=1.0):
+        try:
+            return float(self.settings[name])
+        except (ValueError, TypeError):
+            return default
+
+    def plot_parameters(self, columns_names):
+        ' Plot parameters (columns indices, formula, calibrations) for a scan with these columns (row_number first) '
+        columns_array = np.asarray(columns_names)
+
+        rois_signal_columns = ColumnSelector.select(self.settings['s'], columns_names)
+        rois_signal_names = columns_array[rois_signal_columns]
+
+        rois_bg1_columns = ColumnSelector.select(self.settings['bg1'], columns_names)
+        rois_bg1_names = columns_array[rois_bg1_columns]
+
+        rois_bg2_columns = ColumnSelector.select(self.settings['bg2'], columns_names)
+        rois_bg2_names = columns_array[rois_bg2_columns]
+
+        # Intensity columns are appended after the scan columns, according to Intensity Formula
+        intensity_columns = range(len(columns_names), len(columns_names)+len(rois_signal_columns))
+        intensity_names = rois_signal_names
+
+        energy_column_list = ColumnSelector.select(self.settings['energy'], columns_names)
+        if len(energy_column_list):
+            energy_column = int(energy_column_list[0])
+        else:
+            energy_column = False
+
+        i0_column_list = ColumnSelector.select(self.settings['i0'], columns_names)
+        if len(i0_column_list):
+            i0_column = int(i0_column_list[0])
+            i0_name = columns_array[i0_column]
+        else:
+            i0_column = False
+            i0_name = ''
+
+        return {
+            'rois_signal_columns': rois_signal_columns,
+            'rois_bg1_columns': rois_bg1_columns,
+            'rois_bg2_columns': rois_bg2_columns,
+            'energy_column': energy_column,
+            'i0_column': i0_column,
+            'i0_name': i0_name,
+            'rois_signal_names': rois_signal_names,
+            'rois_bg1_names': rois_bg1_names,
+            'rois_bg2_names': rois_bg2_names,
+            'rois_formula': self.settings['formula'],
+            'use_calibration': self.enabled('emitted_energy_calibration_enabled'),
+            'use_mogonio_calibration': self.enabled('mogonio_calibration_enabled'),
+            # Copy, so that later changes of the calibration list do not affect open plots and cached datasets
+            'calibration_data': [dict(point) for point in self.calibration_data],
+            'intensity_columns': intensity_columns,
+            'intensity_names': intensity_names,
+            'mogonio_calibration_a': self.float_setting('mogonio_calib_a'),
+            'mogonio_calibration_b': self.float_setting('mogonio_calib_b'),
+            'row_number_column': 0,
+        }
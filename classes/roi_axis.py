@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# ROI numbers and calibrated emitted energies of the intensity columns
+# Date created: 2026-10-17
+
+import re
+import numpy as np
+
+class RoiAxis:
+
+    ''' ROI axis (pl12 -> 12) and calibrated energy axis of a columns selection, computed once
+    and shared by all plot windows. Arrays are cached by columns names (and calibration points
+    for energies), so they are only computed again when the selection or the calibration changes. '''
+
+    number_regex = re.compile('([0-9]+)')
+
+    # tuple(names): ROI numbers array
+    numbers_cache = dict()
+    # (tuple(names), calibration key): (coefficients, energies array)
+    energies_cache = dict()
+    max_cached = 32
+
+    @classmethod
+    def store(cls, cache, key, value):
+        if len(cache) >= cls.max_cached:
+            cache.clear()
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        cache[key] = value
+        return value
+
+    @classmethod
+    def numbers(cls, names):
+        ' ROI numbers (first number in each column name), as a read-only float array '
+        key = tuple(names)
+        numbers = cls.numbers_cache.get(key)
+        if numbers is None:
+            numbers = cls.store(cls.numbers_cache, key, np.array([float(cls.number_regex.search(str(name)).group(1)) for name in key]))
+        return numbers
+
+    @staticmethod
+    def calibration_key(calibration_data):
+        ' Calibration points ({"roi": .., "energy": ..} dicts) as a hashable tuple of (roi, energy) '
+        return tuple((float(point['roi']), float(point['energy'])) for point in calibration_data)
+
+    @classmethod
+    def calibration(cls, names, calibration_data):
+        ' (fit coefficients, energies array) of the ROIs, from a polynomial fit (up to 2nd degree) of the calibration points '
+        key = (tuple(names), cls.calibration_key(calibration_data))
+        result = cls.energies_cache.get(key)
+        if result is None:
+            points = np.array(key[1])
+            coefficients = np.polyfit(points[:, 0], points[:, 1], min(2, points.shape[0] - 1))
+            energies = np.polyval(coefficients, cls.numbers(names))
+            energies.flags.writeable = False
+            result = cls.store(cls.energies_cache, key, (coefficients, energies))
+        return result
+
+    @classmethod
+    def energies(cls, names, calibration_data):
+        return cls.calibration(names, calibration_data)[1]
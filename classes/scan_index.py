@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Query index over the scans of the SPEC files of a folder
+# Date created: 2026-10-17
+
+import os
+import re
+import time
+import fnmatch
+import cPickle as pickle
+import numpy as np
+
+# Custom classes
+from spec_parser import *
+from spec_motors import *
+
+class ScanIndex:
+
+    ''' Scans headers (command, date, exposure time and motors positions) of all the SPEC files
+    of a folder, stored as one set of columns (lists and float arrays) per file, so that queries
+    such as "dcm_energy between 11.5 and 11.6" or "command has the words ascan and mo_e" are answered with
+    array comparisons, without parsing the files again.
+    The index is saved in the folder (xds-vhpt-scan-index) and a file is only indexed again
+    when its size or modification time changed. '''
+
+    version = 1
+    index_file_name = 'xds-vhpt-scan-index'
+    # Files written by this tool next to the SPEC files
+    ignored_suffixes = ('_xds-vhpt.ini', '_xds-vhpt.cache', '_xds-vhpt.cache-index')
+    date_format = '%a %b %d %H:%M:%S %Y'
+    # Filter text terms: name=value, name=min:max (open ends allowed) or command words
+    filter_term_regex = re.compile('^([^=]+)=([^:]*)(:?)(.*)$')
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_file = os.path.join(directory, self.index_file_name)
+        # file name: dict of columns (see index_parser)
+        self.files = dict()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_file, 'rb') as fp:
+                index = pickle.load(fp)
+            if index['version'] == self.version:
+                self.files = index['files']
+        except Exception:
+            self.files = dict()
+
+    def save(self):
+        try:
+            with open(self.index_file, 'wb') as fp:
+                pickle.dump({'version': self.version, 'files': self.files}, fp, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Index is optional (e.g. read-only data folder)
+            pass
+
+    @classmethod
+    def is_spec_file(cls, file_path):
+        if not os.path.isfile(file_path) or os.path.basename(file_path) == cls.index_file_name or file_path.endswith(cls.ignored_suffixes):
+            return False
+        with open(file_path, 'rb') as fp:
+            head = fp.read(64 * 1024)
+        return head.startswith('#') and '#S ' in head
+
+    def is_up_to_date(self, file_name):
+        entry = self.files.get(file_name)
+        file_path = os.path.join(self.directory, file_name)
+        return entry is not None and entry['size'] == os.path.getsize(file_path) and entry['mtime'] == os.path.getmtime(file_path)
+
+    def update(self):
+        ' Index new and modified SPEC files of the folder (and forget the removed ones) '
+        file_names = [file_name for file_name in sorted(os.listdir(self.directory)) if self.is_spec_file(os.path.join(self.directory, file_name))]
+        changed = False
+        for file_name in file_names:
+            if not self.is_up_to_date(file_name):
+                self.add_file(file_name)
+                changed = True
+        for file_name in set(self.files) - set(file_names):
+            del self.files[file_name]
+            changed = True
+        if changed:
+            self.save()
+
+    def add_file(self, file_name, parser=None):
+        ' Index (again) one file of the folder, using an already open parser if given '
+        file_path = os.path.join(self.directory, file_name)
+        size, mtime = os.path.getsize(file_path), os.path.getmtime(file_path)
+        if parser is None:
+            # Headers only: data blocks are not parsed in lazy mode
+            parser = SpecParser(file_path, lazy=True, reader='mmap')
+        entry = self.index_parser(parser)
+        entry['size'], entry['mtime'] = size, mtime
+        self.files[file_name] = entry
+
+    @classmethod
+    def index_parser(cls, parser):
+        scans = parser.get_scans().values()
+        motors_names, motors_table = SpecMotorTable.positions_table(scans)
+        return {
+            'scans': [scan.id for scan in scans],
+            # '#S 2  ascan  mo_e 11.54 11.605  65 60' is stored as 'ascan mo_e 11.54 11.605 65 60'
+            'commands': [' '.join(scan.command.split()[2:]) for scan in scans],
+            'dates': np.array([cls.date_to_timestamp(scan.date) for scan in scans], dtype=np.float64),
+            'exposure_times': np.array([cls.to_float(scan.exposure_time) for scan in scans], dtype=np.float64),
+            'motors_index': dict((name, index) for index, name in enumerate(motors_names)),
+            'motors': motors_table,
+        }
+
+    @classmethod
+    def date_to_timestamp(cls, date):
+        try:
+            return time.mktime(time.strptime(date.strip(), cls.date_format))
+        except (ValueError, AttributeError):
+            return np.nan
+
+    @staticmethod
+    def to_float(value):
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return np.nan
+
+    @staticmethod
+    def in_range(values, value_range):
+        ' Boolean mask of values within (minimum, maximum), None meaning an open end (NaN never matches) '
+        minimum, maximum = value_range
+        with np.errstate(invalid='ignore'):
+            mask = ~np.isnan(values)
+            if minimum is not None:
+                mask &= values >= minimum
+            if maximum is not None:
+                mask &= values <= maximum
+        return mask
+
+    def query(self, command=None, date_range=None, exposure_range=None, motors=None, files=None):
+        ''' Scans matching all the given conditions, as a list of (file name, scan id):
+        * command: words that must all be words of the scan command (e.g. 'ascan mo_e'). Words with
+          wildcards (* any characters, ? one character) match words of the command by pattern (e.g. 'mo_*')
+        * date_range, exposure_range: (minimum, maximum), dates as timestamps
+        * motors: dict of motor name: (minimum, maximum)
+        * files: only search these files (names in the folder) '''
+        results = list()
+        for file_name in sorted(files if files is not None else self.files):
+            entry = self.files.get(file_name)
+            if entry is None:
+                continue
+            mask = np.ones(len(entry['scans']), dtype=bool)
+            if date_range is not None:
+                mask &= self.in_range(entry['dates'], date_range)
+            if exposure_range is not None:
+                mask &= self.in_range(entry['exposure_times'], exposure_range)
+            for name, motor_range in (motors or dict()).items():
+                if name not in entry['motors_index']:
+                    mask[:] = False
+                    break
+                mask &= self.in_range(entry['motors'][:, entry['motors_index'][name]], motor_range)
+            if command:
+                words = command.split()
+                for scan_index in np.flatnonzero(mask):
+                    mask[scan_index] = self.has_words(entry['commands'][scan_index].split(), words)
+            results.extend((file_name, entry['scans'][scan_index]) for scan_index in np.flatnonzero(mask))
+        return results
+
+    @staticmethod
+    def has_words(tokens, words):
+        ' True if every word is one of the tokens (or matches one of them, for words with wildcards) '
+        for word in words:
+            if '*' in word or '?' in word:
+                if not any(fnmatch.fnmatchcase(token, word) for token in tokens):
+                    return False
+            elif word not in tokens:
+                return False
+        return True
+
+    def query_text(self, text, files=None):
+        ''' Query from a filter text, e.g. "ascan mo_e dcm_energy=11.5:11.6 date=2015-11-12 time=60".
+        Terms are name=value or name=min:max (either end may be empty), where name is a motor, "date" (YYYY-MM-DD)
+        or "time" (exposure time). Other words must be words of the scan command (wildcards * and ? allowed).
+        Raises ValueError for invalid numbers or dates. '''
+        command_words = list()
+        conditions = {'motors': dict()}
+        for term in self.split_filter_text(text):
+            match = self.filter_term_regex.match(term)
+            if match is None:
+                command_words.append(term)
+                continue
+            name, minimum, is_range, maximum = match.groups()
+            if name == 'date':
+                conditions['date_range'] = self.date_range(minimum, maximum if is_range else minimum)
+                continue
+            if is_range:
+                value_range = (float(minimum) if minimum else None, float(maximum) if maximum else None)
+            else:
+                # Single value: positions are compared with a relative tolerance
+                value = float(minimum)
+                tolerance = 1e-9 * max(1.0, abs(value))
+                value_range = (value - tolerance, value + tolerance)
+            if name == 'time':
+                conditions['exposure_range'] = value_range
+            else:
+                conditions['motors'][name] = value_range
+        return self.query(command=' '.join(command_words), files=files, **conditions)
+
+    @staticmethod
+    def split_filter_text(text):
+        ' Terms separated by spaces or commas '
+        return [term for term in re.split('[\s,]+', text.strip()) if term]
+
+    @staticmethod
+    def date_range(start, end):
+        ' Timestamps range from days (YYYY-MM-DD), both days included '
+        start = time.mktime(time.strptime(start, '%Y-%m-%d')) if start else None
+        end = time.mktime(time.strptime(end, '%Y-%m-%d')) + 24 * 3600 - 1 if end else None
+        return (start, end)
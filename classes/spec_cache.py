@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# On-disk sidecar cache of parsed SPEC scans
+# Date created: 2026-10-17
+
+import os
+import sys
+import hashlib
+import cPickle as pickle
+import numpy as np
+
+class SpecCache:
+
+    ''' Sidecar cache stored next to the SPEC file (and to its _xds-vhpt.ini project file):
+    * <specfile>_xds-vhpt.cache: append-only raw float64 blocks, one per scan, memory-mapped when read
+    * <specfile>_xds-vhpt.cache-index: pickled parser state (scan headers, byte offset) and blocks positions
+    The cache is valid when the SPEC file size and mtime did not change, or when the file only grew
+    (the hash of the whole consumed prefix still matches), in which case only the new tail is parsed.
+    The prefix is hashed incrementally: each save only reads the bytes consumed since the previous one. '''
+
+    version = 3
+    # Bytes read at once when hashing
+    hash_chunk_size = 1024 * 1024
+
+    def __init__(self, specfile):
+        self.specfile = specfile
+        self.data_file = specfile + '_xds-vhpt.cache'
+        self.index_file = specfile + '_xds-vhpt.cache-index'
+        # scan_id: (byte offset in data file, rows, columns, scan end offset in SPEC file)
+        self.blocks = dict()
+        # Running hash of the first hashed_offset bytes of the SPEC file
+        self.md5 = None
+        self.hashed_offset = 0
+
+    def prefix_hash(self, offset):
+        ' Hash of the first offset bytes of the SPEC file (continued from the previous call when the offset grew) '
+        if self.md5 is None or offset < self.hashed_offset:
+            self.md5 = hashlib.md5()
+            self.hashed_offset = 0
+        with open(self.specfile, 'rb') as fp:
+            fp.seek(self.hashed_offset)
+            while self.hashed_offset < offset:
+                chunk = fp.read(min(self.hash_chunk_size, offset - self.hashed_offset))
+                if not chunk:
+                    raise IOError('SPEC file is shorter than %d bytes' % offset)
+                self.md5.update(chunk)
+                self.hashed_offset += len(chunk)
+        return self.md5.hexdigest()
+
+    def restart(self):
+        ' The SPEC file was replaced: blocks and hash are outdated '
+        self.blocks = dict()
+        self.md5 = None
+        self.hashed_offset = 0
+
+    def load(self):
+        ' Returns the saved parser state if the cache is valid for the SPEC file, None otherwise '
+        try:
+            with open(self.index_file, 'rb') as fp:
+                index = pickle.load(fp)
+            if index['version'] != self.version or index['byteorder'] != sys.byteorder:
+                raise ValueError('Incompatible cache')
+            size = os.path.getsize(self.specfile)
+            mtime = os.path.getmtime(self.specfile)
+            unchanged = (size == index['size'] and mtime == index['mtime'])
+            # The file may have been rewritten since the last hash
+            self.md5 = None
+            if not unchanged and (size < index['offset'] or self.prefix_hash(index['offset']) != index['prefix_hash']):
+                raise ValueError('SPEC file was modified')
+        except Exception:
+            self.clear()
+            return None
+        self.blocks = index['blocks']
+        self.compact()
+        return index['state']
+
+    def save(self, state, offset):
+        index = {
+            'version': self.version,
+            'byteorder': sys.byteorder,
+            'size': os.path.getsize(self.specfile),
+            'mtime': os.path.getmtime(self.specfile),
+            'offset': offset,
+            'prefix_hash': self.prefix_hash(offset),
+            'blocks': self.blocks,
+            'state': state,
+        }
+        with open(self.index_file, 'wb') as fp:
+            pickle.dump(index, fp, pickle.HIGHEST_PROTOCOL)
+
+    def clear(self):
+        self.restart()
+        for path in (self.index_file, self.data_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def has_block(self, scan):
+        block = self.blocks.get(scan.id)
+        return block is not None and block[3] == scan.end_offset
+
+    def get_block(self, scan):
+        ' Memory-mapped (read-only) data of the scan, or None if not cached or outdated '
+        if not self.has_block(scan):
+            return None
+        offset, rows, columns, end_offset = self.blocks[scan.id]
+        if rows == 0:
+            return np.empty((0, columns), dtype=np.float64)
+        return np.memmap(self.data_file, dtype=np.float64, mode='r', offset=offset, shape=(rows, columns))
+
+    def put_block(self, scan, data):
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        with open(self.data_file, 'ab') as fp:
+            fp.seek(0, os.SEEK_END)
+            offset = fp.tell()
+            fp.write(data.tostring())
+        self.blocks[scan.id] = (offset, data.shape[0], data.shape[1], scan.end_offset)
+
+    def compact(self):
+        ' Rewrite the data file without outdated blocks, when they take most of it (only done before anything is mapped) '
+        if not os.path.exists(self.data_file):
+            self.blocks = dict()
+            return
+        live_bytes = sum(rows * columns * 8 for offset, rows, columns, end_offset in self.blocks.values())
+        if os.path.getsize(self.data_file) <= 2 * live_bytes + 1024 * 1024:
+            return
+        blocks = dict()
+        temp_file = self.data_file + '.tmp'
+        with open(self.data_file, 'rb') as source:
+            with open(temp_file, 'wb') as target:
+                for scan_id, (offset, rows, columns, end_offset) in self.blocks.items():
+                    source.seek(offset)
+                    blocks[scan_id] = (target.tell(), rows, columns, end_offset)
+                    target.write(source.read(rows * columns * 8))
+        os.remove(self.data_file)
+        os.rename(temp_file, self.data_file)
+        self.blocks = blocks
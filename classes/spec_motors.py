@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Motors names and positions of SPEC scans
+# Date created: 2026-10-17
+
+from collections import OrderedDict
+import numpy as np
+
+class SpecMotors(object):
+
+    ''' Motors names of one #O block, shared by all the scans recorded after it.
+    Scans only keep their positions (#P) as a float array, in the same order as the names. '''
+
+    def __init__(self, names):
+        self.names = list(names)
+        # Motor name: position index (the last one wins if a name is repeated)
+        self.index = dict((name, index) for index, name in enumerate(self.names))
+        # Unique names sorted alphabetically, as displayed in the headers tree
+        self.sorted_names = sorted(self.index)
+
+    def position(self, positions, name):
+        ' Position of the motor in a scan positions array (NaN if the scan did not record it) '
+        index = self.index.get(name)
+        if index is None or index >= len(positions):
+            return np.nan
+        return positions[index]
+
+    def sorted_items(self, positions):
+        ' (name, position) pairs sorted by motor name, for motors with a recorded position '
+        return [(name, positions[self.index[name]]) for name in self.sorted_names if self.index[name] < len(positions)]
+
+class SpecMotorTable(object):
+
+    ''' Motors of all the scans of a SPEC file. Names are interned once per #O block
+    (scans with the same motors share one SpecMotors), so that any motor can be looked up
+    by name across all scans without parsing strings again. '''
+
+    def __init__(self):
+        # tuple(names): SpecMotors
+        self.blocks = dict()
+
+    def intern(self, names):
+        key = tuple(names)
+        if key not in self.blocks:
+            self.blocks[key] = SpecMotors(key)
+        return self.blocks[key]
+
+    @staticmethod
+    def positions_to_array(tokens):
+        ' #P tokens to floats (NaN for non-numeric values) '
+        try:
+            return np.array(tokens, dtype=np.float64)
+        except ValueError:
+            positions = np.empty(len(tokens))
+            for index, token in enumerate(tokens):
+                try:
+                    positions[index] = float(token)
+                except ValueError:
+                    positions[index] = np.nan
+            return positions
+
+    @staticmethod
+    def motor_positions(scans, name):
+        ' Positions of a motor over a list of scans, as a float array (NaN where not recorded) '
+        positions = np.empty(len(scans))
+        for scan_index, scan in enumerate(scans):
+            positions[scan_index] = scan.motor_position(name)
+        return positions
+
+    @staticmethod
+    def positions_table(scans):
+        ' Positions of all motors over a list of scans: (names, scans x names float array, NaN where not recorded) '
+        # Scans are grouped by #O block, so that columns are matched once per block and not once per scan
+        blocks = OrderedDict()
+        for scan_index, scan in enumerate(scans):
+            blocks.setdefault(id(scan.motors), (scan.motors, list()))[1].append(scan_index)
+        names = sorted(set(name for motors, scans_indices in blocks.values() for name in motors.index))
+        names_index = dict((name, index) for index, name in enumerate(names))
+        table = np.empty((len(scans), len(names)))
+        table.fill(np.nan)
+        for motors, scans_indices in blocks.values():
+            block = np.empty((len(scans_indices), len(motors.names)))
+            block.fill(np.nan)
+            for row, scan_index in enumerate(scans_indices):
+                positions = scans[scan_index].motors_positions[:len(motors.names)]
+                block[row, :len(positions)] = positions
+            columns = [names_index[name] for name in motors.sorted_names]
+            table[np.ix_(scans_indices, columns)] = block[:, [motors.index[name] for name in motors.sorted_names]]
+        return names, table
@@ -7,26 +7,74 @@
 
 import re
 import os
+import mmap
+import warnings
+import multiprocessing
 from collections import OrderedDict
 import numpy
 
 # Custom classes
 from profiler import *
+from spec_scan import *
+from spec_motors import *
+from spec_cache import *
 
 class SpecParser:
 
-    def __init__(self, specfile):
+    # Precompiled header fields tokenizers
+    header_values_regex = re.compile('\s([a-zA-Z0-9\._-]+)')
+    scan_number_regex = re.compile('#S\s([0-9]+)')
+    num_columns_regex = re.compile('#N\s([0-9]+)')
+    exposure_time_regex = re.compile('\s([0-9]+)\s')
+
+    # Scans loaded in lazy mode before the sidecar cache index is saved again
+    max_unsaved_blocks = 20
+    # Data blocks bytes below which scans are converted in this process (starting a pool costs more than that)
+    min_parallel_bytes = 4 * 1024 * 1024
+
+    # Attributes saved to (and restored from) the sidecar cache, so that parsing can resume where it stopped
+    state_attributes = ['scans', 'offset', 'partial_row', 'last_line', 'last_scan_id', 'scan_prefix', 'motor_table', 'motors', 'motors_names', 'motors_positions',
+                        'columns_names', 'scan_id_prefix', 'scan_command', 'exposure_time', 'scan_date', 'num_columns_declared', 'scan_offset', 'scan']
+
+    def __init__(self, specfile, lazy=False, max_cached_scans=50, max_cache_bytes=512*1024*1024, use_cache=False, reader='lines', processes=1, autoparse=True):
 
         # Variable initialization
         self.scans = OrderedDict()
         # Set file path
         self.specfile = specfile
         self.profiler = Profiler()
-        self.parse()
+        # Lazy mode: the first pass only indexes scans (byte offsets and headers),
+        # and each scan data block is parsed when it is first accessed
+        self.lazy = lazy
+        # Number of worker processes used to convert scans data blocks (None: one per CPU)
+        self.processes = processes if processes is not None else multiprocessing.cpu_count()
+        # Data rows are skipped while reading the file in lazy mode, and when they are parsed in parallel afterwards
+        self.index_only = lazy or self.processes > 1
+        # LRU of scans whose data is currently loaded (lazy mode only)
+        self.cache = OrderedDict()
+        self.max_cached_scans = max_cached_scans
+        self.max_cache_bytes = max_cache_bytes
+        # On-disk sidecar cache of parsed scans
+        self.sidecar = SpecCache(specfile) if use_cache else None
+        # Blocks stored in the sidecar cache (lazy loads) since its index was last saved
+        self.unsaved_blocks = 0
+        # 'lines': reads and tokenizes the file line by line
+        # 'mmap': memory-maps the file, jumps over data blocks with byte searches and converts each block in bulk
+        self.reader = reader
+        # Without autoparse, nothing is read until update() is called (used by iter_scans)
+        if autoparse:
+            self.parse()
+        else:
+            self.reset()
 
     def get_scans(self):
         return self.scans
 
+    def get_motor_positions(self, name, scans_ids=None):
+        ' Positions of a motor across the scans of the file (or the given scans), as a float array (NaN where not recorded) '
+        scans_ids = scans_ids if scans_ids is not None else self.scans.keys()
+        return self.motor_table.motor_positions([self.scans[scan_id] for scan_id in scans_ids], name)
+
     # Function for use over data from 2016-03 at XDS Beamline
     def mogonio_to_energy(self, mogonio):
         mogonio = float(mogonio)
@@ -38,125 +86,526 @@ class SpecParser:
         B = -0.439
         return (A + hc * numpy.sqrt(m[0]**2 + m[1]**2 + m[2]**2)/(2*a*numpy.sin(numpy.radians(B + mogonio))))/1000.0
 
+    def reset(self):
+        ' Forget everything parsed so far, so that the next update() starts from byte 0 '
+        self.scans = OrderedDict()
+        self.cache = OrderedDict()
+        # Byte offset of the first line not yet consumed
+        self.offset = 0
+        # Byte offsets of the line being parsed (start and end) and of the last #S line
+        self.line_offset = 0
+        self.line_end = 0
+        self.scan_offset = 0
+        # Set when the last line of the file was an incomplete data line (file still being written)
+        self.partial_row = False
+        # Parser state, kept between calls to update()
+        self.last_line = None
+        self.last_scan_id = 0
+        self.scan_prefix = 0
+        # Motors names are not attached to a specific scan: #O is an ocasional header that is not guaranteed to exist
+        self.motor_table = SpecMotorTable()
+        self.motors_names = []
+        # Interned names of the current #O block (None until the first scan after the block)
+        self.motors = None
+        self.motors_positions = []
+        self.columns_names = []
+        self.scan_id_prefix = 'CSV'
+        self.scan_command = 'CSV'
+        self.exposure_time = ''
+        self.scan_date = ''
+        self.num_columns_declared = None
+        self.scan = None
+
     def parse(self):
+        self.reset()
+        if self.sidecar is not None:
+            try:
+                state = self.sidecar.load()
+                if state is not None:
+                    self.set_state(state)
+            except Exception:
+                self.reset()
+                self.sidecar = None
+        self.update()
+
+    def get_state(self):
+        return dict((name, getattr(self, name)) for name in self.state_attributes)
+
+    def set_state(self, state):
+        for name in self.state_attributes:
+            setattr(self, name, state[name])
+        if self.lazy:
+            for scan in self.scans.values():
+                scan.loader = self.load_scan
+        else:
+            self.read_scans(self.scans.values())
+
+    def update(self, max_bytes=None):
+        ''' Consume only the lines appended to the file since the last call (at most about max_bytes, if given).
+        Returns (new_scans_ids, changed_scans_ids). If the file shrank (it was replaced or truncated),
+        everything is parsed again and self.restarted is set. '''
+
+        self.restarted = False
+        start_offset = self.offset
+        if os.path.getsize(self.specfile) < self.offset:
+            self.reset()
+            self.restarted = True
+            if self.sidecar is not None:
+                self.sidecar.restart()
+
+        known_scans = set(self.scans.keys())
+        self.changed_scans = list()
+
+        # An incomplete data row read last time is read again, now (hopefully) complete
+        if self.partial_row:
+            if not self.index_only:
+                self.scan.remove_last_row()
+            self.partial_row = False
+
+        with self.profiler.span('SpecParser.update', 'parser', reader=self.reader, offset=self.offset):
+            with open(self.specfile, 'rb') as fp:
+                if self.reader == 'mmap':
+                    self.read_mmap(fp, max_bytes)
+                else:
+                    self.read_lines(fp, max_bytes)
+
+        if self.scan is not None:
+            self.scan.finalize()
+
+        # Data of new and changed scans is parsed now, in parallel
+        if self.index_only and not self.lazy:
+            self.read_scans([self.scans[scan_id] for scan_id in self.changed_scans])
+
+        # Cached data of scans which received new rows is outdated
+        for scan_id in self.changed_scans:
+            self.unload_scan(scan_id)
+
+        # Nothing to save when the file did not grow (e.g. auto refresh of a finished file)
+        if self.offset != start_offset or self.restarted or self.unsaved_blocks:
+            self.save_sidecar()
+
+        new_scans = [scan_id for scan_id in self.scans if scan_id not in known_scans]
+        changed_scans = [scan_id for scan_id in self.changed_scans if scan_id in known_scans]
+        return new_scans, changed_scans
+
+    def save_sidecar(self):
+        if self.sidecar is None:
+            return
+        self.unsaved_blocks = 0
+        try:
+            if not self.lazy:
+                # In lazy mode, blocks are only stored when scans are loaded
+                for scan in self.scans.values():
+                    if not self.sidecar.has_block(scan):
+                        self.sidecar.put_block(scan, scan.get_loaded_data())
+            self.sidecar.save(self.get_state(), self.offset)
+        except Exception:
+            # Cache is optional (e.g. read-only data folder)
+            self.sidecar = None
 
-        last_line = None
-
-        values_regex = re.compile('(?:\s|^)([a-zA-Z0-9\._\+-]+)')
-        data_line_regex = re.compile('^[^#]')
-        data_line_regex_other =  re.compile('^\s*$')
-
-        last_scan_id = 0
-        scan_prefix = 0
-        motors_positions = []
-        columns_names = []
-        data_values = []
-        scan_id_prefix = 'CSV'
-        scan_command = 'CSV'
-        exposure_time = ''
-        scan_date = ''
-
-        with open(self.specfile) as fp:
-            # Motors names should be re-initialized before reading each line, because it is an ocasional header that is not guarenteed to exist, and, when it does, it is not attached to a specific scan
-            motors_names = []
-
-            for line in fp:
-
-                # Lines not starting with comment (#) and
-                # which are not empty are treated as column values (actual data / measurements)
-                if re.search(data_line_regex, line) and not re.search(data_line_regex_other, line):
-                    # Headers for the current scans are over, so now we can store them
-                    if last_line != 'DATA':
-                        try:
-                            mogonio_index = columns_names.index('mogonio')
-                        except ValueError:
-                            mogonio_index = None
-                        self.scans[scan_id_prefix] = {
-                            'id': scan_id_prefix,
-                            'command': scan_command,
-                            'motors_names': motors_names,
-                            'motors_positions': motors_positions,
-                            'columns_names': ['row_number', ] + columns_names, # append row_number column
-                            'exposure_time': exposure_time,
-                            'date': scan_date,
-                            'data_lines': list(),
-                            'data_values': list(),
-                            'data_values_indexed': OrderedDict(),
-                        }
-                        row_number = 0
-                    last_line = 'DATA' 
-                    # Following regex starts with '?:', which is a non-capturing regex group
-                    matches = re.findall(values_regex, line)
-                    if matches:
-                        columns_values = matches
-
-                        #Ordered dict is too slow!!!!!!
-
-                        self.scans[scan_id_prefix]['data_values'].append([row_number+1, ] + columns_values)
-                        self.scans[scan_id_prefix]['data_values_indexed'][row_number] = [row_number+1, ] + columns_values
-                        self.scans[scan_id_prefix]['data_lines'].append(line.replace('\n', '').replace('\s', ''))
-                        # Fix for the cases where there is no header with columns names (CSV, etc)
-                        # Accounting one default column: row_number
-                        if len(self.scans[scan_id_prefix]['columns_names']) == 1:
-                            self.scans[scan_id_prefix]['columns_names'] = self.scans[scan_id_prefix]['columns_names'] + ['col'+str(x) for x in range(0, len(self.scans[scan_id_prefix]['data_values'])+1)]
-                        row_number += 1
-
-                # Lines starting with #O are motor names
-                elif line.startswith("#O"): #re.search('^#O', line):
-                    # Reset motors names if the header is placed multiple times in the file
-                    if last_line != '#O':
-                        motors_names = []
-                    last_line = '#O'
-                    matches = re.findall('\s([a-zA-Z0-9\._-]+)', line)
-                    if matches:
-                        motors_names.extend(matches)
-
-                # Lines starting with #P are motor positions
-                elif re.search('^#P', line):
-                    last_line = '#P'
-                    matches = re.findall('\s([a-zA-Z0-9\._-]+)', line)
-                    if matches:
-                        motors_positions.extend(matches)
-
-                # Lines starting with #S are beggining of scans (scan header)
-                elif re.search('^#S', line):
-                    last_line = '#S'
-                    matches = re.findall('^#S\s([0-9]+)', line)
-                    scan_id = int(matches[0])
-                    if scan_id <= last_scan_id:
-                        scan_prefix += 1
-                    last_scan_id = scan_id
-                    scan_id_prefix = str(scan_prefix) + '.' + str(scan_id)
-                    scan_command = line.replace('\n', '').replace('\s', '')
-                    # Reset some values
-                    motors_positions = []
-                    columns_names = []
-                    columns_values = []
-                    row_number = 0
-                    exposure_time = None
-                    scan_date = None
-                    header = True
-
-                # Lines starting with #T are exposure time
-                elif re.search('^#T', line):
-                    last_line = '#T'
-                    matches = re.findall('\s([0-9]+)\s', line)
-                    if matches:
-                        exposure_time = matches[0]
-
-                # Lines starting with #L are column names
-                elif re.search('^#L', line):
-                    last_line = '#L'
-                    matches = re.findall('\s([a-zA-Z0-9\._-]+)', line)
-                    if matches:
-                        columns_names.extend(matches)
-
-                # Lines starting with #D are date
-                elif re.search('^#D', line):
-                    last_line = '#D'
-                    matches = re.findall('^#D (.*)$', line)
-                    if matches:
-                        scan_date = matches[0]
+    def close(self):
+        ' Save the index of the blocks stored since the last save (scans loaded in lazy mode) '
+        if self.unsaved_blocks:
+            self.save_sidecar()
 
+    def read_lines(self, fp, max_bytes=None):
+        fp.seek(self.offset)
+        stop_offset = self.offset + max_bytes if max_bytes is not None else None
+        for line in fp:
+            if not line.endswith('\n'):
+                self.parse_partial_line(line)
+                break
+            self.line_offset = self.offset
+            self.offset += len(line)
+            self.line_end = self.offset
+            if line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+            self.parse_line(line)
+            if stop_offset is not None and self.offset >= stop_offset:
+                break
+
+    def parse_partial_line(self, line):
+        # Incomplete last line: only data rows are parsed (and read again on the next update),
+        # so that files without a trailing newline are complete
+        if self.is_data_line(line):
+            self.line_offset = self.offset
+            self.line_end = self.offset + len(line)
+            self.parse_line(line + '\n')
+            self.partial_row = True
+
+    def read_mmap(self, fp, max_bytes=None):
+        ' Header lines are parsed one by one, data blocks (everything between two header lines) in bulk '
+        size = os.fstat(fp.fileno()).st_size
+        if size <= self.offset:
+            return
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            position = self.offset
+            # Data blocks are never split, so a read can go past max_bytes by one block
+            stop_offset = self.offset + max_bytes if max_bytes is not None else size
+            while position < min(size, stop_offset):
+                if mm[position] == '#':
+                    end = mm.find('\n', position)
+                    if end == -1:
+                        break # Incomplete header line, read again on the next update
+                    line = mm[position:end+1]
+                    self.line_offset = position
+                    self.offset = self.line_end = end + 1
+                    if line.endswith('\r\n'):
+                        line = line[:-2] + '\n'
+                    self.parse_line(line)
+                    position = end + 1
                 else:
-                    last_line = 'OTHER'
+                    # Data block ends at the next line starting with #
+                    end = mm.find('\n#', position)
+                    end = size if end == -1 else end + 1
+                    block_end = mm.rfind('\n', position, end) + 1
+                    if block_end > position:
+                        self.parse_data_block(mm[position:block_end], position)
+                        self.offset = block_end
+                    if block_end < end:
+                        self.parse_partial_line(mm[max(block_end, position):end])
+                        break
+                    position = end
+        finally:
+            mm.close()
+
+    def parse_data_block(self, block, block_offset):
+        ' Consecutive data (and blank) lines starting at byte block_offset '
+        first_value = len(block) - len(block.lstrip())
+        if first_value == len(block):
+            self.last_line = 'OTHER' # Only blank lines
+            return
+        last_value = len(block.rstrip())
+        self.line_offset = block_offset + block.rfind('\n', 0, first_value) + 1
+        line_end = block.find('\n', last_value)
+        self.line_end = block_offset + (line_end + 1 if line_end != -1 else len(block))
+        self.start_data_line()
+        if not self.index_only:
+            self.parse_data_text(self.scan, block)
+
+    @classmethod
+    def parse_data_range(cls, scan, text):
+        ' Data lines of a scan, possibly interleaved with comment lines (#C), parsed in bulk between comments '
+        position = 0
+        while position < len(text):
+            if text[position] == '#':
+                end = text.find('\n', position)
+                position = len(text) if end == -1 else end + 1
+                continue
+            end = text.find('\n#', position)
+            end = len(text) if end == -1 else end + 1
+            cls.parse_data_text(scan, text[position:end])
+            position = end
+
+    @classmethod
+    def parse_data_text(cls, scan, text):
+        ' Convert a block of data lines with one numpy call, or line by line if the block is not rectangular and numeric '
+        text = text.strip()
+        if not text:
+            return
+        tokens = cls.tokens_per_line(text)
+        num_rows, num_columns = len(tokens), tokens[0]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore') # numpy warns (and stops) on non-numeric tokens
+            values = numpy.fromstring(text, dtype=numpy.float64, sep=' ')
+        # Every line must have the same number of tokens: a short row followed by a long one has the right total too
+        if values.size == num_rows * num_columns and (tokens == num_columns).all():
+            scan.finalize() # Rows parsed line by line before this block come first
+            scan.append_values(values.reshape(num_rows, num_columns))
+            Profiler.count('rows parsed', num_rows)
+            Profiler.count('cells converted', values.size)
+        else:
+            Profiler.count('blocks parsed line by line')
+            for line in text.splitlines():
+                if cls.is_data_line(line):
+                    cls.parse_data_line(scan, line)
+
+    @staticmethod
+    def tokens_per_line(text):
+        ' Number of whitespace separated tokens of each line of text (counted on the bytes, without splitting the lines) '
+        chars = numpy.frombuffer(text, dtype=numpy.uint8)
+        # Spaces, tabs, line breaks (and other control characters)
+        blank = chars <= 32
+        # A token starts on a non-blank character after a blank one (or at the beginning of the text)
+        starts = ~blank
+        starts[1:] &= blank[:-1]
+        token_starts = numpy.flatnonzero(starts)
+        tokens_before = numpy.searchsorted(token_starts, numpy.flatnonzero(chars == 10))
+        return numpy.diff(numpy.concatenate(([0], tokens_before, [len(token_starts)])))
+
+    @staticmethod
+    def is_data_line(line):
+        # Lines not starting with comment (#) and
+        # which are not empty are treated as column values (actual data / measurements)
+        return line[:1] not in ('#', '') and not line.isspace()
+
+    def parse_line(self, line):
+        # Header lines are dispatched on their first two characters (single dictionary lookup)
+        handler = self.line_handlers.get(line[:2])
+        if handler is not None:
+            handler(self, line)
+        elif self.is_data_line(line):
+            self.start_data_line()
+            # In lazy (and parallel) mode, data rows are only tokenized when the scan is loaded
+            if not self.index_only:
+                self.parse_data_line(self.scan, line)
+        else:
+            self.last_line = 'OTHER'
+
+    # Lines starting with #O are motor names
+    def parse_motors_names_line(self, line):
+        # Reset motors names if the header is placed multiple times in the file
+        if self.last_line != '#O':
+            self.motors_names = []
+        self.motors = None
+        self.last_line = '#O'
+        self.motors_names.extend(self.header_values_regex.findall(line))
+
+    # Lines starting with #P are motor positions
+    def parse_motors_positions_line(self, line):
+        self.last_line = '#P'
+        self.motors_positions.extend(self.header_values_regex.findall(line))
+
+    # Lines starting with #S are beggining of scans (scan header)
+    def parse_scan_line(self, line):
+        self.last_line = '#S'
+        self.scan_offset = self.line_offset
+        # Previous scan is over, so its rows can be converted to the numeric array
+        if self.scan is not None:
+            self.scan.finalize()
+            self.scan = None
+        scan_id = int(self.scan_number_regex.match(line).group(1))
+        if scan_id <= self.last_scan_id:
+            self.scan_prefix += 1
+        self.last_scan_id = scan_id
+        self.scan_id_prefix = str(self.scan_prefix) + '.' + str(scan_id)
+        self.scan_command = line.replace('\n', '')
+        # Reset some values
+        self.motors_positions = []
+        self.columns_names = []
+        self.exposure_time = None
+        self.scan_date = None
+        self.num_columns_declared = None
+
+    # Lines starting with #T are exposure time
+    def parse_exposure_time_line(self, line):
+        self.last_line = '#T'
+        match = self.exposure_time_regex.search(line)
+        if match:
+            self.exposure_time = match.group(1)
+
+    # Lines starting with #L are column names
+    def parse_columns_names_line(self, line):
+        self.last_line = '#L'
+        self.columns_names.extend(self.header_values_regex.findall(line))
+
+    # Lines starting with #N are the number of columns
+    def parse_num_columns_line(self, line):
+        self.last_line = '#N'
+        match = self.num_columns_regex.match(line)
+        if match:
+            self.num_columns_declared = int(match.group(1))
+
+    # Lines starting with #D are date
+    def parse_date_line(self, line):
+        self.last_line = '#D'
+        if line[2:3] == ' ':
+            self.scan_date = line[3:].rstrip('\n')
+
+    line_handlers = {
+        '#O': parse_motors_names_line,
+        '#P': parse_motors_positions_line,
+        '#S': parse_scan_line,
+        '#T': parse_exposure_time_line,
+        '#L': parse_columns_names_line,
+        '#N': parse_num_columns_line,
+        '#D': parse_date_line,
+    }
+
+    def start_data_line(self):
+        ' Bookkeeping for data line(s) between self.line_offset and self.line_end '
+        # Headers for the current scans are over, so now we can store them
+        if self.scan is None:
+            if self.motors is None:
+                self.motors = self.motor_table.intern(self.motors_names)
+            self.scan = SpecScan(self.scan_id_prefix, command=self.scan_command, date=self.scan_date, exposure_time=self.exposure_time,
+                            motors=self.motors, motors_positions=self.motor_table.positions_to_array(self.motors_positions),
+                            columns_names=self.columns_names)
+            self.scan.offset = self.scan_offset
+            self.scan.data_offset = self.line_offset
+            self.scan.num_columns_declared = self.num_columns_declared
+            if self.lazy:
+                self.scan.loader = self.load_scan
+            self.scans[self.scan_id_prefix] = self.scan
+        if not self.changed_scans or self.changed_scans[-1] != self.scan_id_prefix:
+            self.changed_scans.append(self.scan_id_prefix)
+        self.last_line = 'DATA' 
+        self.scan.end_offset = self.line_end
+
+    @staticmethod
+    def parse_data_line(scan, line):
+        # Values are separated by whitespace; non-numeric values become NaN when the scan is finalized
+        values = line.split()
+        if values:
+            scan.append_row(values)
+
+    def load_scan(self, scan):
+        ' Loader used by scans in lazy mode: parse the scan data block on demand, keeping a bounded LRU of loaded scans '
+        if scan.id in self.cache:
+            # Most recently used scans are kept at the end
+            self.cache[scan.id] = self.cache.pop(scan.id)
+            Profiler.count('loaded scans cache hits')
+            return scan.get_loaded_data()
+
+        Profiler.count('loaded scans cache misses')
+        self.read_scan_data(scan)
+
+        self.cache[scan.id] = scan
+        self.trim_cache()
+        return scan.get_loaded_data()
+
+    def read_scan_data(self, scan):
+        ' Fill the scan data from the sidecar cache, or by parsing its data block in the SPEC file '
+        if self.sidecar is not None:
+            data = self.sidecar.get_block(scan)
+            if data is not None:
+                scan.set_data(data)
+                return
+
+        self.read_scan_text(self.specfile, scan, self.reader)
+
+        if self.sidecar is not None and self.lazy:
+            self.sidecar.put_block(scan, scan.get_loaded_data())
+            # The index (all the scans headers) is saved by batches of loaded scans, by update() and by close()
+            self.unsaved_blocks += 1
+            if self.unsaved_blocks >= self.max_unsaved_blocks:
+                self.save_sidecar()
+
+    @classmethod
+    def read_scan_text(cls, specfile, scan, reader):
+        ' Parse the scan data block (from scan.data_offset to scan.end_offset) of the SPEC file '
+        with Profiler.span('SpecParser.read_scan_text', 'parser', scan=scan.id, bytes=scan.end_offset - scan.data_offset):
+            scan.clear_data()
+            with open(specfile, 'rb') as fp:
+                fp.seek(scan.data_offset)
+                block = fp.read(scan.end_offset - scan.data_offset)
+            cls.parse_scan_text(scan, block, reader)
+            scan.finalize()
+
+    @classmethod
+    def parse_scan_text(cls, scan, text, reader):
+        ' Data lines (and comments) of a scan, made of complete lines '
+        if reader == 'mmap':
+            cls.parse_data_range(scan, text)
+        else:
+            for line in text.splitlines(True):
+                if cls.is_data_line(line):
+                    cls.parse_data_line(scan, line)
+
+    def iter_scan_chunks(self, scan, chunk_size, read_size=4*1024*1024):
+        ''' Data of a scan in arrays of chunk_size rows (the last one may be shorter), with the row_number column.
+        The data block is read read_size bytes at a time, so the whole scan is never in memory. '''
+        buffer_scan = SpecScan(scan.id, columns_names=scan.columns_names[1:])
+        first_row = 0
+        width = None
+        with open(self.specfile, 'rb') as fp:
+            fp.seek(scan.data_offset)
+            position = scan.data_offset
+            rest = ''
+            while position < scan.end_offset or len(buffer_scan.get_loaded_data()):
+                if position < scan.end_offset:
+                    text = rest + fp.read(min(read_size, scan.end_offset - position))
+                    position = fp.tell()
+                    # Only complete lines are parsed, the rest waits for the next read
+                    cut = text.rfind('\n') + 1 if position < scan.end_offset else len(text)
+                    text, rest = text[:cut], text[cut:]
+                    self.parse_scan_text(buffer_scan, text, self.reader)
+                    buffer_scan.finalize()
+                data = buffer_scan.get_loaded_data()
+                if len(data) < chunk_size and position < scan.end_offset:
+                    continue
+                # Same number of columns in all chunks, as if the scan was parsed at once
+                if width is None:
+                    width = data.shape[1]
+                elif data.shape[1] != width:
+                    data = SpecScan.fit_width(data, width)
+                chunk = data[:chunk_size]
+                chunk[:, 0] = numpy.arange(first_row + 1, first_row + len(chunk) + 1)
+                first_row += len(chunk)
+                buffer_scan.set_data(data[chunk_size:])
+                yield chunk
+
+    @Profiler.profiled('SpecParser.read_scans', 'parser')
+    def read_scans(self, scans):
+        ' Fill the data of several scans, converting data blocks in a process pool when processes > 1 '
+        if self.sidecar is not None:
+            cached = [scan for scan in scans if self.sidecar.has_block(scan)]
+            for scan in cached:
+                self.read_scan_data(scan)
+            scans = [scan for scan in scans if scan not in cached]
+        # Auto refresh usually only has a few appended rows to convert
+        if self.processes <= 1 or len(scans) <= 1 or sum(scan.end_offset - scan.data_offset for scan in scans) < self.min_parallel_bytes:
+            for scan in scans:
+                self.read_scan_data(scan)
+            return
+        jobs = [(self.specfile, self.reader, scan.data_offset, scan.end_offset) for scan in scans]
+        pool = multiprocessing.Pool(min(self.processes, len(jobs)))
+        try:
+            # Results come back in file order, whatever the order the workers finish
+            results = pool.map(read_scan_block, jobs, chunksize=max(1, len(jobs) // (self.processes * 4)))
+        finally:
+            pool.close()
+            pool.join()
+        for scan, values in zip(scans, results):
+            scan.clear_data()
+            if values.size:
+                scan.append_values(values)
+            else:
+                scan.finalize()
+
+    def unload_scan(self, scan_id):
+        if scan_id in self.cache:
+            self.cache.pop(scan_id).unload()
+
+    def trim_cache(self):
+        ' Unload least recently used scans, always keeping the most recent one '
+        cache_bytes = sum(scan.get_loaded_data().nbytes for scan in self.cache.values())
+        while len(self.cache) > 1 and (len(self.cache) > self.max_cached_scans or cache_bytes > self.max_cache_bytes):
+            scan_id, scan = self.cache.popitem(last=False)
+            cache_bytes -= scan.get_loaded_data().nbytes
+            scan.unload()
+
+def read_scan_block(job):
+    ' Process pool worker: parse one scan data block, returns its values (without the row_number column) '
+    specfile, reader, data_offset, end_offset = job
+    scan = SpecScan(None)
+    scan.data_offset = data_offset
+    scan.end_offset = end_offset
+    SpecParser.read_scan_text(specfile, scan, reader)
+    return scan.get_loaded_data()[:, 1:]
+
+def iter_scans(specfile, chunk_size=None, reader='mmap', read_size=4*1024*1024):
+    ''' Streaming API: scans of a SPEC file, one at a time and in file order, reading the file read_size bytes at a time.
+    Without chunk_size, yields each SpecScan with its data loaded (released when the next scan is requested).
+    With chunk_size, yields (scan, chunk) pairs instead, chunk being at most chunk_size data rows (first column is row_number),
+    so that memory use does not depend on the file or scan size. '''
+    parser = SpecParser(specfile, lazy=True, max_cached_scans=1, reader=reader, autoparse=False)
+    while True:
+        offset = parser.offset
+        parser.update(max_bytes=read_size)
+        at_end = (parser.offset == offset)
+        for scan_id, scan in parser.scans.items():
+            # The scan being read can still receive rows
+            if scan is parser.scan and not at_end:
+                break
+            if chunk_size is None:
+                parser.load_scan(scan)
+                yield scan
+            else:
+                for chunk in parser.iter_scan_chunks(scan, chunk_size, read_size):
+                    yield scan, chunk
+            del parser.scans[scan_id]
+            parser.unload_scan(scan_id)
+        if at_end:
+            break
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Columnar storage for a single SPEC scan
+# Date created: 2026-10-17
+
+from collections import OrderedDict
+import numpy as np
+
+# Custom classes
+from spec_motors import *
+
+class SpecScan(object):
+
+    ''' A single SPEC scan. All numeric values are kept in one contiguous float64
+    2-D array (rows x columns, first column is row_number), plus a column name index.
+    The string views used by the Tk table are only built when requested.
+    When a loader is set (lazy parsing), the array is only created when data is accessed. '''
+
+    # Columns names lists and indices, shared between scans: tuple(columns_names): (columns_names, columns_index)
+    columns_pool = dict()
+    max_cached = 256
+
+    def __init__(self, scan_id, command='', date='', exposure_time='', motors=None, motors_positions=None, columns_names=None):
+        self.id = scan_id
+        self.command = command
+        self.date = date
+        self.exposure_time = exposure_time
+        # Motors names (SpecMotors, shared with the other scans of the same #O block) and float positions
+        self.motors = motors if motors is not None else SpecMotors([])
+        self.motors_positions = motors_positions if motors_positions is not None else np.empty(0)
+        self._motors_items = None
+        self.columns_names = ['row_number', ] + list(columns_names or []) # append row_number column
+        self.columns_index = dict()
+        # Rows (lists of tokens) waiting to be converted into self.data
+        self.pending_rows = list()
+        # Position of the scan in the SPEC file: #S line, first data line and end of last data line
+        self.offset = None
+        self.data_offset = None
+        self.end_offset = None
+        # Number of columns declared by #N
+        self.num_columns_declared = None
+        # Function that loads (and returns) the data array on demand, used by SpecParser in lazy mode
+        self.loader = None
+        self.clear_data()
+
+    # Backwards compatibility with the dict based scans (scan['command'], scan['data_values_indexed'], etc.)
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    @property
+    def data(self):
+        if self.loader is not None:
+            return self.loader(self)
+        return self._data
+
+    def get_loaded_data(self):
+        ' Data array without triggering the loader (None if not loaded) '
+        return self._data
+
+    def set_data(self, data):
+        self._data = data
+
+    def clear_data(self):
+        self._data = np.empty((0, len(self.columns_names)), dtype=np.float64)
+
+    def unload(self):
+        self._data = None
+
+    # Data arrays and loader are not pickled (used by the sidecar cache, which stores data separately)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_data'] = None
+        state['loader'] = None
+        state['pending_rows'] = list()
+        state['_motors_items'] = None
+        del state['columns_index']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.update_columns_index()
+
+    def append_row(self, tokens):
+        self.pending_rows.append(tokens)
+
+    def finalize(self):
+        ' Convert pending rows into the float array '
+        if not self.pending_rows:
+            self.update_columns_index()
+            return
+        rows = self.pending_rows
+        self.pending_rows = list()
+        try:
+            # Fast path: rectangular and fully numeric block
+            values = np.array(rows, dtype=np.float64)
+            if values.ndim != 2:
+                raise ValueError
+        except ValueError:
+            values = self.ragged_rows_to_array(rows)
+        self.append_values(values)
+
+    def append_values(self, values):
+        ' Append a 2-D float block (without row_number column) to the scan data '
+        num_rows, num_cols = values.shape
+        # Fix for the cases where there is no header with columns names (CSV, etc)
+        if len(self.columns_names) == 1:
+            self.columns_names = self.columns_names + ['col' + str(x) for x in range(num_cols)]
+        width = self._data.shape[1] - 1 if len(self._data) else max(num_cols, 1)
+        if num_cols != width:
+            values = self.fit_width(values, width)
+        first_row = len(self._data)
+        row_numbers = np.arange(first_row + 1, first_row + num_rows + 1, dtype=np.float64)
+        block = np.column_stack((row_numbers, values))
+        if first_row:
+            self._data = np.concatenate((self._data, block))
+        else:
+            self._data = np.ascontiguousarray(block)
+        self.update_columns_index()
+
+    def remove_last_row(self):
+        if self.pending_rows:
+            self.pending_rows.pop()
+        elif len(self._data):
+            self._data = self._data[:-1]
+
+    def update_columns_index(self):
+        # Scans with the same columns share the same names list and index (less memory, smaller sidecar cache)
+        key = tuple(self.columns_names)
+        if key not in SpecScan.columns_pool:
+            # Scans already read keep their lists, only the sharing with the next scans is lost
+            if len(SpecScan.columns_pool) >= SpecScan.max_cached:
+                SpecScan.columns_pool.clear()
+            SpecScan.columns_pool[key] = (self.columns_names, dict((name, index) for index, name in enumerate(self.columns_names)))
+        self.columns_names, self.columns_index = SpecScan.columns_pool[key]
+
+    @staticmethod
+    def fit_width(values, width):
+        ' Truncate or pad (with NaN) a block to the given number of columns '
+        if values.shape[1] > width:
+            return values[:, :width]
+        padded = np.empty((values.shape[0], width))
+        padded.fill(np.nan)
+        padded[:, :values.shape[1]] = values
+        return padded
+
+    @staticmethod
+    def ragged_rows_to_array(rows):
+        ' Slow path for rows with different lengths or non-numeric tokens (stored as NaN) '
+        width = len(rows[0])
+        values = np.empty((len(rows), width))
+        values.fill(np.nan)
+        for row_index, tokens in enumerate(rows):
+            for col_index, token in enumerate(tokens[:width]):
+                try:
+                    values[row_index, col_index] = float(token)
+                except ValueError:
+                    pass
+        return values
+
+    @property
+    def motors_names(self):
+        return self.motors.names
+
+    def motor_position(self, name):
+        return self.motors.position(self.motors_positions, name)
+
+    def motors_items(self):
+        ' (name, position string) pairs sorted by motor name, for the headers tree (built once per scan) '
+        if self._motors_items is None:
+            self._motors_items = [(name, self.format_value(position)) for name, position in self.motors.sorted_items(self.motors_positions)]
+        return self._motors_items
+
+    def num_rows(self):
+        return self.data.shape[0]
+
+    def num_columns(self):
+        return self.data.shape[1]
+
+    def column(self, name):
+        ' Column values by name (a view, not a copy) '
+        data = self.data
+        return data[:, self.columns_index[name]]
+
+    @staticmethod
+    def format_value(value):
+        return '%.15g' % value
+
+    def row_values(self, data, row_index):
+        ' Row as the list of strings used by the table: [row_number, value, ...] '
+        row = data[row_index]
+        return [int(row[0]), ] + [self.format_value(value) for value in row[1:]]
+
+    # Lazy views, only created when the Tk table (or legacy code) asks for them
+
+    @property
+    def data_values(self):
+        data = self.data
+        return [self.row_values(data, row_index) for row_index in range(len(data))]
+
+    @property
+    def data_values_indexed(self):
+        data = self.data
+        return OrderedDict((row_index, self.row_values(data, row_index)) for row_index in range(len(data)))
+
+    @property
+    def data_lines(self):
+        data = self.data
+        return [' '.join(self.row_values(data, row_index)[1:]) for row_index in range(len(data))]
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Spectra sharing their x axis drawn as a single LineCollection, decimated to the pixels of the view, with picking
+# Date created: 2026-10-17
+
+import numpy as np
+import matplotlib
+from matplotlib.collections import LineCollection
+from profiler import *
+
+class SpectraCollection:
+
+    ''' Spectra on the same x axis (rows of Y) drawn as one LineCollection instead of one Line2D each.
+    * update(): the segments only have the points of the view, merged into a minimum and a maximum every
+      two pixels when there are more points than pixels (the envelope is kept). Only the spectra crossing the
+      view are drawn, all of them: when they would have more than max_points points, the bins get wider so
+      that they fit in it. The trade-off is the level of detail of a view with many spectra (e.g. 12 bins per
+      spectrum for 10000 spectra and the default max_points, narrow peaks merged into wide bins), against
+      the drawing time, which grows with the points and the lines drawn. Zooming in, to a narrower x range or
+      to fewer spectra, gives the detail back.
+    * pick(): spectrum under a click, looked up around the clicked x only (the x axis is sorted once)
+    * select(): full resolution Line2D of one spectrum (with its label and picker), for the selection tools '''
+
+    def __init__(self, axes, x, Y, labels, picker_tolerance=5.0, max_points=250000):
+        x = np.asarray(x, dtype=float)
+        order = np.argsort(x, kind='mergesort')
+        self.axes = axes
+        self.x = x[order]
+        self.Y = np.asarray(Y, dtype=float)[:, order]
+        self.labels = labels
+        self.picker_tolerance = picker_tolerance
+        # Points drawn at most, all visible spectra included (the bins get wider above it)
+        self.max_points = max_points
+        # Colors of the lines, as if they were plotted one by one
+        cycle = [properties['color'] for properties in matplotlib.rcParams['axes.prop_cycle']]
+        self.colors = [cycle[index % len(cycle)] for index in range(len(self.Y))]
+        self.collection = LineCollection([], colors=self.colors, linewidths=matplotlib.rcParams['lines.linewidth'])
+        self.view = None
+        # ((first, last), minimum, maximum) of each spectrum over the points of the view
+        self.extremes = None
+        self.line = None
+        self.selected = None
+        axes.add_collection(self.collection, autolim=False)
+        self.update(whole=True)
+        min_x, max_x, min_y, max_y = self.limits()
+        axes.update_datalim([[min_x, min_y], [max_x, max_y]])
+        axes.autoscale_view()
+
+    def limits(self):
+        ' (min x, max x, min y, max y) of all the spectra '
+        with np.errstate(invalid='ignore'):
+            return self.x[0], self.x[-1], np.nanmin(self.Y), np.nanmax(self.Y)
+
+    def set_ydata(self, Y):
+        ' New intensities (same shape, columns in the order of the sorted x axis) '
+        self.Y = Y
+        self.view = None
+        self.extremes = None
+        self.update()
+
+    def update(self, whole=False):
+        ' Rebuild the segments for the current view (or all the points). Returns False if they already match it. '
+        num_points = len(self.x)
+        if whole or num_points < 2:
+            first, last = 0, num_points
+        else:
+            x_low, x_high = sorted(self.axes.get_xlim())
+            first = max(0, np.searchsorted(self.x, x_low, side='right') - 1)
+            last = min(num_points, np.searchsorted(self.x, x_high, side='left') + 1)
+        visible = self.visible_spectra(first, last, whole)
+        # Two points (minimum and maximum) every two pixels, or in wider bins when there are too many visible spectra
+        bins = max(1, min(int(self.axes.bbox.width) // 2, self.max_points // (2 * max(1, len(visible)))))
+        decimated = last - first > 2 * bins
+        view = (first, last, bins if decimated else None, visible.tostring())
+        if view == self.view:
+            return False
+        with Profiler.span('SpectraCollection.update', 'plot', spectra=len(self.Y)):
+            x = self.x[first:last]
+            Y = self.Y[visible, first:last]
+            if decimated:
+                starts = np.unique(np.searchsorted(x, np.linspace(x[0], x[-1], bins + 1)[:-1]))
+                ends = np.append(starts[1:], len(x))
+                x = (x[starts] + x[ends - 1]) / 2
+                # fmin and fmax ignore NaN (missing points), unless the whole bin is missing
+                lows = np.fmin.reduceat(Y, starts, axis=1)
+                highs = np.fmax.reduceat(Y, starts, axis=1)
+                Y = np.empty((len(Y), 2 * len(x)))
+                Y[:, 0::2] = lows
+                Y[:, 1::2] = highs
+                x = np.repeat(x, 2)
+            segments = np.empty(Y.shape + (2,))
+            segments[:, :, 0] = x
+            segments[:, :, 1] = Y
+            self.collection.set_segments(segments)
+            self.collection.set_color([self.colors[index] for index in visible])
+            self.view = view
+        Profiler.count('spectra points drawn', Y.size)
+        return True
+
+    def visible_spectra(self, first, last, whole=False):
+        ' Indices of the spectra with points (from first to last) within the y limits of the view, or of all of them '
+        if whole or first >= last:
+            return np.arange(len(self.Y))
+        if self.extremes is None or self.extremes[0] != (first, last):
+            Y = self.Y[:, first:last]
+            self.extremes = ((first, last), np.fmin.reduce(Y, axis=1), np.fmax.reduce(Y, axis=1))
+        lows, highs = self.extremes[1:]
+        y_low, y_high = sorted(self.axes.get_ylim())
+        # Spectra missing in the whole range (NaN) are not drawn
+        with np.errstate(invalid='ignore'):
+            return np.flatnonzero((highs >= y_low) & (lows <= y_high))
+
+    def pick(self, mouseevent):
+        ' Index of the spectrum closest to the click, if it is within picker_tolerance pixels, else None '
+        if mouseevent.inaxes is not self.axes or len(self.x) == 0:
+            return None
+        transform = self.axes.transData
+        click = np.array([mouseevent.x, mouseevent.y], dtype=float)
+        # The tolerance is in points, as for Line2D pickers
+        tolerance = self.picker_tolerance * self.axes.figure.dpi / 72.0
+        # Points from a tolerance before to a tolerance after the click (and the segments reaching them)
+        x_low, x_high = sorted(transform.inverted().transform([click - [tolerance, 0], click + [tolerance, 0]])[:, 0])
+        first = max(0, np.searchsorted(self.x, x_low, side='right') - 1)
+        last = min(len(self.x), np.searchsorted(self.x, x_high, side='left') + 1)
+        Y = self.Y[:, first:last]
+        num_spectra, num_points = Y.shape
+        points = np.empty((Y.size, 2))
+        points[:, 0] = np.tile(self.x[first:last], num_spectra)
+        points[:, 1] = Y.ravel()
+        points = transform.transform(points).reshape((num_spectra, num_points, 2)) - click
+        if num_points == 1:
+            distances = np.hypot(points[:, 0, 0], points[:, 0, 1])
+        else:
+            # Distances from the click (origin) to the segments between consecutive points
+            start, step = points[:, :-1], points[:, 1:] - points[:, :-1]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                position = np.clip(-np.sum(start * step, axis=2) / np.sum(step * step, axis=2), 0, 1)
+            position[np.isnan(position)] = 0
+            closest = start + position[:, :, np.newaxis] * step
+            distances = np.hypot(closest[:, :, 0], closest[:, :, 1])
+            distances[np.isnan(distances)] = np.inf
+            distances = np.amin(distances, axis=1)
+        # Missing points are never picked
+        distances[np.isnan(distances)] = np.inf
+        index = int(np.argmin(distances))
+        return index if distances[index] <= tolerance else None
+
+    def select(self, index):
+        ' Line2D of the spectrum index (the previous one is removed), drawn over the collection '
+        self.deselect()
+        self.line, = self.axes.plot(self.x, self.Y[index], color=self.colors[index], picker=self.picker_tolerance, label=self.labels[index])
+        self.selected = index
+        return self.line
+
+    def deselect(self):
+        if self.line is not None:
+            self.line.remove()
+        self.line = None
+        self.selected = None
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Test configuration: the application folder is importable (classes.*), as when running __main__.py or batch.py
+# Date created: 2026-10-17
+
+import os
+import sys
+import pytest
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+@pytest.fixture
+def sample_file():
+    ' SPEC file of the sample data (2 scans, the second one an RXES scan with 89 ROIs) '
+    return os.path.join(root_dir, 'sample_data', 'H2PtCl6_Lalpha_Si100-LNLS002')
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Tests: columns selection patterns (names, ROI ranges, name ranges, wildcards)
+# Date created: 2026-10-17
+
+import pytest
+
+from classes.column_selector import ColumnSelector
+
+columns = ['row_number', 'dcm_energy', 'I0', 'mon'] + ['pl' + str(i) for i in range(12)] + ['roi1', 'roi2', 'Iring']
+
+def names(pattern, columns_names=columns):
+    return [columns_names[index] for index in ColumnSelector.select(pattern, columns_names)]
+
+@pytest.mark.parametrize('pattern, expected', [
+    ('pl2-pl5', ['pl2', 'pl3', 'pl4', 'pl5']),
+    ('pl5-pl2', ['pl2', 'pl3', 'pl4', 'pl5']),
+    ('pl0-pl0', ['pl0']),
+    ('pl9-pl20', ['pl9', 'pl10', 'pl11']),
+    ('pl20-pl30', []),
+    ('pl1-pl2, pl10-pl11', ['pl1', 'pl2', 'pl10', 'pl11']),
+    ('pl1-pl3,pl2-pl4', ['pl1', 'pl2', 'pl3', 'pl4']),
+    ('roi1-roi2', ['roi1', 'roi2']),
+    ('I0', ['I0']),
+    ('I0, mon', ['I0', 'mon']),
+    ('missing', []),
+    ('dcm_energy-mon', ['dcm_energy', 'I0', 'mon']),
+    ('pl11-roi2', ['pl11', 'roi1', 'roi2']),
+    # * matches one or more characters
+    ('pl1*', ['pl10', 'pl11']),
+    ('roi*, I0', ['I0', 'roi1', 'roi2']),
+])
+def test_select(pattern, expected):
+    assert names(pattern) == expected
+
+def test_selection_is_in_columns_order():
+    ' ROI ranges follow the order of the columns, not the numbers '
+    shuffled = ['pl3', 'pl1', 'pl2', 'x', 'pl0']
+    assert names('pl0-pl2', shuffled) == ['pl1', 'pl2', 'pl0']
+
+def test_cached_indices_are_read_only():
+    indices = ColumnSelector.select('pl0-pl3', columns)
+    assert ColumnSelector.select('pl0-pl3', columns) is indices
+    with pytest.raises(ValueError):
+        indices[0] = 1
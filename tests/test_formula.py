@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Tests: intensity formula compiler (accepted and rejected expressions, evaluation into strided outputs)
+# Date created: 2026-10-17
+
+import numpy as np
+import pytest
+
+from classes.formula import Formula
+
+@pytest.fixture
+def variables():
+    random = np.random.RandomState(0)
+    return {'S': random.uniform(1, 100, (6, 5)), 'BG1': random.uniform(1, 10, (6, 5)), 'BG2': random.uniform(1, 10, (6, 5)), 'I0': random.uniform(1e6, 2e6, (6, 1))}
+
+@pytest.mark.parametrize('text, expected', [
+    ('(S-(BG1+BG2)/2)/I0', lambda v: (v['S'] - (v['BG1'] + v['BG2']) / 2) / v['I0']),
+    ('S', lambda v: v['S']),
+    ('S*(1/2)', lambda v: v['S'] * 0.5),
+    ('-S + +BG1', lambda v: -v['S'] + v['BG1']),
+    ('S**2 % 7', lambda v: v['S'] ** 2 % 7),
+    ('sqrt(abs(S - BG1)) / np.log(I0) + numpy.exp(-BG2)', lambda v: np.sqrt(np.abs(v['S'] - v['BG1'])) / np.log(v['I0']) + np.exp(-v['BG2'])),
+])
+def test_evaluate(variables, text, expected):
+    assert np.allclose(Formula(text).evaluate(variables), expected(variables))
+
+@pytest.mark.parametrize('text', [
+    '__import__("os").system("true")',
+    'open("/etc/passwd")',
+    'S.__class__',
+    'S[0]',
+    'S if I0 else BG1',
+    'lambda: S',
+    'S < BG1',
+    'S and BG1',
+    'X + S',
+    'np.linalg.inv(S)',
+    'os.sqrt(S)',
+    'sqrt(S, out=S)',
+    'sqrt(*S)',
+    'sqrt(S, BG1)',
+    '[S]',
+    '"S"',
+    'S; BG1',
+    '',
+])
+def test_rejected(text):
+    with pytest.raises(ValueError):
+        Formula(text)
+
+def test_names(variables):
+    assert Formula('(S-BG1)/I0').names == set(['S', 'BG1', 'I0'])
+    assert Formula('(S-BG1)/I0').shape(variables) == (6, 5)
+
+def test_evaluate_into_strided_output(variables):
+    ' As Processing.intensities: the intensity columns after the scan columns '
+    output = np.zeros((6, 8))
+    Formula('(S-(BG1+BG2)/2)/I0').evaluate(variables, out=output[:, 3:])
+    assert np.allclose(output[:, 3:], (variables['S'] - (variables['BG1'] + variables['BG2']) / 2) / variables['I0'])
+    assert not output[:, :3].any()
+
+def test_compile_cache():
+    assert Formula.compile('S/I0') is Formula.compile('S/I0')
+
+@pytest.mark.parametrize('text', ['(S-(BG1+BG2)/2)/I0', 'S*(1/2)', 'S**2 % 7', 'sqrt(abs(S - BG1)) / np.log(I0) + numpy.exp(-BG2)'])
+def test_numexpr_as_plan(variables, monkeypatch, text):
+    ' numexpr (when installed) is used for the strided intensity columns, with the results of the NumPy plan '
+    formula_module = pytest.importorskip('classes.formula')
+    if formula_module.numexpr is None:
+        pytest.skip('numexpr is not installed')
+    calls = []
+    evaluate = formula_module.numexpr.evaluate
+    monkeypatch.setattr(formula_module.numexpr, 'evaluate', lambda *args, **kwargs: calls.append(text) or evaluate(*args, **kwargs))
+    output = np.zeros((6, 8))
+    Formula(text).evaluate(variables, out=output[:, 3:])
+    assert calls
+    monkeypatch.setattr(formula_module, 'numexpr', None)
+    expected = Formula(text).evaluate(variables)
+    assert np.allclose(output[:, 3:], expected, rtol=1e-12)
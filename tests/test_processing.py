@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Tests: nearest index lookup, energy transfer resampling edge cases and intensity columns
+# Date created: 2026-10-17
+
+import numpy as np
+import pytest
+
+from classes.processing import Processing
+
+def brute_force_index(X, x0):
+    distances = np.abs(np.asarray(X, dtype=float) - x0)
+    distances[np.isnan(distances)] = np.inf
+    return int(np.argmin(distances))
+
+@pytest.mark.parametrize('X', [
+    [1.0, 2.0, 3.0, 4.0],
+    [4.0, 3.0, 2.0, 1.0],
+    [1.0, 1.0, 2.0, 2.0, 2.0, 5.0],
+    [5.0, 2.0, 2.0, 1.0, 1.0],
+    [3.0, 1.0, 4.0, 1.0, 5.0],
+    [1.0, np.nan, 3.0, 4.0],
+    [7.0],
+    [2.0, 2.0, 2.0],
+])
+@pytest.mark.parametrize('x0', [-100.0, 0.0, 1.0, 1.5, 2.0, 2.5, 3.5, 4.0, 7.0, 100.0])
+def test_closest_index(X, x0):
+    assert Processing.closest_index(X, x0) == brute_force_index(X, x0)
+
+def test_closest_index_batch():
+    X = np.linspace(10, 0, 101)
+    values = [-1, 0, 0.04, 0.06, 5, 9.99, 11]
+    indices = Processing.closest_index(X, values)
+    assert list(indices) == [brute_force_index(X, value) for value in values]
+    assert isinstance(Processing.closest_index(X, 5), int)
+
+def test_closest_index_ties_first():
+    assert Processing.closest_index([1.0, 2.0], 1.5) == 0
+    assert Processing.closest_index([2.0, 1.0], 1.5) == 0
+
+def test_closest_index_empty():
+    with pytest.raises(ValueError):
+        Processing.closest_index([], 1.0)
+
+def sheared_map(emitted, incoming, function):
+    return function(incoming[:, np.newaxis], incoming[:, np.newaxis] - emitted[np.newaxis, :])
+
+def test_resample_rows_linear_map():
+    ' A map linear in (incoming, transfer) is resampled exactly inside the measured area '
+    emitted = np.linspace(9.44, 9.36, 41)
+    incoming = np.linspace(11.54, 11.605, 14)
+    function = lambda y, t: 2 * y - 3 * t + 1
+    Z = sheared_map(emitted, incoming, function)
+    transfer = np.linspace(2.09, 2.25, 30)
+    mesh_incoming = np.linspace(11.54, 11.605, 9)
+    resampled = Processing.resample_rows(emitted, incoming, Z, transfer, mesh_incoming)
+    inside = ~np.ma.getmaskarray(resampled)
+    expected = function(mesh_incoming[:, np.newaxis], transfer[np.newaxis, :]) * np.ones(resampled.shape)
+    assert inside.any()
+    assert np.allclose(resampled[inside], expected[inside])
+
+def test_resample_rows_masked_outside():
+    emitted = np.array([1.0, 2.0, 3.0])
+    incoming = np.array([10.0, 11.0])
+    Z = np.ones((2, 3))
+    resampled = Processing.resample_rows(emitted, incoming, Z, np.array([0.0, 8.0, 9.0, 20.0]), np.array([9.0, 10.0, 11.0, 12.0]))
+    mask = np.ma.getmaskarray(resampled)
+    # Rows outside the incoming energies, and transfers outside incoming - emitted
+    assert mask[0].all() and mask[3].all()
+    assert mask[:, 0].all() and mask[:, 3].all()
+    assert not mask[1, 1] and not mask[2, 1] and not mask[1, 2] and not mask[2, 2]
+    assert np.allclose(resampled[1:3, 1:3], 1)
+
+def test_resample_rows_exact_edges():
+    ' Points on the last row and column do not read beyond the data '
+    emitted = np.array([1.0, 2.0])
+    incoming = np.array([10.0, 11.0])
+    Z = np.array([[1.0, 2.0], [3.0, 4.0]])
+    resampled = Processing.resample_rows(emitted, incoming, Z, np.array([8.0, 9.0]), np.array([10.0, 11.0]))
+    # transfer 8 at incoming 10 is emitted 2 (Z 2), at 11 emitted 3 (outside); transfer 9: emitted 1 and 2
+    assert resampled[0, 0] == 2.0
+    assert np.ma.getmaskarray(resampled)[1, 0]
+    assert resampled[0, 1] == 1.0
+    assert resampled[1, 1] == 4.0
+
+def test_resample_rows_unsorted_and_single():
+    emitted = np.array([3.0, 1.0, 2.0])
+    incoming = np.array([11.0, 10.0])
+    Z = np.array([[30.0, 10.0, 20.0], [3.0, 1.0, 2.0]])
+    resampled = Processing.resample_rows(emitted, incoming, Z, np.array([8.5]), np.array([10.0, 11.0]))
+    assert resampled[0, 0] == 1.5 and resampled[1, 0] == 25.0
+    assert np.ma.getmaskarray(Processing.resample_rows(emitted, incoming[:1], Z[:1], np.array([8.5]), np.array([10.0]))).all()
+
+def test_intensity_block():
+    data = np.arange(40.0).reshape((4, 10))
+    block = Processing.intensity_block(data, {'intensity_columns': range(6, 10)})
+    assert np.array_equal(block, data[:, 6:10])
+    assert np.may_share_memory(block, data)
+    # Columns with gaps or out of order: only the selected ones
+    assert np.array_equal(Processing.intensity_block(data, {'intensity_columns': [2, 3, 7]}), data[:, [2, 3, 7]])
+    assert np.array_equal(Processing.intensity_block(data, {'intensity_columns': [7, 2]}), data[:, [7, 2]])
+    assert np.array_equal(Processing.intensity_block(data, {'intensity_columns': [5]}), data[:, 5:6])
+    with pytest.raises(ValueError):
+        Processing.intensity_block(data, {'intensity_columns': []})
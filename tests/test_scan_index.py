@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Tests: folder scan index queries (command words, wildcards, motors and exposure time ranges)
+# Date created: 2026-10-17
+
+import os
+import shutil
+
+import pytest
+
+from classes.scan_index import ScanIndex
+
+@pytest.fixture
+def scan_index(sample_file, tmpdir):
+    ' Index of a folder with the sample file: "ascan mo_e 11.8 11.8 1 600" and "ascan mo_e 11.54 11.605 65 60" '
+    shutil.copy(sample_file, str(tmpdir))
+    scan_index = ScanIndex(str(tmpdir))
+    scan_index.update()
+    return scan_index
+
+def scans(results):
+    return sorted(scan_id for file_name, scan_id in results)
+
+@pytest.mark.parametrize('command, expected', [
+    ('ascan mo_e', ['0.1', '0.2']),
+    ('ascan  mo_e  600', ['0.1']),
+    # Words are compared with the words of the command, not searched inside them
+    ('scan', []),
+    ('1', ['0.1']),
+    ('11.6', []),
+    ('60', ['0.2']),
+    # Wildcards
+    ('*scan', ['0.1', '0.2']),
+    ('11.6*', ['0.2']),
+    ('mo_?', ['0.1', '0.2']),
+    ('?', ['0.1']),
+])
+def test_command_words(scan_index, command, expected):
+    assert scans(scan_index.query(command=command)) == expected
+
+def test_query_text(scan_index):
+    assert scans(scan_index.query_text('ascan time=600')) == ['0.1']
+    assert scans(scan_index.query_text('ascan, time=:100')) == ['0.2']
+    assert scans(scan_index.query_text('mo_e time=1:')) == ['0.1', '0.2']
+    with pytest.raises(ValueError):
+        scan_index.query_text('time=a')
+
+def test_saved_index(scan_index):
+    ' The index is saved in the folder and read back '
+    assert os.path.exists(scan_index.index_file)
+    assert scans(ScanIndex(scan_index.directory).query(command='1')) == ['0.1']
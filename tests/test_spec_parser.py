@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Tests: SpecParser against the original line by line parser, in every reading mode, and incremental update()
+# Date created: 2026-10-17
+
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from classes.spec_parser import SpecParser, iter_scans
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import spec_generator
+from legacy_spec_parser import LegacySpecParser
+
+# Reading modes: (reader, lazy, processes)
+modes = [(reader, lazy, processes) for reader in ['lines', 'mmap'] for lazy in [False, True] for processes in [1, 2]]
+
+def baseline_scans(specfile):
+    ''' Scans as read by the original parser (dicts of strings), reduced to what SpecParser keeps:
+    id: (command, columns names, motors names, motors positions, rows of tokens) '''
+    return OrderedDict((scan_id, (scan['command'], scan['columns_names'], scan['motors_names'], scan['motors_positions'], [row[1:] for row in scan['data_values']]))
+                       for scan_id, scan in LegacySpecParser(specfile).get_scans().items())
+
+def assert_same_scans(scans, expected):
+    assert list(scans.keys()) == list(expected.keys())
+    for scan_id, (command, columns_names, motors_names, motors_positions, rows) in expected.items():
+        scan = scans[scan_id]
+        assert scan.command == command
+        assert list(scan.columns_names) == columns_names
+        assert list(scan.motors_names) == motors_names
+        assert np.array_equal(scan.motors_positions, np.array(motors_positions, dtype=float))
+        values = np.array([[index + 1] + [float(token) for token in tokens] for index, tokens in enumerate(rows)])
+        assert np.array_equal(scan.data, values)
+
+def assert_same_parsers(parser, reference):
+    scans, expected = parser.get_scans(), reference.get_scans()
+    assert list(scans.keys()) == list(expected.keys())
+    for scan_id in expected:
+        assert scans[scan_id].command == expected[scan_id].command
+        assert list(scans[scan_id].columns_names) == list(expected[scan_id].columns_names)
+        assert np.array_equal(scans[scan_id].data, expected[scan_id].data)
+
+@pytest.fixture(scope='module')
+def generated_file(tmpdir_factory):
+    ' Synthetic file with restarted numbering, interleaved motors headers and aborted scans '
+    file_path = str(tmpdir_factory.mktemp('spec').join('generated.spec'))
+    spec_generator.generate(file_path, 12, points=7, rois=40, restarts=1, motors_every=5, aborted_every=4)
+    return file_path
+
+@pytest.fixture(autouse=True)
+def parallel_small_files(monkeypatch):
+    ' The process pool is used whatever the size of the data blocks, so that the small test files go through it '
+    monkeypatch.setattr(SpecParser, 'min_parallel_bytes', 0)
+
+@pytest.mark.parametrize('reader, lazy, processes', modes)
+def test_sample_file_as_baseline(sample_file, reader, lazy, processes):
+    assert_same_scans(SpecParser(sample_file, reader=reader, lazy=lazy, processes=processes).get_scans(), baseline_scans(sample_file))
+
+@pytest.mark.parametrize('reader, lazy, processes', modes)
+def test_generated_file_as_baseline(generated_file, reader, lazy, processes):
+    assert_same_scans(SpecParser(generated_file, reader=reader, lazy=lazy, processes=processes).get_scans(), baseline_scans(generated_file))
+
+def test_iter_scans(generated_file):
+    expected = baseline_scans(generated_file)
+    scans = OrderedDict((scan.id, scan) for scan in iter_scans(generated_file))
+    assert_same_scans(scans, expected)
+
+@pytest.mark.parametrize('reader, lazy', [('lines', False), ('mmap', False), ('lines', True), ('mmap', True)])
+@pytest.mark.parametrize('chunk_size', [97, 1000, 4096])
+def test_update_on_growing_file(generated_file, tmpdir, reader, lazy, chunk_size):
+    ' File written in chunks cut anywhere (also inside data rows), parsed after each chunk '
+    with open(generated_file, 'rb') as fp:
+        content = fp.read()
+    file_path = str(tmpdir.join('growing.spec'))
+    with open(file_path, 'wb') as fp:
+        fp.write(content[:chunk_size])
+    parser = SpecParser(file_path, reader=reader, lazy=lazy)
+    for start in range(chunk_size, len(content), chunk_size):
+        with open(file_path, 'ab') as fp:
+            fp.write(content[start:start + chunk_size])
+        new_scans, changed_scans = parser.update()
+        assert not parser.restarted
+        assert set(new_scans).isdisjoint(changed_scans)
+    assert_same_parsers(parser, SpecParser(generated_file, reader=reader, lazy=lazy))
+
+def test_update_after_truncation(generated_file, tmpdir):
+    ' A file replaced by a shorter one is parsed again from the start '
+    with open(generated_file, 'rb') as fp:
+        content = fp.read()
+    file_path = str(tmpdir.join('replaced.spec'))
+    with open(file_path, 'wb') as fp:
+        fp.write(content)
+    parser = SpecParser(file_path)
+    with open(file_path, 'wb') as fp:
+        fp.write(content[:len(content) // 2])
+    parser.update()
+    assert parser.restarted
+    assert_same_parsers(parser, SpecParser(file_path))
+
+def test_columns_pool_bounded(monkeypatch):
+    ' Scans with the same columns share their names list, the pool of lists is bounded '
+    from classes.spec_scan import SpecScan
+    monkeypatch.setattr(SpecScan, 'columns_pool', dict())
+    monkeypatch.setattr(SpecScan, 'max_cached', 4)
+    first, second = SpecScan('0.1', columns_names=['a', 'b']), SpecScan('0.2', columns_names=['a', 'b'])
+    first.update_columns_index()
+    second.update_columns_index()
+    assert first.columns_names is second.columns_names
+    for index in range(10):
+        scan = SpecScan('0.%d' % (index + 3), columns_names=['c%d' % index])
+        scan.update_columns_index()
+        assert len(SpecScan.columns_pool) <= 4
+        assert scan.columns_index == {'row_number': 0, 'c%d' % index: 1}
+    assert first.columns_index == {'row_number': 0, 'a': 1, 'b': 2}
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_sidecar_cache(tmpdir, lazy):
+    ' The cache is reused when the file grew, and dropped when a byte of the consumed prefix changed '
+    generated_file = str(tmpdir.join('generated.spec'))
+    spec_generator.generate(generated_file, 20, points=30, rois=100, restarts=1, motors_every=5, aborted_every=4)
+    with open(generated_file, 'rb') as fp:
+        content = fp.read()
+    half = content.index('#S', len(content) // 2)
+    file_path = str(tmpdir.join('cached.spec'))
+    with open(file_path, 'wb') as fp:
+        fp.write(content[:half])
+    SpecParser(file_path, use_cache=True, lazy=lazy)
+    with open(file_path, 'ab') as fp:
+        fp.write(content[half:])
+    parser = SpecParser(file_path, use_cache=True, lazy=lazy)
+    assert parser.sidecar.hashed_offset == len(content)
+    assert_same_parsers(parser, SpecParser(generated_file))
+    # Same size, one digit changed in the middle of the file (far from both ends)
+    middle = content.index('\n', len(content) // 3) + 1
+    while not content[middle].isdigit():
+        middle += 1
+    changed = content[:middle] + ('1' if content[middle] != '1' else '2') + content[middle + 1:]
+    with open(file_path, 'wb') as fp:
+        fp.write(changed + '\n')
+    with open(str(tmpdir.join('changed.spec')), 'wb') as fp:
+        fp.write(changed + '\n')
+    assert_same_parsers(SpecParser(file_path, use_cache=True, lazy=lazy), SpecParser(str(tmpdir.join('changed.spec'))))
+
+@pytest.mark.parametrize('rows', [
+    ['1 2 3 4', '5 6 7', '8 9 10 11 12'],
+    ['1 2 3 4', '5 6 7 8 9', '10 11 12'],
+    ['1 2 3', '4 5', '6 7 8 9'],
+])
+def test_ragged_rows_as_lines_reader(tmpdir, rows):
+    ' Rows with different numbers of values have the same total as a rectangular block, they must not be reshaped '
+    file_path = str(tmpdir.join('ragged.spec'))
+    with open(file_path, 'w') as fp:
+        fp.write('#S 1  ascan  mo_e 11.54 11.605  3 60\n#N 4\n#L a  b  c  d\n' + '\n'.join(rows) + '\n')
+    expected = SpecParser(file_path, reader='lines').get_scans()['0.1'].data
+    for reader, lazy in [('mmap', False), ('mmap', True), ('lines', True)]:
+        np.testing.assert_array_equal(SpecParser(file_path, reader=reader, lazy=lazy).get_scans()['0.1'].data, expected)
+
+def test_sidecar_index_saved_by_batches(tmpdir, monkeypatch):
+    ' Scans loaded in lazy mode do not save the whole index each time, close() saves the last ones '
+    from classes.spec_cache import SpecCache
+    file_path = str(tmpdir.join('lazy.spec'))
+    spec_generator.generate(file_path, 30, points=5, rois=20)
+    saves = []
+    save = SpecCache.save
+    monkeypatch.setattr(SpecCache, 'save', lambda self, *args: saves.append(args[1]) or save(self, *args))
+    parser = SpecParser(file_path, lazy=True, use_cache=True)
+    assert len(saves) == 1
+    for scan in parser.get_scans().values()[:25]:
+        scan.data
+    assert len(saves) == 1 + 25 // SpecParser.max_unsaved_blocks
+    # Auto refresh saves the scans loaded since the last save, and nothing when nothing changed
+    parser.update()
+    assert len(saves) == 2 + 25 // SpecParser.max_unsaved_blocks
+    parser.update()
+    parser.close()
+    assert len(saves) == 2 + 25 // SpecParser.max_unsaved_blocks
+    parser.get_scans().values()[25].data
+    parser.close()
+    assert len(saves) == 3 + 25 // SpecParser.max_unsaved_blocks
+    reopened = SpecParser(file_path, lazy=True, use_cache=True)
+    assert sum(reopened.sidecar.has_block(scan) for scan in reopened.get_scans().values()) == 26
+    assert_same_parsers(reopened, SpecParser(file_path))
+
+def test_pool_only_for_large_blocks(generated_file, tmpdir, monkeypatch):
+    ' Appended rows (auto refresh) are converted without starting a process pool '
+    import multiprocessing
+    pools = []
+    Pool = multiprocessing.Pool
+    monkeypatch.setattr(multiprocessing, 'Pool', lambda *args, **kwargs: pools.append(args) or Pool(*args, **kwargs))
+    with open(generated_file, 'rb') as fp:
+        content = fp.read()
+    file_path = str(tmpdir.join('parallel.spec'))
+    with open(file_path, 'wb') as fp:
+        fp.write(content[:len(content) // 2])
+    parser = SpecParser(file_path, processes=2)
+    assert len(pools) == 1
+    monkeypatch.setattr(SpecParser, 'min_parallel_bytes', 4 * 1024 * 1024)
+    with open(file_path, 'ab') as fp:
+        fp.write(content[len(content) // 2:])
+    parser.update()
+    assert len(pools) == 1
+    assert_same_parsers(parser, SpecParser(generated_file))
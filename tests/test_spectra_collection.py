@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# Von Hamos Preview Tool for XDS Beamline
+# Tests: XES spectra collection (all spectra drawn within the points budget, picking of any of them)
+# Date created: 2026-10-17
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backend_bases import MouseEvent
+import numpy as np
+import pytest
+
+from classes.spectra_collection import SpectraCollection
+
+def spectra_axes():
+    fig = Figure(figsize=(10, 7), dpi=100)
+    FigureCanvasAgg(fig)
+    return fig.add_subplot(111)
+
+def spectra(num_spectra, num_points):
+    ' Spectra with their peak at different energies, with decreasing energies as the ROIs axis '
+    centers = np.linspace(0.2, 0.8, num_spectra) * num_points
+    Y = np.exp(-0.5 * ((np.arange(num_points)[np.newaxis, :] - centers[:, np.newaxis]) / 5.0) ** 2) * np.linspace(1, 2, num_spectra)[:, np.newaxis]
+    return np.linspace(9.44, 9.36, num_points), Y
+
+@pytest.mark.parametrize('num_spectra, num_points', [(3, 50), (65, 1461), (2000, 1461)])
+def test_all_spectra_drawn(num_spectra, num_points):
+    axes = spectra_axes()
+    x, Y = spectra(num_spectra, num_points)
+    collection = SpectraCollection(axes, x, Y, [str(index) for index in range(num_spectra)])
+    axes.figure.canvas.draw()
+    segments = [path.vertices for path in collection.collection.get_paths()]
+    assert len(segments) == num_spectra
+    assert sum(len(segment) for segment in segments) <= max(collection.max_points, num_spectra * 2)
+    # Minimum and maximum of each spectrum are kept
+    for index in [0, num_spectra // 2, num_spectra - 1]:
+        assert np.isclose(segments[index][:, 1].max(), Y[index].max())
+        assert np.isclose(segments[index][:, 1].min(), Y[index].min())
+
+@pytest.mark.parametrize('index', [0, 1, 999, 1998])
+def test_pick_any_spectrum(index):
+    axes = spectra_axes()
+    x, Y = spectra(2000, 1461)
+    collection = SpectraCollection(axes, x, Y, [str(index) for index in range(len(Y))])
+    axes.figure.canvas.draw()
+    column = int(np.argmax(Y[index]))
+    click = axes.transData.transform([x[column], Y[index, column]])
+    mouseevent = MouseEvent('button_press_event', axes.figure.canvas, click[0], click[1], button=1)
+    assert collection.pick(mouseevent) == index
+    assert collection.select(index).get_label() == str(index)
+
+def test_budget_of_visible_spectra():
+    ' Zooming in to fewer spectra gives them the whole points budget back '
+    axes = spectra_axes()
+    x, Y = spectra(2000, 1461)
+    # Each spectrum at its own height
+    Y = Y + 10 * np.arange(len(Y))[:, np.newaxis]
+    collection = SpectraCollection(axes, x, Y, [str(index) for index in range(len(Y))], max_points=100000)
+    axes.figure.canvas.draw()
+    whole = [path.vertices for path in collection.collection.get_paths()]
+    assert len(whole) == 2000
+    assert sum(len(segment) for segment in whole) <= 100000
+    axes.set_ylim(10 * 1000 - 1, 10 * 1005 + 3)
+    assert collection.update()
+    segments = [path.vertices for path in collection.collection.get_paths()]
+    assert len(segments) == 6
+    assert min(len(segment) for segment in segments) > 10 * max(len(segment) for segment in whole)
+    assert [tuple(color) for color in collection.collection.get_colors()] == [tuple(matplotlib.colors.to_rgba(collection.colors[index])) for index in range(1000, 1006)]
+    # Nothing to rebuild for the same view
+    assert not collection.update()